@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, NamedTuple, Optional
+
+import aiohttp
+
+from metrics import REGISTRY, endpoint_label
+
+# Методы, которые безопасно повторять: повтор не меняет результат
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class APIStatusError(Exception):
+    """API ответило неожиданным HTTP-статусом."""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"Ошибка API {url}: {status}")
+        self.status = status
+        self.url = url
+
+
+API_SECONDS = REGISTRY.histogram("bot_api_request_seconds", "Время запросов к Django API", ("method", "endpoint"))
+API_RESPONSES = REGISTRY.counter("bot_api_responses_total", "Ответы Django API", ("method", "endpoint", "status"))
+API_FAILURES = REGISTRY.counter("bot_api_errors_total", "Сетевые ошибки и таймауты запросов к Django API",
+                                ("method", "endpoint", "error"))
+API_RETRIES = REGISTRY.counter("bot_api_retries_total", "Повторы запросов к Django API", ("method", "endpoint"))
+
+
+# Исключения, которые может выбросить запрос к API
+API_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, APIStatusError)
+
+
+class APIResponse(NamedTuple):
+    status: int
+    data: Any
+
+
+class DjangoAPIClient:
+    """
+    Общий HTTP-клиент бота для обращений к Django API.
+
+    Одна aiohttp-сессия на всё время работы бота: соединения переиспользуются
+    (keep-alive), DNS кешируется, число соединений ограничено.
+    """
+
+    def __init__(self, base_url: str, limit: int = 100, limit_per_host: int = 20,
+                 timeout: float = 10.0, retries: int = 3, backoff: float = 0.2,
+                 keepalive_timeout: float = 30.0):
+        self.base_url = base_url
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("API-клиент не запущен: вызовите start() при старте бота.")
+        return self._session
+
+    def url(self, path: str) -> str:
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}{path}"
+
+    async def request(self, method: str, path: str = '', idempotent: Optional[bool] = None, **kwargs) -> APIResponse:
+        """
+        Выполняет запрос с повторами и экспоненциальной задержкой.
+
+        Идемпотентные запросы повторяются при сетевых ошибках, таймаутах и 5xx.
+        Остальные (POST, PATCH) повторяются только если соединение не удалось
+        установить, то есть запрос точно не дошел до сервера. idempotent=True
+        помечает POST, который сервер сам защищает от повторов (ключ идемпотентности).
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = self.url(path)
+
+        endpoint = endpoint_label(path)
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            started = time.perf_counter()
+            try:
+                async with self.session.request(method, url, **kwargs) as response:
+                    API_RESPONSES.inc(method, endpoint, response.status)
+                    if response.status >= 500 and idempotent and not last_attempt:
+                        await response.read()
+                    else:
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError:
+                            data = None
+                        return APIResponse(response.status, data)
+            except aiohttp.ClientConnectorError as e:
+                API_FAILURES.inc(method, endpoint, type(e).__name__)
+                if last_attempt:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                API_FAILURES.inc(method, endpoint, type(e).__name__)
+                if last_attempt or not idempotent:
+                    raise
+            finally:
+                API_SECONDS.observe(time.perf_counter() - started, method, endpoint)
+            API_RETRIES.inc(method, endpoint)
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def get(self, path: str = '', **kwargs) -> APIResponse:
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path: str = '', **kwargs) -> APIResponse:
+        return await self.request('POST', path, **kwargs)
+
+    async def patch(self, path: str = '', **kwargs) -> APIResponse:
+        return await self.request('PATCH', path, **kwargs)
+
+    async def paginate_pages(self, path: str = '', page_size: int = 500, **params) -> AsyncIterator[list]:
+        """
+        Перебирает постраничный список по курсору, не загружая его целиком:
+        в памяти одновременно находится только одна страница.
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        after = 0
+        while True:
+            response = await self.get(path, params={**params, 'after': after, 'limit': page_size})
+            if response.status != 200:
+                raise APIStatusError(response.status, self.url(path))
+            yield response.data["results"]
+            after = response.data["next"]
+            if after is None:
+                return
+
+    async def paginate(self, path: str = '', page_size: int = 500, **params) -> AsyncIterator[dict]:
+        async for page in self.paginate_pages(path, page_size, **params):
+            for item in page:
+                yield item
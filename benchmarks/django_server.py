@@ -0,0 +1,134 @@
+"""
+Django API для нагрузочных тестов: отдельная SQLite-база с засеянными пользователями
+и сервер, запущенный в потоке того же процесса.
+
+Настройки Django задаются здесь же и указывают только на базу бенчмарка,
+поэтому рабочая база проекта не затрагивается.
+"""
+import os
+import random
+import sys
+import threading
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DJANGO_ROOT = os.path.join(ROOT, "telegram_bot")
+SEED_BATCH_SIZE = 10000
+
+
+def configure_django(db_path: str):
+    if DJANGO_ROOT not in sys.path:
+        sys.path.insert(0, DJANGO_ROOT)
+
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY="benchmark",
+        ALLOWED_HOSTS=["*"],
+        INSTALLED_APPS=[
+            "django.contrib.admin",
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "django.contrib.sessions",
+            "django.contrib.messages",
+            "rest_framework",
+            "users",
+        ],
+        MIDDLEWARE=[],
+        ROOT_URLCONF="telegram_bot.urls",
+        DATABASES={
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": db_path,
+                "OPTIONS": {"timeout": 30, "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;"},
+            }
+        },
+        USE_TZ=True,
+        TIME_ZONE="UTC",
+        DEFAULT_AUTO_FIELD="django.db.models.BigAutoField",
+        LOGGING_CONFIG=None,
+    )
+    django.setup()
+
+
+def migrate():
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0, interactive=False)
+
+
+def seed_users(count: int, seed: int = 0) -> dict:
+    """
+    Засевает count пользователей с детерминированным распределением:
+    каждый 10000-й — администратор, 30% с подпиской (в том числе истекшие
+    и истекающие), половина решала задачи сегодня.
+    """
+    from django.utils import timezone
+    from users.models import User
+
+    rnd = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localdate()
+    admins = max(1, count // 10000)
+    subscribed = 0
+    for start in range(1, count + 1, SEED_BATCH_SIZE):
+        batch = []
+        for telegram_id in range(start, min(start + SEED_BATCH_SIZE, count + 1)):
+            is_subscribed = rnd.random() < 0.3
+            subscribed += is_subscribed
+            batch.append(User(
+                telegram_id=telegram_id,
+                username=f"user{telegram_id}",
+                is_admin=telegram_id <= admins,
+                is_subscribed=is_subscribed,
+                subscription_end=now + timedelta(hours=rnd.uniform(-5 * 24, 30 * 24)) if is_subscribed else None,
+                tasks_completed=rnd.randint(0, 500),
+                daily_tasks_completed=rnd.randint(0, 20),
+                daily_tasks_date=today if rnd.random() < 0.5 else today - timedelta(days=1),
+            ))
+        User.objects.bulk_create(batch)
+    return {"users": count, "admins": admins, "subscribed": subscribed}
+
+
+def restore_subscriptions():
+    """Возвращает подписки, снятые прогоном сценария (у засеянных подписчиков есть subscription_end)."""
+    from users.models import User
+
+    return User.objects.filter(subscription_end__isnull=False, is_subscribed=False).update(is_subscribed=True)
+
+
+class DjangoTestServer:
+    """Сервер Django в фоновом потоке; URL API — api_url."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/users/"
+
+    def start(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadedWSGIServer((self.host, self.port), QuietHandler, allow_reuse_address=True)
+        self._server.set_app(WSGIHandler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="django-bench", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
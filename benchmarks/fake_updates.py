@@ -0,0 +1,165 @@
+"""
+Генератор фейковых обновлений Telegram для webhook-режима бота.
+
+Отправляет синтетические сообщения на webhook и считает пропускную способность
+без реального Telegram. С флагом --self-test поднимает локальный webhook-сервер
+с пустым обработчиком, чтобы измерить накладные расходы самого приема обновлений.
+
+    python benchmarks/fake_updates.py --url http://127.0.0.1:8080/webhook --secret s --count 10000
+    python benchmarks/fake_updates.py --self-test --count 20000 --concurrency 200
+    python benchmarks/fake_updates.py --self-test --shards 4 --cpu-ms 5 --count 4000
+"""
+import argparse
+import asyncio
+import functools
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import SECRET_HEADER  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "/start",
+    "/word_count",
+    "Съешь же ещё этих мягких французских булок, да выпей чаю.",
+    "The quick brown fox jumps over the lazy dog " * 20,
+]
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "username": f"user{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def iter_updates(count: int, users: int, texts=SAMPLE_TEXTS, seed: int = 0):
+    rnd = random.Random(seed)
+    for update_id in range(1, count + 1):
+        yield make_update(update_id, rnd.randint(1, users), rnd.choice(texts))
+
+
+async def send_updates(url: str, secret: str, count: int, concurrency: int, users: int) -> dict:
+    updates = iter_updates(count, users)
+    statuses = {}
+    latencies = []
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def worker():
+            for update in updates:
+                started = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "sent": count,
+        "statuses": statuses,
+        "elapsed": elapsed,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p99": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+    }
+
+
+def bench_app(cpu_ms: float = 0.0):
+    """Приложение для --self-test: обработчик только занимает CPU на cpu_ms миллисекунд."""
+    from aiogram import Bot, Dispatcher
+
+    dp = Dispatcher()
+
+    @dp.message()
+    async def busy(message):
+        deadline = time.perf_counter() + cpu_ms / 1000
+        while time.perf_counter() < deadline:
+            pass
+
+    return dp, Bot(token="123456:fake")
+
+
+async def self_test(args) -> dict:
+    from aiohttp import web
+    from sharding import ShardedWebhookServer, ShardSupervisor
+    from webhook import WebhookServer
+
+    supervisor = None
+    if args.shards > 1:
+        supervisor = ShardSupervisor(functools.partial(bench_app, args.cpu_ms), args.shards,
+                                     queue_size=args.queue_size, concurrency=args.workers)
+        supervisor.start()
+        server = ShardedWebhookServer(supervisor, bench_app()[1], secret_token=args.secret,
+                                      admission_timeout=args.admission_timeout)
+    else:
+        dp, bot = bench_app(args.cpu_ms)
+        server = WebhookServer(dp, bot, secret_token=args.secret, queue_size=args.queue_size, workers=args.workers)
+    app = web.Application()
+    server.setup(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    try:
+        started = time.perf_counter()
+        result = await send_updates(f"http://127.0.0.1:{args.port}{server.path}", args.secret,
+                                    args.count, args.concurrency, args.users)
+        # Ждем, пока воркеры обработают все принятое, и считаем полную пропускную способность
+        if supervisor is not None:
+            while supervisor.stats()["pending"]:
+                await asyncio.sleep(0.01)
+        else:
+            await server.queue.join()
+        elapsed = time.perf_counter() - started
+        result["processed_throughput"] = server.received / elapsed if elapsed else 0.0
+        result["server"] = server.stats()
+        return result
+    finally:
+        await runner.cleanup()
+        if supervisor is not None:
+            await supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", "bench-secret"))
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--self-test", action="store_true")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--shards", type=int, default=1, help="число процессов-воркеров в --self-test")
+    parser.add_argument("--admission-timeout", type=float, default=2.0,
+                        help="сколько запрос ждет места в очереди воркера при --shards > 1")
+    parser.add_argument("--cpu-ms", type=float, default=0.0, help="CPU-нагрузка обработчика на одно обновление")
+    args = parser.parse_args()
+
+    if args.self_test:
+        result = asyncio.run(self_test(args))
+    else:
+        result = asyncio.run(send_updates(args.url, args.secret, args.count, args.concurrency, args.users))
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Нагрузочные сценарии бота на локальных заглушках Telegram и Django.
+
+Каждый сценарий запускается в отдельном процессе: в нем поднимаются заглушка
+Bot API, Django API на копии засеянной базы и сам бот (модуль bot.py), а обновления
+подаются прямо в диспетчер. Для каждого сценария считаются p50/p95/p99 задержки,
+пропускная способность и пиковый RSS процесса (бот и Django вместе).
+
+Сценарии прогоняются для каждого бэкенда данных из --backend: rest (через
+Django API) и orm (ORM в процессе бота); результаты orm идут как "<сценарий>:orm".
+
+    python benchmarks/run.py --scale 1k
+    python benchmarks/run.py --scale 100k --scenario word_count admin_stats
+    python benchmarks/run.py --backend orm
+    python benchmarks/run.py --scale 1k --save-baseline   # записать benchmarks/baselines/1k.json
+
+Если для масштаба есть сохраненный baseline, результаты сравниваются с ним, и при
+ухудшении p95 или пропускной способности больше чем на --threshold процентов
+скрипт завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+BASELINES_DIR = os.path.join(BENCH_DIR, "baselines")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_updates import make_update  # noqa: E402
+
+SCALES = {"1k": 1000, "100k": 100_000, "1m": 1_000_000}
+WORD_COUNT_TEXT = " ".join(
+    ["Съешь же ещё этих мягких французских булок, да выпей чаю."] * 40
+    + ["The quick brown fox jumps over the lazy dog."] * 40
+)
+
+
+def parse_scale(scale: str) -> int:
+    return SCALES.get(scale.lower()) or int(scale)
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summarize(latencies: list, ops: int, elapsed: float, **extra) -> dict:
+    return {
+        "ops": ops,
+        "elapsed": round(elapsed, 4),
+        "throughput": round(ops / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **extra,
+    }
+
+
+async def timed(latencies: list, coro):
+    started = time.perf_counter()
+    await coro
+    latencies.append(time.perf_counter() - started)
+
+
+class Context:
+    """Все, что нужно сценарию: модуль бота, заглушка Telegram и параметры прогона."""
+
+    def __init__(self, bot_module, telegram, users: int, args):
+        self.bot_module = bot_module
+        self.telegram = telegram
+        self.users = users
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self._update_ids = iter(range(1, 1 << 62))
+
+    def update(self, user_id: int, text: str):
+        from aiogram.types import Update
+
+        data = make_update(next(self._update_ids), user_id, text)
+        return Update.model_validate(data, context={"bot": self.bot_module.bot})
+
+    async def feed(self, user_id: int, text: str):
+        await self.bot_module.dp.feed_update(self.bot_module.bot, self.update(user_id, text))
+
+
+async def scenario_word_count(ctx: Context) -> dict:
+    """Всплеск /word_count: каждый пользователь присылает команду и текст."""
+    bot_module = ctx.bot_module
+    await bot_module.store.start()
+    latencies = []
+    semaphore = asyncio.Semaphore(ctx.args.concurrency)
+    user_ids = [ctx.rnd.randint(1, ctx.users) for _ in range(ctx.args.requests)]
+
+    async def session(user_id):
+        async with semaphore:
+            await timed(latencies, ctx.feed(user_id, "/word_count"))
+            await timed(latencies, ctx.feed(user_id, WORD_COUNT_TEXT))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    await bot_module.task_aggregator.close()
+    await bot_module.store.close()
+    bot_module.shutdown_executor()
+    return summarize(latencies, len(latencies), elapsed, telegram_calls=sum(ctx.telegram.calls.values()))
+
+
+async def repeat(ctx: Context, prepare, action) -> tuple:
+    """
+    Выполняет action warmup + iterations раз; prepare (сброс кешей и данных)
+    в замер не входит. Возвращает задержки без прогрева и их сумму.
+    """
+    latencies = []
+    for i in range(ctx.args.warmup + ctx.args.iterations):
+        await prepare()
+        started = time.perf_counter()
+        await action()
+        if i >= ctx.args.warmup:
+            latencies.append(time.perf_counter() - started)
+    return latencies, sum(latencies)
+
+
+async def scenario_startup(ctx: Context) -> dict:
+    """Холодный запуск: startup диспетчера и фоновая установка команд администраторам."""
+    bot_module = ctx.bot_module
+
+    async def prepare():
+        # Без сохраненного реестра команды ставятся заново, как при первом запуске
+        bot_module.command_registry._digests.clear()
+
+    async def startup():
+        await bot_module.dp.emit_startup(bot=bot_module.bot)
+        await asyncio.gather(*bot_module.background_tasks)
+        await bot_module.dp.emit_shutdown(bot=bot_module.bot)
+
+    latencies, elapsed = await repeat(ctx, prepare, startup)
+    return summarize(latencies, len(latencies), elapsed, set_my_commands=ctx.telegram.calls["setMyCommands"])
+
+
+async def scenario_subscription_sweep(ctx: Context) -> dict:
+    """Ежедневная проверка подписок: снятие истекших и рассылка напоминаний."""
+    from django_server import restore_subscriptions
+
+    bot_module = ctx.bot_module
+    await bot_module.store.start()
+
+    async def prepare():
+        await asyncio.to_thread(restore_subscriptions)
+        bot_module.user_cache.clear()
+
+    latencies, elapsed = await repeat(ctx, prepare, bot_module.check_subscriptions)
+    await bot_module.store.close()
+    runs = ctx.args.warmup + ctx.args.iterations
+    return summarize(latencies, len(latencies), elapsed, reminders=ctx.telegram.calls["sendMessage"] // runs)
+
+
+async def scenario_admin_stats(ctx: Context) -> dict:
+    """/admin_stats без кешей бота и Django: агрегаты и первая страница пользователей."""
+    from django.core.cache import cache
+
+    bot_module = ctx.bot_module
+    await bot_module.store.start()
+
+    async def prepare():
+        bot_module.stats_cache.clear()
+        await asyncio.to_thread(cache.clear)
+
+    latencies, elapsed = await repeat(ctx, prepare, lambda: ctx.feed(1, "/admin_stats"))
+    await bot_module.store.close()
+    return summarize(latencies, len(latencies), elapsed)
+
+
+SCENARIOS = {
+    "word_count": scenario_word_count,
+    "startup": scenario_startup,
+    "subscription_sweep": scenario_subscription_sweep,
+    "admin_stats": scenario_admin_stats,
+}
+
+
+def template_path(users: int) -> str:
+    return os.path.join(DATA_DIR, f"users-{users}.sqlite3")
+
+
+def _seed_process(users: int, seed: int, result):
+    from django_server import configure_django, migrate, seed_users
+
+    path = template_path(users)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    configure_django(tmp_path)
+    migrate()
+    result.put(seed_users(users, seed))
+    from django.db import connection
+
+    # Переносим WAL в основной файл, чтобы шаблон копировался одним файлом
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+    os.replace(tmp_path, path)
+
+
+def ensure_seeded(users: int, seed: int):
+    """Засевает шаблонную базу один раз на масштаб; сценарии работают с ее копиями."""
+    if os.path.exists(template_path(users)):
+        return
+    os.makedirs(DATA_DIR, exist_ok=True)
+    print(f"Засеваем {users} пользователей...")
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    process = context.Process(target=_seed_process, args=(users, seed, result))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"Не удалось засеять базу (код {process.exitcode})")
+    print(f"Засеяно за {time.perf_counter() - started:.1f} с: {result.get()}")
+
+
+def _scenario_process(name: str, backend: str, users: int, args, result):
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        db_path = os.path.join(workdir, "db.sqlite3")
+        shutil.copy(template_path(users), db_path)
+
+        from django_server import DjangoTestServer, configure_django, migrate
+
+        configure_django(db_path)
+        # Шаблон мог быть засеян до новых миграций
+        migrate()
+        django_server = DjangoTestServer()
+        django_server.start()
+        try:
+            result.put(asyncio.run(_run_scenario(name, backend, users, args, django_server.api_url, workdir)))
+        finally:
+            django_server.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def _run_scenario(name: str, backend: str, users: int, args, api_url: str, workdir: str) -> dict:
+    from fake_telegram import FakeTelegramServer
+
+    telegram = FakeTelegramServer(latency=args.telegram_latency_ms / 1000)
+    await telegram.start()
+    os.environ.update({
+        "TELEGRAM_TOKEN_BOT": "123456:benchmark",
+        "TELEGRAM_API_URL": telegram.url,
+        "DJANGO_API_URL": api_url,
+        "STATS_API_URL": f"{api_url}stats/",
+        # Лимиты Telegram на заглушке не нужны: меряем сам бот
+        "BROADCAST_RATE": "100000",
+        "BROADCAST_PER_CHAT_RATE": "100000",
+        "COMMANDS_RATE": "100000",
+        "BROADCAST_STATE_DIR": os.path.join(workdir, "broadcast_state"),
+        "COMMANDS_STATE_FILE": os.path.join(workdir, "bot_commands.json"),
+        "FSM_STORAGE": "memory",
+        "DATA_BACKEND": backend,
+    })
+    try:
+        bot_module = importlib.import_module("bot")
+        try:
+            return await SCENARIOS[name](Context(bot_module, telegram, users, args))
+        finally:
+            await bot_module.bot.session.close()
+    finally:
+        await telegram.stop()
+
+
+def run_scenario(name: str, backend: str, users: int, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    process = context.Process(target=_scenario_process, args=(name, backend, users, args, result))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"error": f"exit code {process.exitcode}"}
+    return result.get()
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Возвращает список регрессий относительно baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "error" in current:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold / 100):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс")
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - threshold / 100):
+            regressions.append(f"{name}: throughput {previous['throughput']} -> {current['throughput']} оп/с")
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    columns = ("ops", "throughput", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+    print(f"{'scenario':<24}" + "".join(f"{column:>14}" for column in columns))
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<24}  {result['error']}")
+            continue
+        print(f"{name:<24}" + "".join(f"{result[column]:>14}" for column in columns))
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous:
+            print(f"{'  baseline':<24}" + "".join(f"{previous.get(column, ''):>14}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="1k", help="1k, 100k, 1m или число пользователей")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--backend", nargs="+", choices=("rest", "orm"), default=["rest", "orm"],
+                        help="бэкенды доступа к данным (DATA_BACKEND)")
+    parser.add_argument("--requests", type=int, default=500, help="пользователей во всплеске word_count")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=10, help="повторов для startup, sweep и admin_stats")
+    parser.add_argument("--warmup", type=int, default=1, help="прогревочных повторов, не входящих в замер")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=25.0, help="допустимое ухудшение, %%")
+    args = parser.parse_args()
+
+    users = parse_scale(args.scale)
+    ensure_seeded(users, args.seed)
+    results = {}
+    for name in args.scenario:
+        for backend in args.backend:
+            key = name if backend == "rest" else f"{name}:{backend}"
+            print(f"Сценарий {key}...")
+            results[key] = run_scenario(name, backend, users, args)
+
+    baseline_path = os.path.join(BASELINES_DIR, f"{args.scale.lower()}.json")
+    baseline = {}
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "users": users,
+                "scenarios": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Baseline сохранен: {baseline_path}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {regression}")
+    if regressions or any("error" in result for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,165 +1,445 @@
 import os
 import asyncio
-import requests
-import re
-import aiohttp
+import contextlib
+import html
+import logging
+import secrets
 from dotenv import load_dotenv
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime, timedelta
+from datetime import datetime
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import BotCommand, InlineKeyboardButton, InlineKeyboardMarkup, Message, PreCheckoutQuery, LabeledPrice, CallbackQuery, BotCommandScopeChat
+from broadcast import Broadcaster, TokenBucket
+from command_registry import CommandRegistry, commands_digest
+from fsm_storage import create_storage
+from api_client import API_ERRORS, APIStatusError, DjangoAPIClient
+from data_access import STORE_ERRORS, create_store
+from documents import SUPPORTED_EXTENSIONS, DocumentError, DocumentTooLargeError, DocumentWordCount, ProgressReporter, format_size
+from logging_setup import setup_logging, shutdown_logging
+from loop_debug import enable_loop_debug
+from metrics import REGISTRY, MetricsServer, instrument
+from plans import PayloadError, Plan, PlanCatalog, check_invoice, make_payload, parse_payload, payload_secret
+from sharding import run_sharded
+from task_counter import TaskCounterAggregator
+from throttling import AdmissionMiddleware, ThrottlingMiddleware
+from user_cache import UserCache
+from webhook import run_webhook
+from word_frequency import STOP_WORDS, WordReport, count_text_async, shutdown_executor
 
 load_dotenv()
 
+logger = logging.getLogger("bot")
+
 API_TOKEN = os.getenv('TELEGRAM_TOKEN_BOT')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Свой сервер Bot API (локальный или тестовый), по умолчанию api.telegram.org
 DJANGO_API_URL = os.getenv('DJANGO_API_URL', 'http://127.0.0.1:8000/api/users/')
 STATS_API_URL = os.getenv('STATS_API_URL', 'http://127.0.0.1:8000/api/users/stats/')
 PAYMENT_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN")
+PAYMENT_PAYLOAD_SECRET = os.getenv('PAYMENT_PAYLOAD_SECRET')  # Ключ подписи payload счета, по умолчанию из токена бота
+INVOICE_TTL = float(os.getenv('INVOICE_TTL', '86400'))  # Сколько секунд выставленный счет можно оплатить
+PLANS_REFRESH_INTERVAL = float(os.getenv('PLANS_REFRESH_INTERVAL', '600'))
+PRE_CHECKOUT_USER_TIMEOUT = float(os.getenv('PRE_CHECKOUT_USER_TIMEOUT', '2'))  # Ожидание Django при промахе кеша
+
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'rest')  # rest — через Django API, orm — напрямую в базу из процесса бота
+DJANGO_SETTINGS = os.getenv('DJANGO_SETTINGS_MODULE', 'telegram_bot.settings')
+ORM_THREADS = int(os.getenv('ORM_THREADS', '4'))
+# Сколько бесплатных задач в день доступно без подписки
+FREE_DAILY_TASKS_LIMIT = int(os.getenv('FREE_DAILY_TASKS_LIMIT', '5'))
+# Тексты длиннее порога считаются в отдельном процессе, чтобы не блокировать бота
+WORD_COUNT_OFFLOAD_THRESHOLD = int(os.getenv('WORD_COUNT_OFFLOAD_THRESHOLD', '20000'))
+WORD_COUNT_CASEFOLD = os.getenv('WORD_COUNT_CASEFOLD', '0') == '1'
+WORD_COUNT_SKIP_STOP_WORDS = os.getenv('WORD_COUNT_SKIP_STOP_WORDS', '0') == '1'
+# Результат подсчета: сколько самых частых слов показывать (0 — все) и строк на странице
+WORD_COUNT_TOP = int(os.getenv('WORD_COUNT_TOP', '0'))
+WORD_COUNT_PAGE_LINES = int(os.getenv('WORD_COUNT_PAGE_LINES', '50'))
+# Сколько результатов и как долго (секунд) хранить для листания страниц
+WORD_REPORT_CACHE_SIZE = int(os.getenv('WORD_REPORT_CACHE_SIZE', '1000'))
+WORD_REPORT_TTL = float(os.getenv('WORD_REPORT_TTL', '3600'))
+# Максимальный размер файла для /word_count без подписки и с подпиской (Bot API отдает файлы до 20 МБ)
+DOCUMENT_MAX_SIZE_FREE = int(os.getenv('DOCUMENT_MAX_SIZE_FREE', str(1024 * 1024)))
+DOCUMENT_MAX_SIZE_SUBSCRIBED = int(os.getenv('DOCUMENT_MAX_SIZE_SUBSCRIBED', str(20 * 1024 * 1024)))
+DOCUMENT_DOWNLOAD_TIMEOUT = int(os.getenv('DOCUMENT_DOWNLOAD_TIMEOUT', '120'))
+# Как часто (секунд) обновлять сообщение с прогрессом долгого подсчета
+WORD_COUNT_PROGRESS_INTERVAL = float(os.getenv('WORD_COUNT_PROGRESS_INTERVAL', '3'))
+# Пул соединений к Django API
+API_POOL_LIMIT = int(os.getenv('API_POOL_LIMIT', '100'))
+API_POOL_LIMIT_PER_HOST = int(os.getenv('API_POOL_LIMIT_PER_HOST', '20'))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '10'))
+API_RETRIES = int(os.getenv('API_RETRIES', '3'))
+API_RETRY_BACKOFF = float(os.getenv('API_RETRY_BACKOFF', '0.2'))
+# Режим отладки event loop: предупреждения о медленных колбэках и запрет блокирующего I/O
+BOT_DEBUG_LOOP = os.getenv('BOT_DEBUG_LOOP', '0') == '1'
+SLOW_CALLBACK_THRESHOLD = float(os.getenv('SLOW_CALLBACK_THRESHOLD', '0.1'))
+# Кеш пользователей в памяти бота
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+# Сколько пользователей запрашивать одним пакетным запросом
+USERS_BATCH_SIZE = int(os.getenv('USERS_BATCH_SIZE', '500'))
+# Пакетная отправка счетчиков задач: раз в TASKS_FLUSH_INTERVAL_MS или после TASKS_FLUSH_MAX_EVENTS событий
+TASKS_BATCH_ENABLED = os.getenv('TASKS_BATCH_ENABLED', '0') == '1'
+TASKS_FLUSH_INTERVAL_MS = int(os.getenv('TASKS_FLUSH_INTERVAL_MS', '500'))
+TASKS_FLUSH_MAX_EVENTS = int(os.getenv('TASKS_FLUSH_MAX_EVENTS', '100'))
+# Рассылки: параллельность, глобальный лимит и лимит на чат (сообщений/с), каталог с прогрессом
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))
+BROADCAST_PER_CHAT_RATE = float(os.getenv('BROADCAST_PER_CHAT_RATE', '1'))
+BROADCAST_STATE_DIR = os.getenv('BROADCAST_STATE_DIR', 'broadcast_state')
+# Файл с уже установленными наборами команд и лимит вызовов set_my_commands в секунду
+COMMANDS_STATE_FILE = os.getenv('COMMANDS_STATE_FILE', 'bot_commands.json')
+COMMANDS_RATE = float(os.getenv('COMMANDS_RATE', '20'))
+# Статистика для администраторов: размер страницы и время кеширования в боте
+STATS_PAGE_SIZE = int(os.getenv('STATS_PAGE_SIZE', '15'))
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30'))
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес, например https://example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '16'))
+# Хранилище FSM: memory или sqlite (переживает перезапуск); брошенные состояния живут FSM_STATE_TTL секунд
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_SQLITE_PATH = os.getenv('FSM_SQLITE_PATH', 'fsm_state.sqlite3')
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '3600'))
+FSM_MAX_STATES = int(os.getenv('FSM_MAX_STATES', '100000'))
+FSM_SWEEP_INTERVAL = float(os.getenv('FSM_SWEEP_INTERVAL', '300'))
+# Многопроцессный режим: при BOT_SHARDS > 1 обновления раздаются BOT_SHARDS воркерам по telegram_id
+# Выигрыш дает только на нескольких ядрах: на одном ядре воркеры и ingress делят CPU и работают медленнее одного процесса
+BOT_SHARDS = int(os.getenv('BOT_SHARDS', '1'))
+SHARD_QUEUE_SIZE = int(os.getenv('SHARD_QUEUE_SIZE', '1000'))
+SHARD_CONCURRENCY = int(os.getenv('SHARD_CONCURRENCY', '64'))
+SHARD_HEALTH_INTERVAL = float(os.getenv('SHARD_HEALTH_INTERVAL', '5'))
+SHARD_HEARTBEAT_TIMEOUT = float(os.getenv('SHARD_HEARTBEAT_TIMEOUT', '30'))
+# Сколько webhook-запрос ждет места в очереди воркера, прежде чем получить 503
+SHARD_ADMISSION_TIMEOUT = float(os.getenv('SHARD_ADMISSION_TIMEOUT', '2'))
+# Логи (LOG_FORMAT=text или json) и адрес /metrics; METRICS_PORT=0 отключает метрики
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '1'))  # Обновлений в секунду от одного пользователя
+THROTTLE_BURST = float(os.getenv('THROTTLE_BURST', '5'))
+HEAVY_CONCURRENCY = int(os.getenv('HEAVY_CONCURRENCY', '4'))  # Одновременных тяжелых обработчиков (/word_count)
+HEAVY_QUEUE_LIMIT = int(os.getenv('HEAVY_QUEUE_LIMIT', '50'))  # Дальше тяжелые запросы сразу получают отказ
+
+bot = Bot(
+    token=API_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+)
+fsm_storage = create_storage(FSM_STORAGE, ttl=FSM_STATE_TTL, maxsize=FSM_MAX_STATES, path=FSM_SQLITE_PATH)
+# Диспетчер сам закрывает хранилище при остановке
+dp = Dispatcher(storage=fsm_storage)
+api = DjangoAPIClient(
+    DJANGO_API_URL,
+    limit=API_POOL_LIMIT,
+    limit_per_host=API_POOL_LIMIT_PER_HOST,
+    timeout=API_TIMEOUT,
+    retries=API_RETRIES,
+    backoff=API_RETRY_BACKOFF,
+)
+store = create_store(DATA_BACKEND, api, settings_module=DJANGO_SETTINGS, threads=ORM_THREADS)
+user_cache = UserCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+broadcaster = Broadcaster(
+    bot,
+    state_dir=BROADCAST_STATE_DIR,
+    concurrency=BROADCAST_CONCURRENCY,
+    global_rate=BROADCAST_RATE,
+    per_chat_rate=BROADCAST_PER_CHAT_RATE,
+)
+command_registry = CommandRegistry(COMMANDS_STATE_FILE)
+# Сводка и страницы статистики одинаковы для всех администраторов
+stats_cache = UserCache(maxsize=64, ttl=STATS_CACHE_TTL)
+# Посчитанные результаты /word_count для листания без повторного подсчета
+word_reports = UserCache(maxsize=WORD_REPORT_CACHE_SIZE, ttl=WORD_REPORT_TTL)
+# Тарифы из Django; пока они не загружены, действует прежний месячный тариф
+plan_catalog = PlanCatalog([Plan("month", "1 месяц", 29000, "RUB", 30)])
+payload_key = PAYMENT_PAYLOAD_SECRET.encode("utf-8") if PAYMENT_PAYLOAD_SECRET else payload_secret(API_TOKEN)
+background_tasks = set()
+
+def run_in_background(coro):
+    # Держим ссылку на задачу, иначе ее может собрать сборщик мусора
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def send_task_increments(increments: list) -> bool:
+    return await store.add_tasks_bulk(increments)
+
+task_aggregator = TaskCounterAggregator(
+    send_task_increments,
+    flush_interval=TASKS_FLUSH_INTERVAL_MS / 1000,
+    max_events=TASKS_FLUSH_MAX_EVENTS,
+    batch_size=USERS_BATCH_SIZE,
+)
+
+throttling = ThrottlingMiddleware(rate=THROTTLE_RATE, burst=THROTTLE_BURST)
+admission = AdmissionMiddleware(concurrency=HEAVY_CONCURRENCY, queue_limit=HEAVY_QUEUE_LIMIT)
+for observer in (dp.message, dp.callback_query):
+    observer.outer_middleware(throttling)
+    observer.middleware(admission)
+
+instrument(dp, bot)
+metrics_server = MetricsServer()
+admission.register_metrics()
+REGISTRY.callback("bot_cache_requests_total", "Обращения к кешам бота", lambda: {
+    ("users", "hit"): user_cache.hits, ("users", "miss"): user_cache.misses,
+    ("stats", "hit"): stats_cache.hits, ("stats", "miss"): stats_cache.misses,
+    ("word_reports", "hit"): word_reports.hits, ("word_reports", "miss"): word_reports.misses,
+}, labels=("cache", "result"), kind="counter")
+REGISTRY.callback("bot_cache_size", "Записей в кешах бота", lambda: {
+    "users": len(user_cache), "stats": len(stats_cache), "word_reports": len(word_reports),
+}, labels=("cache",))
+REGISTRY.callback("bot_task_counter_backlog", "Пользователи с неотправленными счетчиками задач", task_aggregator.backlog)
+PRE_CHECKOUT = REGISTRY.counter("bot_pre_checkout_total", "Ответы на pre-checkout", ("result",))
+REGISTRY.callback("bot_background_tasks", "Фоновые задачи бота", lambda: len(background_tasks))
+REGISTRY.callback("bot_fsm_states_removed_total", "Удаленные состояния FSM", fsm_storage.stats,
+                  labels=("reason",), kind="counter")
+
+def with_pending_tasks(telegram_id: int, user: dict) -> dict:
+    """Добавляет к данным с сервера инкременты, которые еще лежат в агрегаторе."""
+    tasks, daily = task_aggregator.pending(telegram_id)
+    if tasks or daily:
+        user = dict(user)
+        user["tasks_completed"] = user.get("tasks_completed", 0) + tasks
+        if "daily_tasks_completed" in user:
+            user["daily_tasks_completed"] += daily
+    return user
 
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
 class WordCountStates(StatesGroup):
     waiting_for_text = State()
 
 # Асинхронная функция для работы с API
 async def get_user_data(telegram_id: int):
-    response = requests.get(f"{DJANGO_API_URL}{telegram_id}/")
-    if response.status_code == 200:
-        return response.json()
-    return None
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+    user = await store.get_user(telegram_id)
+    if user is not None:
+        user = with_pending_tasks(telegram_id, user)
+        user_cache.set(telegram_id, user)
+    return user
+
+async def get_users_data(telegram_ids: list) -> dict:
+    """
+    Возвращает данные нескольких пользователей ({telegram_id: user}).
+    Промахи кеша запрашиваются пакетно, а не по одному запросу на пользователя.
+    """
+    users = {}
+    missing = []
+    for telegram_id in telegram_ids:
+        user = user_cache.get(telegram_id)
+        if user is not None:
+            users[telegram_id] = user
+        else:
+            missing.append(telegram_id)
+
+    for start in range(0, len(missing), USERS_BATCH_SIZE):
+        chunk = missing[start:start + USERS_BATCH_SIZE]
+        for user in await store.get_users(chunk):
+            user = with_pending_tasks(user["telegram_id"], user)
+            user_cache.set(user["telegram_id"], user)
+            users[user["telegram_id"]] = user
+    return users
 
 async def is_user_registered(telegram_id: int) -> bool:
     """
     Проверяет, зарегистрирован ли пользователь по Telegram ID.
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{DJANGO_API_URL}{telegram_id}/") as response:
-            if response.status == 200:
-                # Пользователь существует в базе данных
-                return True
-            elif response.status == 404:
-                # Пользователь не найден
-                return False
-            else:
-                # Произошла ошибка
-                raise Exception(f"Ошибка при проверке пользователя: {response.status}")
+    return await get_user_data(telegram_id) is not None
 
 async def update_user_tasks(telegram_id: int, tasks_completed: int, daily_tasks_completed: int):
-    async with aiohttp.ClientSession() as session:
-        async with session.patch(
-            f"{DJANGO_API_URL}{telegram_id}/update_tasks/",
-            json={
-                "tasks_completed": tasks_completed,
-                "daily_tasks_completed": daily_tasks_completed,
-            }
-        ) as response:
-            return response.status == 200
+    if TASKS_BATCH_ENABLED:
+        # Счетчики уйдут на сервер пакетом, а кеш обновляем сразу — лимит проверяется по нему
+        task_aggregator.add(telegram_id, tasks_completed, daily_tasks_completed)
+        user_cache.increment(telegram_id, "tasks_completed", tasks_completed)
+        user_cache.increment(telegram_id, "daily_tasks_completed", daily_tasks_completed)
+        return True
+
+    if not await store.add_tasks(telegram_id, tasks_completed, daily_tasks_completed):
+        user_cache.invalidate(telegram_id)
+        return False
+    user_cache.increment(telegram_id, "tasks_completed", tasks_completed)
+    user_cache.increment(telegram_id, "daily_tasks_completed", daily_tasks_completed)
+    return True
 
 async def check_subscriptions():
     """
     Проверяет окончание подписки у пользователей и отправляет уведомления.
+    Истекшие подписки деактивируются на стороне сервера одним запросом.
     """
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Получаем всех пользователей
-            async with session.get(DJANGO_API_URL) as response:
-                if response.status == 200:
-                    users = await response.json()
-
-                    for user in users:
-                        telegram_id = user.get("telegram_id")
-                        subscription_end = user.get("subscription_end")  # Дата окончания подписки
-                        is_subscribed = user.get("is_subscribed", False)
-
-                        if subscription_end and is_subscribed:
-                            # Преобразуем строку даты в объект datetime
-                            subscription_end_date = datetime.strptime(subscription_end, "%Y-%m-%d")
-                            days_left = (subscription_end_date - datetime.now()).days
-
-                            if days_left == 2:  # Если осталось 2 дня
-                                await bot.send_message(
-                                    chat_id=telegram_id,
-                                    text=(
-                                        "📢 Уважаемый пользователь!\n\n"
-                                        "Ваша подписка заканчивается через 2 дня. "
-                                        "Продлите её, чтобы продолжить пользоваться ботом без ограничений."
-                                    )
-                                )
-                            elif days_left < 0:  # Если подписка истекла
-                                update_data = {"is_subscribed": False}
-                                async with session.patch(f"{DJANGO_API_URL}{telegram_id}/", json=update_data) as update_response:
-                                    if update_response.status == 200:
-                                        print(f"Подписка пользователя {telegram_id} деактивирована.")
-                else:
-                    print(f"Ошибка получения пользователей: {response.status}")
-        except Exception as e:
-            print(f"Ошибка проверки подписок: {e}")
+    try:
+        result = await store.expire_subscriptions()
+        for telegram_id in result["expired"]:
+            user_cache.update(telegram_id, is_subscribed=False)
+        logger.info("Подписки деактивированы", extra={"expired": len(result["expired"])})
+
+        # Напоминаем тем, у кого осталось 2 дня
+        stats = await broadcaster.run(
+            f"reminders-{datetime.now():%Y-%m-%d}",
+            result["reminders"],
+            text=(
+                "📢 Уважаемый пользователь!\n\n"
+                "Ваша подписка заканчивается через 2 дня. "
+                "Продлите её, чтобы продолжить пользоваться ботом без ограничений."
+            )
+        )
+        logger.info("Напоминания о подписке разосланы", extra=stats)
+    except Exception:
+        logger.exception("Ошибка проверки подписок")
 
 async def fetch_statistics():
     try:
-        response = requests.get(STATS_API_URL)
-        if response.status_code == 200:
-            return response.json()
+        response = await api.get(STATS_API_URL)
+        if response.status == 200:
+            return response.data
         else:
             return None
-    except requests.RequestException as e:
-        print(f"Ошибка при запросе статистики: {e}")
+    except API_ERRORS as e:
+        logger.warning("Ошибка при запросе статистики", extra={"error": str(e)})
         return None
 
 @dp.startup()
-async def on_startup(bot: Bot):
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Получаем всех пользователей
-            async with session.get(DJANGO_API_URL) as response:
-                if response.status == 200:
-                    users = await response.json()
-                    # Обходим всех пользователей и настраиваем команды
-                    for user in users:
-                        telegram_id = user.get("telegram_id")
-                        is_registered = await is_user_registered(telegram_id)
-                        if telegram_id and is_registered:
-                            try:
-                                await set_bot_commands(bot, telegram_id)
-                            except Exception as e:
-                                print(f"Ошибка при установке команд для пользователя {telegram_id}: {e}")
-                else:
-                    print(f"Ошибка получения списка пользователей: {response.status}")
-        except Exception as e:
-            print(f"Ошибка при запросе к API: {e}")
+async def on_startup(bot: Bot, shard_index: int = 0):
+    await store.start()
+    if METRICS_PORT:
+        # В многопроцессном режиме порт METRICS_PORT занят ingress-процессом
+        await metrics_server.start(METRICS_HOST, METRICS_PORT + (shard_index + 1 if BOT_SHARDS > 1 else 0))
+    if TASKS_BATCH_ENABLED:
+        task_aggregator.start()
+    fsm_storage.start_sweeper(FSM_SWEEP_INTERVAL)
+    plan_catalog.start_refresher(store, PLANS_REFRESH_INTERVAL)
+    # В многопроцессном режиме общие для всего бота задачи запускает только первый воркер
+    if shard_index != 0:
+        return
+    # Команды настраиваются в фоне, уже после начала приема обновлений
+    run_in_background(setup_bot_commands(bot))
+
+    # Досылаем рассылки, прерванные прошлым перезапуском
+    run_in_background(broadcaster.resume())
 
     scheduler = AsyncIOScheduler()
     scheduler.add_job(check_subscriptions, "interval", days=1)  # Запускать ежедневно
     scheduler.start()
-    print("Фоновая проверка подписок запущена.")
+    logger.info("Фоновая проверка подписок запущена")
+
+@dp.shutdown()
+async def on_shutdown():
+    await task_aggregator.close()
+    await plan_catalog.close()
+    await store.close()
+    await metrics_server.stop()
+    shutdown_executor()
+
+DEFAULT_COMMANDS = [
+    BotCommand(command="/word_count", description="Подсчет слов"),
+    BotCommand(command="/subscribe", description="Оплата подписки"),
+]
+ADMIN_COMMANDS = DEFAULT_COMMANDS + [
+    BotCommand(command="/admin_stats", description="Статистика (только для администраторов)"),
+    BotCommand(command="/add_admin", description="Добавить админа (только для администраторов)"),
+    BotCommand(command="/announce", description="Рассылка всем пользователям (только для администраторов)"),
+]
+commands_rate = TokenBucket(COMMANDS_RATE)
+
+async def apply_commands(bot: Bot, commands: list, scope=None):
+    """Вызывает set_my_commands с учетом лимитов Telegram."""
+    while True:
+        await commands_rate.acquire()
+        try:
+            await bot.set_my_commands(commands, scope=scope)
+            return
+        except TelegramRetryAfter as e:
+            commands_rate.pause(e.retry_after)
 
-async def set_bot_commands(bot: Bot, telegram_id: int):
-    commands = [
-        BotCommand(command="/word_count", description="Подсчет слов"),
-        BotCommand(command="/subscribe", description="Оплата подписки"),
-    ]
+async def delete_commands(bot: Bot, scope):
+    """Вызывает delete_my_commands с учетом лимитов Telegram."""
+    while True:
+        await commands_rate.acquire()
+        try:
+            await bot.delete_my_commands(scope=scope)
+            return
+        except TelegramRetryAfter as e:
+            commands_rate.pause(e.retry_after)
+
+async def clear_chat_commands(bot: Bot, telegram_id: int):
+    """Убирает отдельный набор команд чата: дальше действует набор по умолчанию."""
+    try:
+        await delete_commands(bot, BotCommandScopeChat(chat_id=telegram_id))
+        command_registry.forget(telegram_id)
+    except TelegramBadRequest as e:
+        # Чат недоступен (пользователь удалил бота) — снимать нечего
+        logger.info("Не удалось снять команды чата", extra={"telegram_id": telegram_id, "error": str(e)})
+        command_registry.forget(telegram_id)
+    except Exception as e:
+        logger.warning("Ошибка при снятии команд чата", extra={"telegram_id": telegram_id, "error": str(e)})
 
+async def setup_bot_commands(bot: Bot):
+    """
+    Ставит общий набор команд один раз через scope по умолчанию,
+    а отдельные наборы по чатам — только администраторам.
+    Чаты, где нужный набор уже установлен, пропускаются; у бывших
+    администраторов отдельный набор снимается.
+    """
+    try:
+        digest = commands_digest(DEFAULT_COMMANDS)
+        if not command_registry.is_current("default", digest):
+            await apply_commands(bot, DEFAULT_COMMANDS)
+            command_registry.mark("default", digest)
+
+        # Постранично обходим администраторов: на страницу уходит один запрос списка
+        admins = set()
+        async for page in store.user_pages(USERS_BATCH_SIZE, fields=["telegram_id", "is_admin"], is_admin=True):
+            for user in page:
+                admins.add(user["telegram_id"])
+                await set_bot_commands(bot, user["telegram_id"], user)
+
+        for telegram_id in set(command_registry.chat_ids()) - admins:
+            await clear_chat_commands(bot, telegram_id)
+
+        # Раньше отдельный набор ставился каждому пользователю и перекрывал набор по умолчанию,
+        # поэтому изменения DEFAULT_COMMANDS до них не доходили. Снимаем такие наборы один раз.
+        if not command_registry.is_current("legacy_chat_scopes", "cleared"):
+            async for page in store.user_pages(USERS_BATCH_SIZE, fields=["telegram_id"], is_admin=False):
+                for user in page:
+                    await clear_chat_commands(bot, user["telegram_id"])
+            command_registry.mark("legacy_chat_scopes", "cleared")
+    except Exception:
+        logger.exception("Ошибка при настройке команд бота")
+
+async def set_bot_commands(bot: Bot, telegram_id: int, user: dict = None):
     try:
-        is_registered = await is_user_registered(telegram_id)
-        if is_registered:
-            # Проверяем, является ли пользователь администратором
+        # Данные пользователя можно передать заранее (например, из пакетного запроса)
+        if user is None:
             user = await get_user_data(telegram_id)
-            if user and user.get('is_admin', False):  # Проверяем, что пользователь является администратором
-                commands.extend([
-                    BotCommand(command="/admin_stats", description="Статистика (только для администраторов)"),
-                    BotCommand(command="/add_admin", description="Добавить админа (только для администраторов)"),
-                ])
     except Exception as e:
-        print(f"Ошибка при получении данных пользователя {telegram_id}: {e}")
-    
+        logger.warning("Ошибка при получении данных пользователя", extra={"telegram_id": telegram_id, "error": str(e)})
+        return
+
+    # Обычным пользователям достаточно команд по умолчанию; бывшему администратору снимаем его набор
+    if not (user and user.get('is_admin', False)):
+        if telegram_id in command_registry.chat_ids():
+            await clear_chat_commands(bot, telegram_id)
+        return
+
+    digest = commands_digest(ADMIN_COMMANDS)
+    if command_registry.is_current(telegram_id, digest):
+        return
     try:
-        # Устанавливаем команды для пользователя
-        await bot.set_my_commands(commands, scope=BotCommandScopeChat(chat_id=telegram_id))
+        # Устанавливаем команды для администратора
+        await apply_commands(bot, ADMIN_COMMANDS, scope=BotCommandScopeChat(chat_id=telegram_id))
+        command_registry.mark(telegram_id, digest)
     except Exception as e:
-        print(f"Ошибка при установке команд для чата {telegram_id}: {e}")
+        logger.warning("Ошибка при установке команд для чата", extra={"telegram_id": telegram_id, "error": str(e)})
 
 # Создание инлайн-меню
 def get_inline_menu():
@@ -198,15 +478,14 @@ async def process_add_admin(message: Message, state: FSMContext):
             await state.clear()
             return
 
-        # Обновляем данные пользователя через API
-        async with aiohttp.ClientSession() as session:
-            update_data = {"is_admin": True}
-            async with session.patch(f"{DJANGO_API_URL}{new_admin_id}/", json=update_data) as response:
-                if response.status == 200:
-                    await message.reply(f"Пользователь с Telegram ID {new_admin_id} теперь является администратором.")
-                else:
-                    await message.reply("Ошибка при обновлении данных пользователя. Попробуйте позже.")
-        
+        # Обновляем данные пользователя
+        if await store.update_user(new_admin_id, is_admin=True):
+            user_cache.update(new_admin_id, is_admin=True)
+            await set_bot_commands(bot, new_admin_id, {**user_data, "is_admin": True})
+            await message.reply(f"Пользователь с Telegram ID {new_admin_id} теперь является администратором.")
+        else:
+            await message.reply("Ошибка при обновлении данных пользователя. Попробуйте позже.")
+
         await state.clear()  # Очищение состояния
 
     except ValueError:
@@ -231,19 +510,17 @@ async def process_register_callback(callback: CallbackQuery):
     telegram_id = message.chat.id
     username = message.chat.username or "Unknown"
     
-    data = {
-        "telegram_id": telegram_id,
-        "username": username,
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(DJANGO_API_URL, json=data) as response:
-            if response.status == 201:
-                await message.reply(f"Регистрация прошла успешно, {username}.")
-            elif response.status == 400:
-                await message.reply("Вы уже зарегистрированы.")
-            else:
-                await message.reply("Произошла ошибка, пожалуйста, повторите позже.")
+    try:
+        created = await store.create_user(telegram_id, username)
+    except STORE_ERRORS:
+        created = None
+    user_cache.invalidate(telegram_id)
+    if created:
+        await message.reply(f"Регистрация прошла успешно, {username}.")
+    elif created is False:
+        await message.reply("Вы уже зарегистрированы.")
+    else:
+        await message.reply("Произошла ошибка, пожалуйста, повторите позже.")
 
     # Уведомляем пользователя, что обработка завершена
     await callback.answer()  # Закрывает уведомление о нажатии
@@ -251,9 +528,80 @@ async def process_register_callback(callback: CallbackQuery):
 @dp.message(Command('word_count'))
 async def word_count_command(message: Message, state: FSMContext):
     # Этот обработчик срабатывает при вводе команды /word_count
-    await message.reply("Пожалуйста, отправьте текст для подсчета слов.")
+    await message.reply(
+        "Пожалуйста, отправьте текст или файл ("
+        + ", ".join(sorted(SUPPORTED_EXTENSIONS))
+        + ") для подсчета слов."
+    )
     await state.set_state(WordCountStates.waiting_for_text)  # Переход к состоянию ожидания текста
 
+# Листание страниц статистики администратора
+@dp.callback_query(lambda callback: (callback.data or "").startswith("stats:"))
+async def admin_stats_page_callback(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    if not await is_admin(user_id):
+        await callback.answer("У вас нет прав администратора.", show_alert=True)
+        return
+    try:
+        page = int(callback.data.split(":", 1)[1])
+        summary, users_page = await get_admin_stats(user_id, page)
+        await callback.message.edit_text(
+            render_admin_stats(summary, users_page),
+            parse_mode="HTML",
+            reply_markup=get_stats_keyboard(users_page["page"], users_page["pages"]),
+        )
+    except TelegramBadRequest:
+        # Сообщение не изменилось (повторное нажатие) — ничего делать не нужно
+        pass
+    except (ValueError, *STORE_ERRORS) as e:
+        await callback.answer(f"Ошибка при получении статистики: {e}", show_alert=True)
+        return
+    await callback.answer()
+
+# Листание страниц результата /word_count
+@dp.callback_query(lambda callback: (callback.data or "").startswith("words:"))
+async def word_report_page_callback(callback: CallbackQuery):
+    try:
+        _, token, page = callback.data.split(":")
+        page = int(page)
+    except ValueError:
+        await callback.answer()
+        return
+    report = word_reports.get(f"{callback.from_user.id}:{token}")
+    if report is None:
+        await callback.answer("Результат устарел, отправьте текст заново.", show_alert=True)
+        return
+    page = min(max(page, 1), report.pages)
+    try:
+        await callback.message.edit_text(
+            report.page(page),
+            parse_mode="HTML",
+            reply_markup=get_words_keyboard(token, page, report.pages),
+        )
+    except TelegramBadRequest:
+        # Нажата кнопка текущей страницы — текст не изменился
+        pass
+    await callback.answer()
+
+def get_words_keyboard(token: str, page: int, pages: int):
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"words:{token}:{page - 1}"))
+    buttons.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data=f"words:{token}:{page}"))
+    if page < pages:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"words:{token}:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+# Выбор тарифа после /subscribe
+@dp.callback_query(lambda callback: (callback.data or "").startswith("plan:"))
+async def plan_callback(callback: CallbackQuery):
+    plan = plan_catalog.get(callback.data.split(":", 1)[1])
+    if plan is None:
+        await callback.answer("Этот тариф больше недоступен, выберите другой: /subscribe", show_alert=True)
+        return
+    await send_plan_invoice(callback.message.chat.id, callback.from_user.id, plan)
+    await callback.answer()
+
 @dp.callback_query()
 async def handle_callbacks(callback: CallbackQuery, state: FSMContext):
     if callback.data == "word_count":
@@ -261,7 +609,29 @@ async def handle_callbacks(callback: CallbackQuery, state: FSMContext):
         await state.set_state(WordCountStates.waiting_for_text)  # Ставим состояние на ожидание текста
         await callback.answer()
 
-@dp.message(WordCountStates.waiting_for_text)
+async def count_document_words(message: Message, limit: int):
+    """Считает слова в документе; возвращает (счетчик, сообщение с прогрессом или None)."""
+    job = DocumentWordCount(
+        message.bot,
+        message.document,
+        limit,
+        casefold=WORD_COUNT_CASEFOLD,
+        stop_words=STOP_WORDS if WORD_COUNT_SKIP_STOP_WORDS else None,
+        timeout=DOCUMENT_DOWNLOAD_TIMEOUT,
+    )
+    progress = ProgressReporter(message, job, interval=WORD_COUNT_PROGRESS_INTERVAL)
+    progress.start()
+    try:
+        word_count = await job.run()
+    except BaseException:
+        status = await progress.stop()
+        if status is not None:
+            with contextlib.suppress(TelegramBadRequest):
+                await status.delete()
+        raise
+    return word_count, await progress.stop()
+
+@dp.message(WordCountStates.waiting_for_text, flags={"heavy": True})
 async def count_words(message: Message, state: FSMContext):
     telegram_id = message.from_user.id
 
@@ -274,24 +644,48 @@ async def count_words(message: Message, state: FSMContext):
 
         # Проверяем подписку и лимит
         is_subscribed = user_data.get('is_subscribed', False)
-        tasks_completed = user_data.get('tasks_completed', 0)
+        daily_tasks_completed = user_data.get('daily_tasks_completed', 0)
 
-        if not is_subscribed and tasks_completed >= 5:
+        if not is_subscribed and daily_tasks_completed >= FREE_DAILY_TASKS_LIMIT:
             await message.reply("Вы превысили лимит задач за день. Оформите подписку для продолжения.")
             await state.clear()
             return
 
-        # Подсчет слов
-        text = message.text
-        words = re.sub(r'[^\w\s]', '', text).split()
-        word_count = {word: words.count(word) for word in words}
-
-        sorted_words = sorted(word_count.items())
-        output = "<b>📊 Частота слов:</b>\n\n"
-        for word, count in sorted_words:
-            output += f"<b>{word}</b>: <i>{count}</i> раз(а)\n"
+        # Подсчет слов: документ читается потоком, текст сообщения считается целиком
+        status = None
+        if message.document is not None:
+            limit = DOCUMENT_MAX_SIZE_SUBSCRIBED if is_subscribed else DOCUMENT_MAX_SIZE_FREE
+            try:
+                word_count, status = await count_document_words(message, limit)
+            except DocumentError as e:
+                text = f"{e}."
+                if isinstance(e, DocumentTooLargeError) and not is_subscribed:
+                    text += f" С подпиской можно до {format_size(DOCUMENT_MAX_SIZE_SUBSCRIBED)}: /subscribe"
+                # Состояние не сбрасываем: можно сразу прислать другой файл или текст
+                await message.reply(text)
+                return
+        elif message.text:
+            word_count = await count_text_async(
+                message.text,
+                casefold=WORD_COUNT_CASEFOLD,
+                stop_words=STOP_WORDS if WORD_COUNT_SKIP_STOP_WORDS else None,
+                offload_threshold=WORD_COUNT_OFFLOAD_THRESHOLD,
+            )
+        else:
+            await message.reply("Отправьте текст или файл для подсчета слов.")
+            return
 
-        await message.reply(output, parse_mode="HTML")
+        report = WordReport(word_count, top=WORD_COUNT_TOP or None, page_lines=WORD_COUNT_PAGE_LINES)
+        reply_markup = None
+        if report.pages > 1:
+            token = secrets.token_hex(4)
+            word_reports.set(f"{telegram_id}:{token}", report)
+            reply_markup = get_words_keyboard(token, 1, report.pages)
+        if status is not None:
+            # Сообщение с прогрессом превращается в результат
+            await status.edit_text(report.page(1), parse_mode="HTML", reply_markup=reply_markup)
+        else:
+            await message.reply(report.page(1), parse_mode="HTML", reply_markup=reply_markup)
 
         # Обновляем статистику
         await update_user_tasks(
@@ -331,33 +725,73 @@ async def subscribe(message: Message):
         await message.reply(f"Произошла ошибка при проверке регистрации: {e}")
         return
 
-    # Продолжение оформления подписки
-    price = 29000  # Цена в копейках (29000 = 290 рублей)
-
-    # Определим список цен для инвойса (можно добавить разные тарифы)
-    prices = [LabeledPrice(label="Подписка на месяц", amount=price)]
+    # Продолжение оформления подписки: один тариф — сразу счет, несколько — выбор
+    plans = list(plan_catalog)
+    if len(plans) == 1:
+        await send_plan_invoice(message.chat.id, telegram_id, plans[0])
+        return
+    await message.reply("Выберите тариф подписки:", reply_markup=get_plans_keyboard(plans))
 
-    # Генерируем уникальный payload для отслеживания оплаты
-    payload = f"subscription-{telegram_id}-{price}"
+def get_plans_keyboard(plans: list):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"{plan.title} — {plan.price / 100:g} {plan.currency}", callback_data=f"plan:{plan.code}")]
+        for plan in plans
+    ])
 
-    # Отправка инвойса
+async def send_plan_invoice(chat_id: int, telegram_id: int, plan: Plan):
+    # Payload подписан: pre-checkout проверяет его без обращения к Django
     await bot.send_invoice(
-        chat_id=message.chat.id,
+        chat_id=chat_id,
         title="Оформление подписки на бот",
-        description="Оплата за подписку на 1 месяц.",
+        description=f"Оплата подписки на {plan.days} дн.",
         provider_token=PAYMENT_TOKEN,
-        currency="rub",
-        prices=prices,
-        payload=payload,
+        currency=plan.currency,
+        prices=[LabeledPrice(label=f"Подписка: {plan.title}", amount=plan.price)],
+        payload=make_payload(payload_key, plan, telegram_id),
         start_parameter="subscription",
         is_flexible=False
     )
 
+PRE_CHECKOUT_ERRORS = {
+    "invalid_payload": "Счет недействителен. Запросите новый командой /subscribe.",
+    "unknown_plan": "Этот тариф больше недоступен. Выберите другой командой /subscribe.",
+    "price_mismatch": "Цена тарифа изменилась. Запросите новый счет командой /subscribe.",
+}
+
+async def check_pre_checkout(query: PreCheckoutQuery):
+    """
+    Проверяет счет по подписи payload, кешу тарифов и кешу пользователей.
+    Возвращает (причина, текст для пользователя) при отказе или None.
+    """
+    reason = check_invoice(payload_key, plan_catalog, query.invoice_payload, query.from_user.id,
+                           query.total_amount, query.currency, max_age=INVOICE_TTL)
+    if reason is not None:
+        return reason, PRE_CHECKOUT_ERRORS[reason]
+
+    user = user_cache.get(query.from_user.id)
+    if user is None:
+        try:
+            user = await asyncio.wait_for(get_user_data(query.from_user.id), PRE_CHECKOUT_USER_TIMEOUT)
+        except STORE_ERRORS:
+            # Подпись уже доказывает, что счет выставлен этому пользователю: не срываем оплату из-за Django
+            return None
+        if user is None:
+            return "not_registered", "Для оплаты подписки нужно зарегистрироваться: /start."
+    return None
+
 # Обработка предоплаты
 @dp.pre_checkout_query()
 async def process_pre_checkout(pre_checkout_query: PreCheckoutQuery):
-    # Ответ на запрос предоплаты, чтобы подтвердить платеж
-    await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+    # Telegram ждет ответ не дольше 10 секунд, поэтому проверка идет по данным в памяти
+    rejection = await check_pre_checkout(pre_checkout_query)
+    if rejection is None:
+        PRE_CHECKOUT.inc("ok")
+        await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+        return
+    reason, error_message = rejection
+    PRE_CHECKOUT.inc(reason)
+    logger.info("Оплата отклонена", extra={"telegram_id": pre_checkout_query.from_user.id, "reason": reason})
+    await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=False, error_message=error_message)
 
 # Обработка успешной оплаты
 @dp.message(lambda message: message.successful_payment is not None)
@@ -368,76 +802,190 @@ async def handle_successful_payment(message: Message):
     currency = payment_info.currency
     user_id = message.from_user.id
 
-    # Проверка и обновление подписки в базе данных
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{DJANGO_API_URL}{user_id}/") as response:
-            if response.status == 200:
-                user_data = await response.json()
-                is_subscribed = user_data.get("is_subscribed", False)
-                current_subscription_end = user_data.get("subscription_end")
-
-                # Вычисляем новую дату окончания подписки
-                today = datetime.now()
-                if current_subscription_end:
-                    # Если подписка уже была, продлеваем от текущей даты окончания
-                    current_end_date = datetime.strptime(current_subscription_end, "%Y-%m-%dT%H:%M:%S")
-                    new_subscription_end = max(current_end_date, today) + timedelta(days=30)
-                else:
-                    # Если подписки не было, начинаем отсчет с текущей даты
-                    new_subscription_end = today + timedelta(days=30)
-
-                # Обновляем данные подписки
-                update_data = {
-                    "is_subscribed": True,
-                    "subscription_end": new_subscription_end.isoformat()
-                }
-
-                async with session.patch(f"{DJANGO_API_URL}{user_id}/", json=update_data) as update_response:
-                    if update_response.status == 200:
-                        await message.reply(
-                            f"🎉 Спасибо за оплату!\n"
-                            f"💰 Сумма: {amount} {currency}\n"
-                            f"Подписка активирована до {new_subscription_end.strftime('%Y-%m-%d')}!"
-                        )
-                    else:
-                        await message.reply("Ошибка активации подписки. Попробуйте позже.")
-            else:
-                await message.reply("Ошибка получения данных пользователя. Попробуйте позже.")
+    # Срок берем из подписанного payload, а не из текущих тарифов: тариф мог измениться
+    # после выставления счета. Без срока сервер продлит на срок по умолчанию
+    extra = {}
+    try:
+        invoice = parse_payload(payload_key, payment_info.invoice_payload)
+        if invoice.days is not None:
+            extra["days"] = invoice.days
+    except PayloadError:
+        logger.warning("Оплачен счет с неверным payload", extra={"charge_id": payment_info.telegram_payment_charge_id})
+
+    # Продление одним атомарным запросом; повторная доставка того же платежа ничего не меняет
+    try:
+        result = await store.extend_subscription(
+            user_id,
+            payment_info.telegram_payment_charge_id,
+            total_amount=payment_info.total_amount,
+            currency=payment_info.currency,
+            provider_payment_charge_id=payment_info.provider_payment_charge_id,
+            invoice_payload=payment_info.invoice_payload,
+            **extra,
+        )
+    except STORE_ERRORS:
+        # Деньги списаны, а подписка не продлена: платеж нужно будет провести вручную
+        logger.exception("Ошибка продления подписки", extra={
+            "telegram_id": user_id, "charge_id": payment_info.telegram_payment_charge_id,
+        })
+        await message.reply("Ошибка активации подписки. Мы уже разбираемся, подписка будет продлена.")
+        return
+
+    if result is None:
+        await message.reply("Ошибка получения данных пользователя. Попробуйте позже.")
+        return
+
+    user_cache.update(user_id, is_subscribed=True, subscription_end=result["subscription_end"])
+    await message.reply(
+        f"🎉 Спасибо за оплату!\n"
+        f"💰 Сумма: {amount} {currency}\n"
+        f"Подписка активирована до {result['subscription_end'][:10]}!"
+    )
 
 async def is_admin(telegram_id: int) -> bool:
     """Функция для проверки, является ли пользователь администратором."""
     user_data = await get_user_data(telegram_id)
-    return user_data.get("is_admin", False)
+    return bool(user_data and user_data.get("is_admin"))
+
+async def get_admin_stats(admin_id: int, page: int):
+    """Возвращает сводку и страницу статистики пользователей (с кешем на STATS_CACHE_TTL)."""
+    summary = stats_cache.get("summary")
+    if summary is None:
+        summary = await store.daily_statistics(admin_id)
+        stats_cache.set("summary", summary)
+
+    users_page = stats_cache.get(f"page:{page}")
+    if users_page is None:
+        users_page = await store.daily_statistics_users(admin_id, page, STATS_PAGE_SIZE)
+        stats_cache.set(f"page:{page}", users_page)
+    return summary, users_page
+
+def render_admin_stats(summary: dict, users_page: dict) -> str:
+    lines = [
+        "<b>📊 Ежедневная статистика:</b>\n",
+        f"Пользователей: <b>{summary['total_users']}</b>",
+        f"Активных сегодня: <b>{summary['active_today']}</b>",
+        f"Подписчиков: <b>{summary['subscribers']}</b>",
+        f"Задач за день: <b>{summary['daily_tasks_total']}</b>, всего: <b>{summary['tasks_total']}</b>\n",
+    ]
+    if summary["top"]:
+        lines.append("<b>🏆 Топ за день:</b>")
+        for place, user in enumerate(summary["top"], start=1):
+            username = html.escape((user["username"] or "—")[:32])
+            lines.append(f"{place}. {username} – <b>{user['daily_tasks_completed']}</b>")
+        lines.append("")
+
+    lines.append(f"<b>Пользователи (стр. {users_page['page']}/{users_page['pages']}):</b>")
+    for user in users_page["results"]:
+        username = html.escape((user["username"] or "—")[:32])
+        lines.append(
+            f"<b>{username} – {user['telegram_id']}</b>\n"
+            f"  Количество за день: <b>{user['daily_tasks_completed']}</b>\n"
+            f"  Общее количество: <b>{user['tasks_completed']}</b>"
+        )
+
+    cache_stats = user_cache.stats()
+    lines.append(
+        f"\n<i>Кеш пользователей: попаданий {cache_stats['hits']}, "
+        f"промахов {cache_stats['misses']}, записей {cache_stats['size']}</i>"
+    )
+    return "\n".join(lines)
+
+def get_stats_keyboard(page: int, pages: int):
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"stats:{page - 1}"))
+    if page < pages:
+        buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"stats:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
 
 @dp.message(Command("admin_stats"))
 async def admin_stats(message: Message):
     user_id = message.from_user.id
     if await is_admin(user_id):
         try:
-            response = requests.get(f"{DJANGO_API_URL}{user_id}/daily_statistics/")
-            # Логируем ответ
-            print(response.text)  # Логируем текст ответа
-
-            # Проверяем, что ответ корректен
-            if response.status_code == 200:
-                stats = response.json()
-                if isinstance(stats, dict):
-                    stats_message = "<b>📊 Ежедневная статистика:</b>\n\n"
-                    for user_id, user in stats.items():
-                        username, daily_tasks, tasks = user.values()
-                        stats_message += f"<b>{username} – {user_id}</b>\n  Количество за день: <b>{daily_tasks}</b>\n  Общее количество: <b>{tasks}\n\n</b>"
-                    await message.reply(stats_message, parse_mode="HTML")
-                else:
-                    await message.reply("Не удалось получить статистику. Ответ не в формате JSON.", parse_mode="HTML")
-            else:
-                await message.reply(f"Ошибка при получении статистики: {response.status_code}", parse_mode="HTML")
-        except requests.exceptions.RequestException as e:
-            await message.reply(f"Ошибка при обращении к серверу: {e}", parse_mode="HTML")
+            summary, users_page = await get_admin_stats(user_id, page=1)
+            await message.reply(
+                render_admin_stats(summary, users_page),
+                parse_mode="HTML",
+                reply_markup=get_stats_keyboard(users_page["page"], users_page["pages"]),
+            )
+        except APIStatusError as e:
+            await message.reply(f"Ошибка при получении статистики: {e.status}", parse_mode="HTML")
+        except STORE_ERRORS as e:
+            await message.reply(f"Ошибка при обращении к серверу: {html.escape(str(e))}", parse_mode="HTML")
     else:
         await message.reply("У вас нет прав администратора.", parse_mode="HTML")
 
+# Команда /announce <текст> — рассылка объявления всем пользователям
+@dp.message(Command("announce"))
+async def announce_command(message: Message, command: CommandObject):
+    if not await is_admin(message.from_user.id):
+        await message.reply("У вас нет прав администратора.")
+        return
+    if not command.args:
+        await message.reply("Использование: /announce <текст объявления>")
+        return
+
+    async def announce():
+        chat_ids = [user["telegram_id"] async for user in store.users(fields=["telegram_id"])]
+        stats = await broadcaster.run(f"announce-{message.message_id}-{message.chat.id}", chat_ids, command.args)
+        await message.reply(
+            f"Рассылка завершена: доставлено {stats['sent']}, ошибок {stats['failed']}, "
+            f"{stats['throughput']:.1f} сообщ./с."
+        )
+
+    run_in_background(announce())
+    await message.reply("Рассылка запущена.")
+
+def create_shard_app():
+    """Точка входа воркера: модуль бота импортируется в нем заново."""
+    setup_logging(LOG_LEVEL, LOG_FORMAT)
+    return dp, bot
+
 async def main():
-    await dp.start_polling(bot, skip_updates=True)
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        raise SystemExit("Для режима webhook нужен секрет: задайте WEBHOOK_SECRET.")
+    if BOT_DEBUG_LOOP:
+        enable_loop_debug(asyncio.get_running_loop(), SLOW_CALLBACK_THRESHOLD)
+    if BOT_SHARDS > 1:
+        await run_sharded(
+            create_shard_app,
+            dp,
+            bot,
+            shards=BOT_SHARDS,
+            mode=BOT_MODE,
+            base_url=WEBHOOK_URL,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            queue_size=SHARD_QUEUE_SIZE,
+            concurrency=SHARD_CONCURRENCY,
+            health_interval=SHARD_HEALTH_INTERVAL,
+            heartbeat_timeout=SHARD_HEARTBEAT_TIMEOUT,
+            admission_timeout=SHARD_ADMISSION_TIMEOUT,
+            metrics_host=METRICS_HOST,
+            metrics_port=METRICS_PORT,
+        )
+    elif BOT_MODE == "webhook":
+        await run_webhook(
+            dp,
+            bot,
+            base_url=WEBHOOK_URL,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            queue_size=WEBHOOK_QUEUE_SIZE,
+            workers=WEBHOOK_WORKERS,
+        )
+    else:
+        await dp.start_polling(bot, skip_updates=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())  # Запуск бота
\ No newline at end of file
+    setup_logging(LOG_LEVEL, LOG_FORMAT)
+    try:
+        asyncio.run(main())  # Запуск бота
+    finally:
+        shutdown_logging()
\ No newline at end of file
@@ -0,0 +1,318 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами нет, там работает один процесс бота
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MESSAGES = REGISTRY.counter("bot_broadcast_messages_total", "Сообщения рассылок по результату", ("result",))
+
+# Сколько обработанных чатов копить перед дозаписью в .done: после падения процесса
+# повторно могут уйти не больше этого числа сообщений
+DONE_FLUSH_SIZE = 50
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate операций в секунду, всплеск до capacity.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds: float):
+        """Запрещает выдачу токенов на seconds секунд (после RetryAfter)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def delay(self) -> float:
+        """Пытается взять токен; возвращает 0 при успехе или сколько ждать."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class BroadcastStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.latencies = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+            "elapsed": elapsed,
+            "throughput": self.sent / elapsed if elapsed else 0.0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
+
+
+class BroadcastBusyError(Exception):
+    """Рассылку с этим id уже выполняет другой процесс или задача."""
+
+
+class _DoneLog:
+    """Файл обработанных чатов рассылки: id копятся в памяти и дописываются пачками в потоке пула."""
+
+    def __init__(self, path: str, batch_size: int = DONE_FLUSH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = asyncio.Lock()
+
+    def _append(self, chat_ids: list):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{chat_id}\n" for chat_id in chat_ids))
+
+    async def add(self, chat_id: int):
+        self._pending.append(chat_id)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            chat_ids, self._pending = self._pending, []
+            await asyncio.to_thread(self._append, chat_ids)
+
+
+class Broadcaster:
+    """
+    Рассылка сообщений многим чатам с ограничением параллельности и скорости.
+
+    Скорость ограничена глобально (лимит Telegram ~30 сообщений/с) и для каждого
+    чата отдельно. TelegramRetryAfter приостанавливает всю рассылку на указанное
+    время. Прогресс каждой рассылки пишется на диск, поэтому после перезапуска
+    resume() досылает только недоставленное. Пока рассылка идет, ее .lock-файл
+    заблокирован (flock), поэтому воркеры в многопроцессном режиме не подхватывают
+    чужие живые рассылки; после падения процесса блокировка снимается сама.
+    """
+
+    def __init__(self, bot: Bot, state_dir: str, concurrency: int = 20,
+                 global_rate: float = 25.0, per_chat_rate: float = 1.0, max_retries: int = 3):
+        self.bot = bot
+        self.state_dir = state_dir
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self.jobs = {}
+
+    def _paths(self, job_id: str):
+        base = os.path.join(self.state_dir, job_id)
+        return f"{base}.json", f"{base}.done", f"{base}.lock"
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                # Выбрасываем ведра чатов, которые уже полностью восстановились
+                self._chat_buckets = {k: v for k, v in self._chat_buckets.items() if not v.idle()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict, stats: BroadcastStats) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            await self._chat_bucket(chat_id).acquire()
+            started = time.monotonic()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                stats.latencies.append(time.monotonic() - started)
+                stats.sent += 1
+                BROADCAST_MESSAGES.inc("sent")
+                return True
+            except TelegramRetryAfter as e:
+                stats.flood_waits += 1
+                BROADCAST_MESSAGES.inc("flood_wait")
+                self.global_bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота — повторять бессмысленно
+                break
+            except (TelegramNetworkError, TelegramServerError):
+                await asyncio.sleep(2 ** attempt)
+            except TelegramAPIError as e:
+                logger.warning("Ошибка отправки сообщения", extra={"chat_id": chat_id, "error": str(e)})
+                break
+            stats.retries += 1
+        stats.failed += 1
+        BROADCAST_MESSAGES.inc("failed")
+        return False
+
+    async def run(self, job_id: str, chat_ids: Iterable[int], text: str, **kwargs) -> dict:
+        """
+        Запускает рассылку text по chat_ids; kwargs передаются в send_message.
+        """
+        job_path, _, _ = self._paths(job_id)
+        job = {"chat_ids": list(chat_ids), "text": text, "kwargs": kwargs}
+        await asyncio.to_thread(self._create_job, job_path, job)
+        return await self._run(job_id)
+
+    def _create_job(self, job_path: str, job: dict):
+        os.makedirs(self.state_dir, exist_ok=True)
+        # Рассылка с таким id уже начиналась — продолжаем ее, а не начинаем заново
+        if not os.path.exists(job_path):
+            with open(job_path, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False)
+
+    @staticmethod
+    def _lock_job(lock_path: str) -> Optional[int]:
+        """Берет блокировку рассылки; None, если ее уже держат."""
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+        return fd
+
+    @staticmethod
+    def _load_job(job_path: str, done_path: str):
+        if not os.path.exists(job_path):
+            # Рассылку уже закончил тот, кто держал блокировку до нас
+            return None, None
+        with open(job_path, encoding="utf-8") as f:
+            job = json.load(f)
+        done = set()
+        if os.path.exists(done_path):
+            with open(done_path, encoding="utf-8") as f:
+                done = {int(line) for line in f if line.strip()}
+        return job, done
+
+    async def resume(self) -> dict:
+        """Досылает рассылки, прерванные перезапуском; рассылки, которые сейчас идут, пропускает."""
+        results = {}
+        if not os.path.isdir(self.state_dir):
+            return results
+        for name in sorted(os.listdir(self.state_dir)):
+            if name.endswith(".json"):
+                job_id = name[:-len(".json")]
+                try:
+                    results[job_id] = await self._run(job_id)
+                except BroadcastBusyError:
+                    logger.info("Рассылка уже выполняется", extra={"job_id": job_id})
+        return results
+
+    async def _run(self, job_id: str) -> dict:
+        job_path, done_path, lock_path = self._paths(job_id)
+        lock = await asyncio.to_thread(self._lock_job, lock_path)
+        if lock is None:
+            raise BroadcastBusyError(job_id)
+        try:
+            job, done = await asyncio.to_thread(self._load_job, job_path, done_path)
+            if job is None:
+                raise BroadcastBusyError(job_id)
+            return await self._deliver(job_id, job, done)
+        finally:
+            os.close(lock)
+
+    async def _deliver(self, job_id: str, job: dict, done: set) -> dict:
+        job_path, done_path, lock_path = self._paths(job_id)
+        stats = self.jobs[job_id] = BroadcastStats()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        done_log = _DoneLog(done_path)
+
+        async def worker():
+            while True:
+                chat_id = await queue.get()
+                try:
+                    await self._send(chat_id, job["text"], job["kwargs"], stats)
+                except Exception:
+                    # Неожиданная ошибка не должна убивать воркер, иначе очередь встанет навсегда
+                    logger.exception("Ошибка рассылки", extra={"job_id": job_id, "chat_id": chat_id})
+                    stats.failed += 1
+                    BROADCAST_MESSAGES.inc("failed")
+                try:
+                    # Недоставленным тоже считаем обработанным, чтобы не слать повторно после рестарта
+                    await done_log.add(chat_id)
+                except Exception:
+                    logger.exception("Не удалось записать прогресс рассылки", extra={"job_id": job_id})
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for chat_id in job["chat_ids"]:
+                if chat_id not in done:
+                    await queue.put(chat_id)
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await done_log.flush()
+
+        stats.finished_at = time.monotonic()
+        await asyncio.to_thread(self._remove_job, job_path, done_path, lock_path)
+        return stats.as_dict()
+
+    @staticmethod
+    def _remove_job(job_path: str, done_path: str, lock_path: str):
+        # .lock удаляется последним и еще под блокировкой: кто откроет его после нас,
+        # уже не найдет .json и ничего не отправит
+        os.remove(job_path)
+        for path in (done_path, lock_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
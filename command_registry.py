@@ -0,0 +1,52 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def commands_digest(commands) -> str:
+    """Короткий отпечаток набора команд: меняется при любом изменении списка."""
+    payload = json.dumps([(c.command, c.description) for c in commands], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CommandRegistry:
+    """
+    Хранит на диске, какой набор команд уже установлен в каком чате,
+    чтобы после перезапуска не вызывать set_my_commands для неизменившихся чатов.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._digests = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._digests = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Не удалось прочитать реестр команд, команды будут установлены заново",
+                               extra={"path": path, "error": str(e)})
+
+    def is_current(self, scope, digest: str) -> bool:
+        return self._digests.get(str(scope)) == digest
+
+    def mark(self, scope, digest: str):
+        self._digests[str(scope)] = digest
+        self.save()
+
+    def chat_ids(self) -> list:
+        """Чаты, для которых установлен отдельный набор команд."""
+        return [int(scope) for scope in self._digests if scope.lstrip("-").isdigit()]
+
+    def forget(self, scope):
+        if self._digests.pop(str(scope), None) is not None:
+            self.save()
+
+    def save(self):
+        # Пишем во временный файл и подменяем, чтобы не оставить битый JSON
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._digests, f)
+        os.replace(tmp_path, self.path)
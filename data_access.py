@@ -0,0 +1,367 @@
+"""
+Доступ бота к данным пользователей.
+
+UserStore — общий интерфейс с двумя реализациями:
+RESTUserStore ходит в Django API по HTTP, ORMUserStore вызывает те же функции
+users.services прямо в процессе бота: без сетевого запроса и JSON, через
+sync_to_async на отдельном пуле потоков. Данные в обоих случаях — словари
+в формате JSON API. Бэкенд выбирается переменной DATA_BACKEND (rest / orm).
+"""
+import os
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from api_client import API_ERRORS, APIStatusError, DjangoAPIClient
+from metrics import REGISTRY
+
+DEFAULT_DJANGO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telegram_bot")
+
+ORM_SECONDS = REGISTRY.histogram("bot_orm_call_seconds", "Время обращений к базе из процесса бота", ("operation",))
+
+
+class StoreError(Exception):
+    """Хранилище не смогло выполнить операцию (ошибка БД, отказ в доступе)."""
+
+
+# Исключения, которые может выбросить любой бэкенд
+STORE_ERRORS = API_ERRORS + (StoreError,)
+
+
+class UserStore(ABC):
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        """Данные пользователя или None, если он не зарегистрирован."""
+
+    @abstractmethod
+    async def get_users(self, telegram_ids: list) -> list:
+        """Данные нескольких пользователей; незарегистрированные пропускаются."""
+
+    @abstractmethod
+    async def create_user(self, telegram_id: int, username: str) -> bool:
+        """Регистрирует пользователя; False, если он уже зарегистрирован."""
+
+    @abstractmethod
+    async def update_user(self, telegram_id: int, **fields) -> bool:
+        """Меняет поля пользователя; False, если пользователь не найден или данные неверны."""
+
+    @abstractmethod
+    async def add_tasks(self, telegram_id: int, tasks_completed: int, daily_tasks_completed: int) -> bool:
+        """Прибавляет пользователю решенные задачи; False, если запрос не удался."""
+
+    @abstractmethod
+    async def add_tasks_bulk(self, increments: list) -> bool:
+        """
+        increments — [{"telegram_id", "tasks_completed", "daily_tasks_completed"}, ...].
+        True — принято, False — временная ошибка; APIStatusError с 4xx — пакет отклонен.
+        """
+
+    @abstractmethod
+    async def expire_subscriptions(self) -> dict:
+        """Снимает истекшие подписки: {"expired": [...], "reminders": [...]}."""
+
+    @abstractmethod
+    async def get_plans(self) -> list:
+        """Активные тарифы подписки: [{"code", "title", "price", "currency", "days"}, ...]."""
+
+    @abstractmethod
+    async def extend_subscription(self, telegram_id: int, telegram_payment_charge_id: str, **payment) -> Optional[dict]:
+        """
+        Продлевает подписку по успешному платежу; повтор с тем же telegram_payment_charge_id
+        ничего не меняет. Возвращает {"created", "is_subscribed", "subscription_end"}
+        или None, если пользователь не найден. payment — total_amount, currency,
+        provider_payment_charge_id, invoice_payload, days.
+        """
+
+    @abstractmethod
+    async def daily_statistics(self, admin_id: int) -> dict:
+        """Сводка за сегодня; доступна только администратору admin_id."""
+
+    @abstractmethod
+    async def daily_statistics_users(self, admin_id: int, page: int, page_size: int) -> dict:
+        """Страница статистики по пользователям; доступна только администратору admin_id."""
+
+    @abstractmethod
+    def user_pages(self, page_size: int = 500, fields: list = None, **filters) -> AsyncIterator[list]:
+        """Постраничный обход пользователей; filters — is_admin / is_subscribed."""
+
+    async def users(self, page_size: int = 500, fields: list = None, **filters) -> AsyncIterator[dict]:
+        async for page in self.user_pages(page_size, fields, **filters):
+            for user in page:
+                yield user
+
+
+class RESTUserStore(UserStore):
+    def __init__(self, api: DjangoAPIClient):
+        self.api = api
+
+    async def start(self):
+        await self.api.start()
+
+    async def close(self):
+        await self.api.close()
+
+    def _check(self, response, path: str, *expected: int):
+        if response.status not in expected:
+            raise APIStatusError(response.status, self.api.url(path))
+
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        response = await self.api.get(f"{telegram_id}/")
+        self._check(response, f"{telegram_id}/", 200, 404)
+        return response.data if response.status == 200 else None
+
+    async def get_users(self, telegram_ids: list) -> list:
+        response = await self.api.post("batch/", json={"telegram_ids": telegram_ids})
+        self._check(response, "batch/", 200)
+        return response.data["results"]
+
+    async def create_user(self, telegram_id: int, username: str) -> bool:
+        response = await self.api.post(json={"telegram_id": telegram_id, "username": username})
+        self._check(response, "", 201, 400)
+        return response.status == 201
+
+    async def update_user(self, telegram_id: int, **fields) -> bool:
+        response = await self.api.patch(f"{telegram_id}/", json=fields)
+        self._check(response, f"{telegram_id}/", 200, 400, 404)
+        return response.status == 200
+
+    async def add_tasks(self, telegram_id: int, tasks_completed: int, daily_tasks_completed: int) -> bool:
+        response = await self.api.patch(
+            f"{telegram_id}/update_tasks/",
+            json={"tasks_completed": tasks_completed, "daily_tasks_completed": daily_tasks_completed},
+        )
+        return response.status == 200
+
+    async def add_tasks_bulk(self, increments: list) -> bool:
+        response = await self.api.post("update_tasks/", json={"increments": increments})
+        # 4xx — пакет отклонен окончательно (APIStatusError), 5xx — можно повторить
+        if 400 <= response.status < 500:
+            self._check(response, "update_tasks/", 200)
+        return response.status == 200
+
+    async def expire_subscriptions(self) -> dict:
+        response = await self.api.post("subscriptions/expire/")
+        self._check(response, "subscriptions/expire/", 200)
+        return response.data
+
+    async def get_plans(self) -> list:
+        response = await self.api.get("plans/")
+        self._check(response, "plans/", 200)
+        return response.data["results"]
+
+    async def extend_subscription(self, telegram_id: int, telegram_payment_charge_id: str, **payment) -> Optional[dict]:
+        path = f"{telegram_id}/subscription/extend/"
+        # Сервер узнает повтор по telegram_payment_charge_id, поэтому POST можно повторять при таймаутах
+        response = await self.api.post(
+            path, idempotent=True, json={"telegram_payment_charge_id": telegram_payment_charge_id, **payment}
+        )
+        self._check(response, path, 200, 201, 404)
+        return response.data if response.status != 404 else None
+
+    async def daily_statistics(self, admin_id: int) -> dict:
+        response = await self.api.get(f"{admin_id}/daily_statistics/")
+        self._check(response, f"{admin_id}/daily_statistics/", 200)
+        return response.data
+
+    async def daily_statistics_users(self, admin_id: int, page: int, page_size: int) -> dict:
+        path = f"{admin_id}/daily_statistics/users/"
+        response = await self.api.get(path, params={"page": page, "page_size": page_size})
+        self._check(response, path, 200)
+        return response.data
+
+    def user_pages(self, page_size: int = 500, fields: list = None, **filters) -> AsyncIterator[list]:
+        params = {name: "true" if value else "false" for name, value in filters.items()}
+        if fields is not None:
+            params["fields"] = ",".join(fields)
+        return self.api.paginate_pages(page_size=page_size, **params)
+
+
+class ORMUserStore(UserStore):
+    """
+    Работает с моделями Django в процессе бота. Синхронный ORM выполняется на
+    собственном пуле из threads потоков, поэтому не занимает ни event loop, ни
+    общий пул asyncio.to_thread. Соединения с БД закрываются по тем же правилам
+    CONN_MAX_AGE, что и в цикле HTTP-запроса Django.
+    """
+
+    def __init__(self, settings_module: str = "telegram_bot.settings", django_root: str = DEFAULT_DJANGO_ROOT,
+                 threads: int = 4):
+        self.settings_module = settings_module
+        self.django_root = django_root
+        self.threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        if self._executor is not None:
+            return
+        self._setup_django()
+        self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="orm")
+
+    def _setup_django(self):
+        import django
+        from django.apps import apps
+        from django.conf import settings
+
+        if self.django_root not in sys.path:
+            sys.path.insert(0, self.django_root)
+        # Настройки могли уже задать через settings.configure (бенчмарки) или окружение
+        if not settings.configured:
+            os.environ.setdefault("DJANGO_SETTINGS_MODULE", self.settings_module)
+        if not apps.ready:
+            django.setup()
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _run(self, func, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        if self._executor is None:
+            raise RuntimeError("Хранилище не запущено: вызовите start() при старте бота.")
+        with ORM_SECONDS.time(func.__name__.lstrip("_")):
+            return await sync_to_async(_in_connection, thread_sensitive=False, executor=self._executor)(
+                func, *args, **kwargs
+            )
+
+    async def get_user(self, telegram_id: int) -> Optional[dict]:
+        from users import services
+
+        return await self._run(services.user_detail, telegram_id)
+
+    async def get_users(self, telegram_ids: list) -> list:
+        from users import services
+
+        return await self._run(services.users_batch, telegram_ids)
+
+    async def create_user(self, telegram_id: int, username: str) -> bool:
+        return await self._run(_create_user, telegram_id, username)
+
+    async def update_user(self, telegram_id: int, **fields) -> bool:
+        return await self._run(_update_user, telegram_id, fields)
+
+    async def add_tasks(self, telegram_id: int, tasks_completed: int, daily_tasks_completed: int) -> bool:
+        from users import services
+
+        return await self._run(services.add_tasks, telegram_id, tasks_completed, daily_tasks_completed)
+
+    async def add_tasks_bulk(self, increments: list) -> bool:
+        from users import services
+
+        totals = {}
+        for item in increments:
+            tasks, daily = totals.get(item["telegram_id"], (0, 0))
+            totals[item["telegram_id"]] = (
+                tasks + item.get("tasks_completed", 0),
+                daily + item.get("daily_tasks_completed", 0),
+            )
+        await self._run(services.add_tasks_bulk, totals)
+        return True
+
+    async def expire_subscriptions(self) -> dict:
+        from users.models import sweep_subscriptions
+
+        return await self._run(sweep_subscriptions)
+
+    async def get_plans(self) -> list:
+        from users import services
+
+        return await self._run(services.active_plans)
+
+    async def extend_subscription(self, telegram_id: int, telegram_payment_charge_id: str, **payment) -> Optional[dict]:
+        from users import services
+
+        return await self._run(
+            services.subscription_payment,
+            telegram_id,
+            telegram_payment_charge_id,
+            amount=payment.get("total_amount", 0),
+            currency=payment.get("currency", ""),
+            provider_payment_charge_id=payment.get("provider_payment_charge_id", ""),
+            payload=payment.get("invoice_payload", ""),
+            **({"days": payment["days"]} if "days" in payment else {}),
+        )
+
+    async def daily_statistics(self, admin_id: int) -> dict:
+        from users import services
+
+        await self._run(_check_admin, admin_id)
+        return await self._run(services.statistics_summary)
+
+    async def daily_statistics_users(self, admin_id: int, page: int, page_size: int) -> dict:
+        from users import services
+
+        await self._run(_check_admin, admin_id)
+        return await self._run(services.statistics_users_page, page, page_size)
+
+    async def user_pages(self, page_size: int = 500, fields: list = None, **filters) -> AsyncIterator[list]:
+        from users import services
+
+        after = 0
+        while True:
+            page = await self._run(services.users_page, after, page_size, fields, **filters)
+            yield page["results"]
+            after = page["next"]
+            if after is None:
+                return
+
+
+def _in_connection(func, *args, **kwargs):
+    """Вызов в потоке пула, обрамленный как HTTP-запрос Django."""
+    from django.db import DatabaseError, close_old_connections
+
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except DatabaseError as e:
+        raise StoreError(str(e)) from e
+    finally:
+        close_old_connections()
+
+
+def _create_user(telegram_id: int, username: str) -> bool:
+    from users.serializers import UserSerializer
+
+    serializer = UserSerializer(data={"telegram_id": telegram_id, "username": username})
+    if not serializer.is_valid():
+        return False
+    serializer.save()
+    return True
+
+
+def _update_user(telegram_id: int, fields: dict) -> bool:
+    from users.models import User
+    from users.serializers import UserSerializer
+
+    user = User.objects.filter(telegram_id=telegram_id).first()
+    if user is None:
+        return False
+    serializer = UserSerializer(user, data=fields, partial=True)
+    if not serializer.is_valid():
+        return False
+    serializer.save()
+    return True
+
+
+def _check_admin(telegram_id: int):
+    from users.models import User
+
+    if not User.objects.filter(telegram_id=telegram_id, is_admin=True).exists():
+        raise StoreError(f"Пользователь {telegram_id} не является администратором")
+
+
+def create_store(backend: str, api: DjangoAPIClient, settings_module: str = "telegram_bot.settings",
+                 threads: int = 4) -> UserStore:
+    if backend == "rest":
+        return RESTUserStore(api)
+    if backend == "orm":
+        return ORMUserStore(settings_module, threads=threads)
+    raise ValueError(f"Неизвестный DATA_BACKEND: {backend}")
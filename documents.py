@@ -0,0 +1,239 @@
+"""
+Подсчет слов в присланных документах без загрузки файла в память целиком.
+
+Текстовые файлы (.txt, .csv, .md) скачиваются кусками, которые пакетами
+декодируются и уходят в WordCounter в пуле потоков. .docx — zip-архив, который нельзя разбирать
+потоком, поэтому он скачивается во временный файл и читается через iterparse.
+"""
+import asyncio
+import codecs
+import contextlib
+import logging
+import os
+import tempfile
+import zipfile
+from collections import Counter
+from typing import AsyncIterator, Iterable, Optional
+from xml.etree.ElementTree import ParseError, iterparse
+
+import aiofiles
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Document, Message
+
+from word_frequency import DEFAULT_CHUNK_SIZE, WordCounter
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = frozenset({".txt", ".csv", ".md"})
+DOCX_EXTENSION = ".docx"
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | {DOCX_EXTENSION}
+# Во сколько раз распакованный текст .docx может превышать лимит на файл (защита от zip-бомб)
+DOCX_EXPANSION_LIMIT = 20
+# Сколько скачанных байт передавать в поток подсчета за раз
+COUNT_BATCH_SIZE = 1024 * 1024
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentError(Exception):
+    """Документ не поддерживается, поврежден или больше разрешенного размера."""
+
+
+class DocumentTooLargeError(DocumentError):
+    pass
+
+
+def document_extension(document: Document) -> Optional[str]:
+    extension = os.path.splitext(document.file_name or "")[1].lower()
+    return extension if extension in SUPPORTED_EXTENSIONS else None
+
+
+def format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} МБ"
+    return f"{max(size, 1) // 1024 or 1} КБ"
+
+
+class _TextCounter:
+    """
+    Декодирует байты (UTF-8, а если начало файла не UTF-8 — cp1251) и считает слова.
+    Вызывается из потока пула, но всегда последовательно, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, counter: WordCounter):
+        self.counter = counter
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")("strict")
+        self._started = False
+
+    def feed(self, data: bytes):
+        try:
+            text = self._decoder.decode(data)
+        except UnicodeDecodeError:
+            if self._started:
+                raise
+            # Не UTF-8 с первого куска: русские тексты в этом случае почти всегда в Windows-1251
+            self._decoder = codecs.getincrementaldecoder("cp1251")("replace")
+            text = self._decoder.decode(data)
+        else:
+            # Кодировка подтверждена первым куском, дальше битые байты просто заменяются
+            self._decoder.errors = "replace"
+        self._started = True
+        self.counter.feed(text)
+
+    def finish(self) -> Counter:
+        self.counter.feed(self._decoder.decode(b"", final=True))
+        return self.counter.finish()
+
+
+def count_docx(path: str, limit: int, casefold: bool = False,
+               stop_words: Optional[Iterable[str]] = None) -> Counter:
+    """Считает слова в тексте .docx, не строя дерево документа целиком."""
+    counter = WordCounter(casefold=casefold, stop_words=stop_words)
+    try:
+        with zipfile.ZipFile(path) as archive:
+            if archive.getinfo("word/document.xml").file_size > limit * DOCX_EXPANSION_LIMIT:
+                raise DocumentTooLargeError("Текст документа слишком большой")
+            with archive.open("word/document.xml") as xml:
+                for _, element in iterparse(xml):
+                    if element.tag == f"{_W}t":
+                        # Слово может быть разбито на несколько фрагментов: feed() склеит их
+                        counter.feed(element.text or "")
+                    elif element.tag in (f"{_W}tab", f"{_W}br"):
+                        counter.feed(" ")
+                    elif element.tag == f"{_W}p":
+                        counter.feed("\n")
+                        element.clear()
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise DocumentError("Не удалось прочитать .docx") from e
+    return counter.finish()
+
+
+class DocumentWordCount:
+    """
+    Подсчет слов в одном документе. downloaded и size позволяют показывать
+    прогресс, пока run() еще выполняется. Память ограничена пакетом batch_size и
+    хвостом WordCounter, сам подсчет идет вне event loop.
+    """
+
+    def __init__(self, bot: Bot, document: Document, limit: int, casefold: bool = False,
+                 stop_words: Optional[Iterable[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 batch_size: int = COUNT_BATCH_SIZE, timeout: int = 60):
+        self.bot = bot
+        self.document = document
+        self.limit = limit
+        self.casefold = casefold
+        self.stop_words = frozenset(stop_words) if stop_words else None
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.extension = document_extension(document)
+        self.size = document.file_size or 0
+        self.stage = "download"
+        self.downloaded = 0
+
+    def progress_text(self) -> str:
+        if self.stage != "download":
+            return "⏳ Файл загружен, считаю слова..."
+        if self.size:
+            return f"⏳ Загружаю и считаю: {min(99, self.downloaded * 100 // self.size)}%"
+        return f"⏳ Загружаю и считаю: {format_size(self.downloaded)}"
+
+    async def _iter_content(self) -> AsyncIterator[bytes]:
+        """Куски файла по мере скачивания: так же, как Bot.download, но без записи в файл."""
+        file = await self.bot.get_file(self.document.file_id)
+        api = self.bot.session.api
+        if api.is_local:
+            async with aiofiles.open(api.wrap_local_file.to_local(file.file_path), "rb") as local_file:
+                while chunk := await local_file.read(self.chunk_size):
+                    yield chunk
+            return
+        async for chunk in self.bot.session.stream_content(
+            url=api.file_url(self.bot.token, file.file_path),
+            timeout=self.timeout,
+            chunk_size=self.chunk_size,
+            raise_for_status=True,
+        ):
+            yield chunk
+
+    async def _download(self) -> AsyncIterator[bytes]:
+        """
+        Скачивает файл и отдает его пакетами не меньше batch_size байт (последний — любой).
+        Загрузка прерывается, как только файл превысил лимит.
+        """
+        batch, batched = [], 0
+        # aclosing закрывает HTTP-поток сразу, если загрузка прервана
+        async with contextlib.aclosing(self._iter_content()) as chunks:
+            async for chunk in chunks:
+                self.downloaded += len(chunk)
+                if self.downloaded > self.limit:
+                    raise DocumentTooLargeError(f"Файл больше {format_size(self.limit)}")
+                batch.append(chunk)
+                batched += len(chunk)
+                if batched >= self.batch_size:
+                    yield b"".join(batch)
+                    batch, batched = [], 0
+        if batch:
+            yield b"".join(batch)
+        self.stage = "count"
+
+    async def run(self) -> Counter:
+        if self.extension is None:
+            raise DocumentError("Поддерживаются файлы " + ", ".join(sorted(SUPPORTED_EXTENSIONS)))
+        if self.size > self.limit:
+            raise DocumentTooLargeError(f"Файл больше {format_size(self.limit)}")
+
+        if self.extension in TEXT_EXTENSIONS:
+            counter = _TextCounter(WordCounter(casefold=self.casefold, stop_words=self.stop_words))
+            # Подсчет идет в пуле потоков пакетами, чтобы не занимать event loop и не
+            # платить за переход в поток на каждый кусок
+            async for data in self._download():
+                await asyncio.to_thread(counter.feed, data)
+            return counter.finish()
+
+        with tempfile.TemporaryDirectory(prefix="word-count-") as directory:
+            path = os.path.join(directory, "document.docx")
+            async with aiofiles.open(path, "wb") as file:
+                async for data in self._download():
+                    await file.write(data)
+            return await asyncio.to_thread(count_docx, path, self.limit, self.casefold, self.stop_words)
+
+
+class ProgressReporter:
+    """
+    Пока идет долгий подсчет, раз в interval секунд показывает прогресс в одном
+    сообщении. Если работа уложилась в interval, сообщение не отправляется вовсе.
+    """
+
+    def __init__(self, message: Message, job: DocumentWordCount, interval: float = 3.0):
+        self.message = message
+        self.job = job
+        self.interval = interval
+        self.status: Optional[Message] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        text = None
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.job.progress_text() == text:
+                continue
+            text = self.job.progress_text()
+            try:
+                if self.status is None:
+                    self.status = await self.message.reply(text)
+                else:
+                    await self.status.edit_text(text)
+            except TelegramBadRequest as e:
+                logger.debug("Не удалось обновить прогресс", extra={"error": str(e)})
+
+    async def stop(self) -> Optional[Message]:
+        """Останавливает обновления; возвращает сообщение с прогрессом, если оно было."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        return self.status
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+# Ключ строки в SQLite: учитываем все части StorageKey, а не только чат и пользователя
+KEY_BUILDER = DefaultKeyBuilder(prefix="fsm", with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class ExpiringStorage(BaseStorage):
+    """
+    Хранилище FSM, в котором брошенные состояния живут не дольше ttl секунд
+    с последней записи. Просроченные записи не видны сразу, а удаляются
+    периодической очисткой (start_sweeper) или при вытеснении.
+    """
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.expired = 0
+        self.evicted = 0
+        self._sweeper = None
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Удаляет просроченные записи и возвращает их число."""
+
+    def start_sweeper(self, interval: float):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Ошибка очистки состояний FSM")
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        return {"expired": self.expired, "evicted": self.evicted}
+
+
+class TTLMemoryStorage(ExpiringStorage):
+    """
+    Хранилище в памяти с TTL и ограничением на число записей: при переполнении
+    вытесняются записи, которые дольше всего не менялись.
+    """
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 100000):
+        super().__init__(ttl, maxsize)
+        # key -> [expires_at, state, data]; порядок — от самой старой записи к самой новой
+        self._records = OrderedDict()
+
+    def _get(self, key: StorageKey):
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if record[0] <= time.monotonic():
+            del self._records[key]
+            self.expired += 1
+            return None
+        return record
+
+    def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        if state is None and not data:
+            self._records.pop(key, None)
+            return
+        self._records[key] = [time.monotonic() + self.ttl, state, data]
+        self._records.move_to_end(key)
+        while len(self._records) > self.maxsize:
+            self._records.popitem(last=False)
+            self.evicted += 1
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._get(key)
+        self._write(key, _state_name(state), record[2] if record else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record[1] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._get(key)
+        self._write(key, record[1] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record[2].copy() if record else {}
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        # Записи упорядочены по времени записи, а TTL общий — просроченные всегда в начале
+        removed = 0
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record[0] > now:
+                break
+            del self._records[key]
+            removed += 1
+        self.expired += removed
+        return removed
+
+
+class SQLiteStorage(ExpiringStorage):
+    """
+    Хранилище в файле SQLite: состояния переживают перезапуск бота.
+    Запросы выполняются в пуле потоков, чтобы не блокировать event loop.
+    Лимит maxsize проверяется при каждой новой записи: число строк ведется
+    в памяти, чтобы не считать их в таблице на каждый запрос.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, maxsize: int = 100000):
+        super().__init__(ttl, maxsize)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_state ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_state_expires_idx ON fsm_state (expires_at)")
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM fsm_state").fetchone()
+
+    async def _call(self, func, *args):
+        def run():
+            with self._lock:
+                return func(*args)
+        return await asyncio.to_thread(run)
+
+    def _write(self, key: str, column: str, value: Optional[str]) -> int:
+        """Записывает значение и возвращает число вытесненных записей."""
+        # Время в файле — wall clock, чтобы TTL работал и после перезапуска
+        expires_at = time.time() + self.ttl
+        with self._conn:
+            exists = self._conn.execute("SELECT 1 FROM fsm_state WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                f"INSERT INTO fsm_state (key, {column}, expires_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, expires_at = excluded.expires_at",
+                (key, value, expires_at),
+            )
+            removed = self._conn.execute(
+                "DELETE FROM fsm_state WHERE key = ? AND state IS NULL AND data = '{}'", (key,)
+            ).rowcount
+            self._count += (not exists) - removed
+            return self._evict()
+
+    def _evict(self) -> int:
+        # Сверх лимита удаляем записи, которые истекут раньше всех
+        if self._count <= self.maxsize:
+            return 0
+        evicted = self._conn.execute(
+            "DELETE FROM fsm_state WHERE key IN (SELECT key FROM fsm_state ORDER BY expires_at LIMIT ?)",
+            (self._count - self.maxsize,),
+        ).rowcount
+        self._count -= evicted
+        return evicted
+
+    def _read(self, key: str, column: str):
+        row = self._conn.execute(
+            f"SELECT {column} FROM fsm_state WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _sweep(self) -> tuple:
+        with self._conn:
+            expired = self._conn.execute("DELETE FROM fsm_state WHERE expires_at <= ?", (time.time(),)).rowcount
+            # Заодно сверяем счетчик строк с таблицей
+            (self._count,) = self._conn.execute("SELECT COUNT(*) FROM fsm_state").fetchone()
+            evicted = self._evict()
+        return expired, evicted
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self.evicted += await self._call(self._write, KEY_BUILDER.build(key), "state", _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._call(self._read, KEY_BUILDER.build(key), "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self.evicted += await self._call(
+            self._write, KEY_BUILDER.build(key), "data", json.dumps(data, ensure_ascii=False)
+        )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self._call(self._read, KEY_BUILDER.build(key), "data")
+        return json.loads(data) if data else {}
+
+    async def sweep(self) -> int:
+        expired, evicted = await self._call(self._sweep)
+        self.expired += expired
+        self.evicted += evicted
+        return expired
+
+    async def close(self) -> None:
+        await super().close()
+        await self._call(self._conn.close)
+
+
+def create_storage(backend: str, ttl: float, maxsize: int, path: str = None) -> ExpiringStorage:
+    if backend == "memory":
+        return TTLMemoryStorage(ttl=ttl, maxsize=maxsize)
+    if backend == "sqlite":
+        return SQLiteStorage(path, ttl=ttl, maxsize=maxsize)
+    raise ValueError(f"Неизвестное хранилище FSM: {backend}")
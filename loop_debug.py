@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingIOOnLoopError(RuntimeError):
+    """Блокирующая сетевая операция вызвана из потока event loop."""
+
+
+_original_connect = socket.socket.connect
+_original_getaddrinfo = socket.getaddrinfo
+_loop_thread_id = None
+
+
+def _on_loop_thread() -> bool:
+    return _loop_thread_id is not None and threading.get_ident() == _loop_thread_id
+
+
+def _report(operation: str, target):
+    message = f"Блокирующий вызов {operation}({target!r}) в потоке event loop"
+    logger.error(message)
+    raise BlockingIOOnLoopError(message)
+
+
+def _guarded_connect(sock, address):
+    # Неблокирующие сокеты (timeout == 0) использует сам asyncio — их пропускаем
+    if _on_loop_thread() and sock.gettimeout() != 0.0:
+        _report('socket.connect', address)
+    return _original_connect(sock, address)
+
+
+def _guarded_getaddrinfo(host, *args, **kwargs):
+    # asyncio резолвит имена в пуле потоков, поэтому вызов из потока loop — это ошибка
+    if _on_loop_thread():
+        _report('socket.getaddrinfo', host)
+    return _original_getaddrinfo(host, *args, **kwargs)
+
+
+def install_blocking_io_guard(loop: asyncio.AbstractEventLoop):
+    """
+    Запрещает блокирующий сетевой I/O (requests, urllib, синхронные сокеты)
+    в потоке, где крутится loop: такой вызов выбрасывает BlockingIOOnLoopError.
+    """
+    global _loop_thread_id
+    _loop_thread_id = loop._thread_id or threading.get_ident()
+    socket.socket.connect = _guarded_connect
+    socket.getaddrinfo = _guarded_getaddrinfo
+
+
+def uninstall_blocking_io_guard():
+    global _loop_thread_id
+    _loop_thread_id = None
+    socket.socket.connect = _original_connect
+    socket.getaddrinfo = _original_getaddrinfo
+
+
+def enable_loop_debug(loop: asyncio.AbstractEventLoop, slow_callback_duration: float = 0.1):
+    """
+    Включает отладочный режим asyncio: колбэки дольше slow_callback_duration
+    секунд попадают в лог, блокирующий сетевой I/O в loop запрещается.
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+    loop.set_debug(True)
+    loop.slow_callback_duration = slow_callback_duration
+    logging.getLogger('asyncio').setLevel(logging.WARNING)
+    install_blocking_io_guard(loop)
+    logger.info("Отладка event loop включена, порог медленных колбэков: %.3f с", slow_callback_duration)
@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import re
+import time
+from typing import Dict, Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_VERSION = "s2"
+# Payload без срока, выставленные до появления s2: срок по ним берется по умолчанию
+LEGACY_PAYLOAD_VERSION = "s1"
+# Длина подписи в байтах: 12 байт HMAC-SHA256 — 16 символов base64url
+SIGNATURE_BYTES = 12
+_CODE_RE = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+
+class Plan(NamedTuple):
+    code: str
+    title: str
+    price: int  # В минимальных единицах валюты (копейках)
+    currency: str
+    days: int
+
+
+class PlanCatalog:
+    """
+    Тарифы подписки в памяти процесса. Загружаются из хранилища при старте и
+    периодически обновляются, поэтому ни выставление счета, ни pre-checkout не
+    ждут ответа Django. Пока загрузка не удалась, действуют тарифы по умолчанию.
+    """
+
+    def __init__(self, default=()):
+        self._plans: Dict[str, Plan] = {}
+        self.loaded_at: Optional[float] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.replace(default)
+
+    def replace(self, plans):
+        catalog = {}
+        for plan in plans:
+            plan = plan if isinstance(plan, Plan) else Plan(**{field: plan[field] for field in Plan._fields})
+            if not _CODE_RE.match(plan.code):
+                logger.warning("Тариф пропущен: код не подходит для payload", extra={"code": plan.code})
+                continue
+            catalog[plan.code] = plan
+        self._plans = catalog
+
+    async def load(self, store) -> bool:
+        try:
+            plans = await store.get_plans()
+        except Exception as e:
+            logger.warning("Не удалось загрузить тарифы, остаются прежние", extra={"error": str(e)})
+            return False
+        if not plans:
+            logger.warning("Активных тарифов нет, остаются прежние")
+            return False
+        self.replace(plans)
+        self.loaded_at = time.monotonic()
+        return True
+
+    def start_refresher(self, store, interval: float):
+        """Загружает тарифы сразу и затем каждые interval секунд."""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_forever(store, interval))
+
+    async def _refresh_forever(self, store, interval: float):
+        while True:
+            await self.load(store)
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+
+    def get(self, code: str) -> Optional[Plan]:
+        return self._plans.get(code)
+
+    def __iter__(self) -> Iterator[Plan]:
+        return iter(self._plans.values())
+
+
+class InvoicePayload(NamedTuple):
+    plan: str
+    telegram_id: int
+    price: int
+    days: Optional[int]  # None в payload версии s1
+    issued_at: int
+
+
+class PayloadError(ValueError):
+    """Payload счета поврежден, подделан или устарел."""
+
+
+def _b36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        value, rest = divmod(value, 36)
+        result = digits[rest] + result
+        if not value:
+            return result
+
+
+def _signature(secret: bytes, body: str) -> str:
+    digest = hmac.new(secret, body.encode("utf-8"), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+def payload_secret(token: str) -> bytes:
+    """Ключ подписи по умолчанию, производный от токена бота: одинаков во всех процессах."""
+    return hashlib.sha256(f"invoice-payload:{token}".encode("utf-8")).digest()
+
+
+def make_payload(secret: bytes, plan: Plan, telegram_id: int, now: float = None) -> str:
+    """
+    Компактный подписанный payload: s2.<тариф>.<id>.<цена>.<дни>.<время>.<подпись>,
+    числа в base36 — около 55 символов при лимите Telegram в 128 байт. Срок
+    подписан вместе с ценой: оплата продлевает ровно на тот срок, что был в счете.
+    """
+    issued_at = int(now if now is not None else time.time())
+    body = ".".join((PAYLOAD_VERSION, plan.code, _b36(telegram_id), _b36(plan.price), _b36(plan.days),
+                     _b36(issued_at)))
+    return f"{body}.{_signature(secret, body)}"
+
+
+def parse_payload(secret: bytes, payload: str, max_age: float = None, now: float = None) -> InvoicePayload:
+    body, _, signature = payload.rpartition(".")
+    # Payload приходит от клиента, поэтому сравниваем байты: compare_digest не принимает не-ASCII строки
+    if not hmac.compare_digest(_signature(secret, body).encode("ascii"), signature.encode("utf-8")):
+        raise PayloadError("Неверная подпись payload")
+    try:
+        version, code, *numbers = body.split(".")
+        if version == LEGACY_PAYLOAD_VERSION:
+            telegram_id, price, issued_at = numbers
+            days = None
+        elif version == PAYLOAD_VERSION:
+            telegram_id, price, days, issued_at = numbers
+            days = int(days, 36)
+        else:
+            raise ValueError(version)
+        result = InvoicePayload(code, int(telegram_id, 36), int(price, 36), days, int(issued_at, 36))
+    except ValueError:
+        raise PayloadError("Неверный формат payload") from None
+    if max_age is not None and (now if now is not None else time.time()) - result.issued_at > max_age:
+        raise PayloadError("Счет устарел")
+    return result
+
+
+def check_invoice(secret: bytes, catalog: PlanCatalog, payload: str, telegram_id: int, total_amount: int,
+                  currency: str, max_age: float = None, now: float = None) -> Optional[str]:
+    """
+    Проверяет оплачиваемый счет по подписи payload и тарифам в памяти.
+    Возвращает причину отказа (invalid_payload, unknown_plan, price_mismatch) или None.
+    """
+    try:
+        invoice = parse_payload(secret, payload, max_age=max_age, now=now)
+    except PayloadError:
+        return "invalid_payload"
+    if invoice.telegram_id != telegram_id:
+        return "invalid_payload"
+
+    plan = catalog.get(invoice.plan)
+    if plan is None:
+        return "unknown_plan"
+    if (invoice.price, total_amount, currency) != (plan.price, plan.price, plan.currency):
+        return "price_mismatch"
+    return None
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+from aiohttp import web
+
+from metrics import REGISTRY, MetricsServer
+from webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+# Поля события, по которым определяется пользователь (в порядке приоритета)
+USER_FIELDS = ("from", "user", "chat", "sender_chat")
+
+
+def update_user_id(data: dict) -> int:
+    """Достает id пользователя (или чата) из сырого обновления Telegram."""
+    for key, event in data.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        for field in USER_FIELDS:
+            obj = event.get(field)
+            if isinstance(obj, dict) and "id" in obj:
+                return obj["id"]
+    # Обновления без пользователя раскидываем по воркерам как придется
+    return data.get("update_id", 0)
+
+
+def dump_update(update: Update) -> dict:
+    """
+    Обновление в том же виде, в каком его присылает Telegram: by_alias нужен,
+    чтобы отправитель назывался "from", а не "from_user", иначе update_user_id его не найдет.
+    """
+    return update.model_dump(mode="json", exclude_unset=True, by_alias=True)
+
+
+def shard_for(user_id: int, shards: int) -> int:
+    return user_id % shards
+
+
+class KeyedSequencer:
+    """
+    Выполняет корутины с общим ключом строго по очереди, а с разными
+    ключами — параллельно, не больше concurrency одновременно.
+    """
+
+    def __init__(self, concurrency: int = 64):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tails = {}
+
+    async def submit(self, key, coro):
+        await self._semaphore.acquire()
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(previous, coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+
+    async def _run(self, previous, coro):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        await coro
+
+    def _done(self, key, task):
+        self._semaphore.release()
+        if self._tails.get(key) is task:
+            del self._tails[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Ошибка обработки обновления", exc_info=task.exception())
+
+    async def join(self):
+        await asyncio.gather(*self._tails.values(), return_exceptions=True)
+
+
+def _worker_main(index: int, create_app, updates, heartbeat, processed, concurrency: int):
+    asyncio.run(_worker_loop(index, create_app, updates, heartbeat, processed, concurrency))
+
+
+async def _worker_loop(index: int, create_app, updates, heartbeat, processed, concurrency: int):
+    dp, bot = create_app()
+    loop = asyncio.get_running_loop()
+
+    async def handle(update: Update):
+        try:
+            await dp.feed_update(bot, update)
+        finally:
+            processed.value += 1
+
+    async def beat():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(1)
+
+    beat_task = asyncio.create_task(beat())
+    sequencer = KeyedSequencer(concurrency)
+    # Разовые задачи (команды, планировщик, досылка рассылок) выполняет только воркер 0
+    await dp.emit_startup(bot=bot, dispatcher=dp, shard_index=index)
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            update = Update.model_validate(data, context={"bot": bot})
+            await sequencer.submit(update_user_id(data), handle(update))
+        await sequencer.join()
+    finally:
+        beat_task.cancel()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, shard_index=index)
+        await bot.session.close()
+
+
+class ShardSupervisor:
+    """
+    Запускает shards процессов-воркеров и раздает им обновления: все обновления
+    одного пользователя попадают в один воркер, поэтому его FSM-состояние и порядок
+    сообщений сохраняются. Упавшие и зависшие (без heartbeat) воркеры перезапускаются.
+
+    create_app — функция уровня модуля, возвращающая (dp, bot) внутри воркера.
+    """
+
+    def __init__(self, create_app, shards: int, queue_size: int = 1000, concurrency: int = 64,
+                 health_interval: float = 5.0, heartbeat_timeout: float = 30.0):
+        self.create_app = create_app
+        self.shards = shards
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.health_interval = health_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        # spawn, а не fork: в ingress-процессе уже есть event loop и открытые сессии
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [None] * shards
+        self.routed = [0] * shards
+        self.restarts = [0] * shards
+        self._monitor = None
+
+    def _spawn(self, index: int):
+        updates = self._context.Queue(maxsize=self.queue_size)
+        heartbeat = self._context.Value("d", time.time())
+        processed = self._context.Value("q", 0, lock=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.create_app, updates, heartbeat, processed, self.concurrency),
+            name=f"bot-shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[index] = (process, updates, heartbeat, processed)
+
+    def start(self):
+        for index in range(self.shards):
+            self._spawn(index)
+        self._monitor = asyncio.create_task(self._monitor_forever())
+        REGISTRY.callback("bot_shard_queue_depth", "Обновления в очереди воркера",
+                          lambda: {index: worker[1].qsize() for index, worker in enumerate(self._workers)},
+                          labels=("shard",))
+        REGISTRY.callback("bot_shard_restarts_total", "Перезапуски воркера",
+                          lambda: dict(enumerate(self.restarts)), labels=("shard",), kind="counter")
+
+    def submit(self, data: dict) -> bool:
+        """Отдает обновление воркеру; False, если его очередь заполнена."""
+        index = shard_for(update_user_id(data), self.shards)
+        try:
+            self._workers[index][1].put_nowait(data)
+        except queue.Full:
+            return False
+        self.routed[index] += 1
+        return True
+
+    async def _monitor_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for index, (process, _, heartbeat, _) in enumerate(self._workers):
+                stale = time.time() - heartbeat.value > self.heartbeat_timeout
+                if process.is_alive() and not stale:
+                    continue
+                logger.error("Воркер %s, перезапуск", "завис" if stale else "упал",
+                             extra={"shard": index, "exitcode": process.exitcode})
+                process.kill()
+                await loop.run_in_executor(None, process.join)
+                # Очередь убитого процесса могла остаться заблокированной — создаем новую,
+                # уже принятые в нее обновления теряются
+                self.routed[index] = 0
+                self._spawn(index)
+                self.restarts[index] += 1
+
+    async def stop(self, timeout: float = 30.0):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for process, updates, _, _ in self._workers:
+            try:
+                await loop.run_in_executor(None, updates.put, None, True, timeout)
+            except queue.Full:
+                pass
+        for process, _, _, _ in self._workers:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.kill()
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "pending": sum(self.routed) - sum(worker[3].value for worker in self._workers),
+            "shards": [
+                {
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "queue_depth": updates.qsize(),
+                    "heartbeat_age": now - heartbeat.value,
+                    "routed": self.routed[index],
+                    "processed": processed.value,
+                    "restarts": self.restarts[index],
+                }
+                for index, (process, updates, heartbeat, processed) in enumerate(self._workers)
+            ],
+        }
+
+
+class ShardedWebhookServer(WebhookServer):
+    """
+    Webhook ingress-процесса: не обрабатывает обновления сам, а раздает их воркерам.
+
+    Ingress почти ничего не делает и принимает обновления быстрее, чем воркеры
+    их обрабатывают, поэтому при заполненной очереди воркера запрос ждет до
+    admission_timeout секунд, а не сразу получает 503. Telegram держит ограниченное
+    число соединений с webhook, так что медленный ответ сам снижает скорость доставки.
+    """
+
+    def __init__(self, supervisor: ShardSupervisor, bot: Bot, path: str = "/webhook", secret_token: str = None,
+                 admission_timeout: float = 2.0):
+        super().__init__(None, bot, path=path, secret_token=secret_token, queue_size=1, workers=0)
+        self.supervisor = supervisor
+        self.admission_timeout = admission_timeout
+
+    async def admit(self, data: dict) -> bool:
+        deadline = time.monotonic() + self.admission_timeout
+        while not self.submit(data):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def submit(self, data: dict) -> bool:
+        if not isinstance(data, dict) or "update_id" not in data:
+            raise ValueError("not an update")
+        return self.supervisor.submit(data)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "unauthorized": self.unauthorized,
+            **self.supervisor.stats(),
+        }
+
+
+async def _poll_updates(supervisor: ShardSupervisor, dp: Dispatcher, bot: Bot, polling_timeout: int = 30):
+    await bot.delete_webhook(drop_pending_updates=True)
+    allowed_updates = dp.resolve_used_update_types()
+    offset = None
+    while True:
+        try:
+            updates = await bot(GetUpdates(offset=offset, timeout=polling_timeout, allowed_updates=allowed_updates))
+        except Exception:
+            logger.exception("Ошибка получения обновлений")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            data = dump_update(update)
+            # Очередь воркера заполнена — ждем, новые обновления подождут на стороне Telegram
+            while not supervisor.submit(data):
+                await asyncio.sleep(0.05)
+            offset = update.update_id + 1
+
+
+async def run_sharded(create_app, dp: Dispatcher, bot: Bot, shards: int, mode: str = "polling",
+                      base_url: str = None, host: str = "0.0.0.0", port: int = 8080,
+                      path: str = "/webhook", secret_token: str = None, admission_timeout: float = 2.0,
+                      metrics_host: str = "127.0.0.1", metrics_port: int = 0, **kwargs):
+    """
+    Ingress-процесс: получает обновления (polling или webhook) и раздает их
+    shards воркерам. dp и bot здесь нужны только для приема обновлений.
+    Метрики ingress отдаются на metrics_port, воркеры берут следующие порты.
+    """
+    supervisor = ShardSupervisor(create_app, shards, **kwargs)
+    supervisor.start()
+    logger.info("Воркеры запущены", extra={"shards": shards})
+    runner = None
+    metrics_server = MetricsServer()
+    if metrics_port:
+        await metrics_server.start(metrics_host, metrics_port)
+    try:
+        if mode == "webhook":
+            app = web.Application()
+            server = ShardedWebhookServer(supervisor, bot, path=path, secret_token=secret_token,
+                                          admission_timeout=admission_timeout)
+            server.setup(app)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, host, port).start()
+            await bot.set_webhook(
+                f"{base_url.rstrip('/')}{server.path}",
+                secret_token=server.secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=True,
+            )
+            logger.info("Webhook запущен", extra={"host": host, "port": port, "path": server.path})
+            await asyncio.Event().wait()
+        else:
+            await _poll_updates(supervisor, dp, bot)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await supervisor.stop()
+        await metrics_server.stop()
+        await bot.session.close()
@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Optional
+
+from api_client import APIStatusError
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCounterAggregator:
+    """
+    Копит инкременты счетчиков задач по пользователям и отправляет их
+    одним пакетом раз в flush_interval секунд или после max_events событий.
+
+    send получает список {"telegram_id", "tasks_completed", "daily_tasks_completed"}
+    не длиннее batch_size и возвращает True, если сервер их принял; иначе инкременты
+    вернутся в очередь. Пакет, отклоненный с 4xx (APIStatusError), повторять
+    бессмысленно: он пишется в лог и отбрасывается.
+    """
+
+    def __init__(self, send: Callable[[list], Awaitable[bool]],
+                 flush_interval: float = 0.5, max_events: int = 100, batch_size: int = 1000):
+        self.send = send
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self._pending = {}
+        self._inflight = {}
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _merge(target: dict, telegram_id: int, tasks: int, daily: int):
+        current_tasks, current_daily = target.get(telegram_id, (0, 0))
+        target[telegram_id] = (current_tasks + tasks, current_daily + daily)
+
+    def add(self, telegram_id: int, tasks_completed: int, daily_tasks_completed: int):
+        self._merge(self._pending, telegram_id, tasks_completed, daily_tasks_completed)
+        self._events += 1
+        if self._events >= self.max_events:
+            self._wakeup.set()
+
+    def backlog(self) -> int:
+        """Сколько пользователей ждут отправки счетчиков."""
+        return len(self._pending) + len(self._inflight)
+
+    def pending(self, telegram_id: int) -> tuple:
+        """Инкременты пользователя, еще не подтвержденные сервером: (tasks, daily)."""
+        tasks, daily = self._pending.get(telegram_id, (0, 0))
+        inflight_tasks, inflight_daily = self._inflight.get(telegram_id, (0, 0))
+        return tasks + inflight_tasks, daily + inflight_daily
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            self._events = 0
+            try:
+                # API принимает не больше batch_size инкрементов за запрос
+                while self._inflight:
+                    batch = dict(itertools.islice(self._inflight.items(), self.batch_size))
+                    if not await self._send_batch(batch):
+                        # Сервер недоступен: остальные пакеты отправим в следующий раз
+                        break
+                    for telegram_id in batch:
+                        del self._inflight[telegram_id]
+            finally:
+                # Возвращаем неотправленное (в том числе при отмене) в очередь, чтобы не потерять инкременты
+                for telegram_id, (tasks, daily) in self._inflight.items():
+                    self._merge(self._pending, telegram_id, tasks, daily)
+                self._inflight = {}
+
+    async def _send_batch(self, batch: dict) -> bool:
+        """Отправляет пакет; False — пакет нужно повторить позже."""
+        increments = [
+            {"telegram_id": telegram_id, "tasks_completed": tasks, "daily_tasks_completed": daily}
+            for telegram_id, (tasks, daily) in batch.items()
+        ]
+        ok = False
+        try:
+            ok = await self.send(increments)
+        except APIStatusError as e:
+            if 400 <= e.status < 500:
+                logger.error("Сервер отклонил счетчики задач, пакет отброшен",
+                             extra={"users": len(increments), "status": e.status})
+                return True
+            logger.warning("Ошибка отправки счетчиков задач", extra={"users": len(increments), "status": e.status})
+        except Exception:
+            logger.exception("Ошибка отправки счетчиков задач", extra={"users": len(increments)})
+        return ok
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
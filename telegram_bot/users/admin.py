@@ -1,8 +1,21 @@
 from django.contrib import admin
-from .models import User
+from .models import Payment, Plan, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ("telegram_id", "username", "is_admin", "is_subscribed", "tasks_completed", "daily_tasks_completed")
+    list_display = ("telegram_id", "username", "is_admin", "is_subscribed", "tasks_completed", "daily_tasks_completed", "daily_tasks_date")
     list_filter = ("is_admin", "is_subscribed")
     search_fields = ("telegram_id", "username")
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ("telegram_payment_charge_id", "user", "amount", "currency", "days", "subscription_end", "created_at")
+    list_select_related = ("user",)
+    search_fields = ("telegram_payment_charge_id", "user__telegram_id")
+
+
+@admin.register(Plan)
+class PlanAdmin(admin.ModelAdmin):
+    list_display = ("code", "title", "price", "currency", "days", "is_active", "position")
+    list_editable = ("is_active", "position")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from users.models import SUBSCRIPTION_REMIND_DAYS, sweep_subscriptions
+
+class Command(BaseCommand):
+    help = "Деактивация истекших подписок и поиск пользователей для напоминания"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--remind-days", type=int, default=SUBSCRIPTION_REMIND_DAYS)
+
+    def handle(self, *args, **options):
+        result = sweep_subscriptions(options["remind_days"])
+        self.stdout.write(f"Деактивировано подписок: {len(result['expired'])}.")
+        self.stdout.write(f"Нужно напомнить о продлении: {len(result['reminders'])}.")
+        for telegram_id in result["reminders"]:
+            self.stdout.write(str(telegram_id))
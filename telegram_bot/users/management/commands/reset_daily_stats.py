@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localdate
+from users.models import User
+
+class Command(BaseCommand):
+    help = "Обнуление устаревших ежедневных счетчиков задач (необязательное сжатие)"
+
+    def handle(self, *args, **kwargs):
+        # Устаревший счетчик и так читается как 0, команда лишь приводит данные в порядок
+        updated = (
+            User.objects.filter(daily_tasks_completed__gt=0)
+            .exclude(daily_tasks_date=localdate())
+            .update(daily_tasks_completed=0)
+        )
+        self.stdout.write(f"Сброшена ежедневная статистика для {updated} пользователей.")
@@ -0,0 +1,99 @@
+"""
+Метрики Django API в текстовом формате Prometheus.
+
+Значения хранятся в памяти процесса: при нескольких воркерах (gunicorn)
+каждый отдает свои, и суммирует их Prometheus.
+
+Counter и Histogram повторяют формат из metrics.py бота, но не импортируются
+оттуда: Django запускается из telegram_bot/ и корня репозитория в sys.path нет,
+а metrics.py бота при импорте тянет aiogram, aiohttp и middleware бота. Отличие
+одно — блокировка: Django обслуживает запросы в нескольких потоках, а бот
+обновляет метрики только из event loop. Формат вывода в обоих модулях должен
+оставаться одинаковым.
+"""
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        with self._lock:
+            return ['%s%s %s' % (self.name, _format_labels(self.labels, key), value) for key, value in self._values.items()]
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # Счетчики по корзинам, затем сумма и количество
+                series = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, series in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append('%s_bucket%s %s' % (self.name, _format_labels(self.labels, key, 'le="%s"' % bound), cumulative))
+                lines.append('%s_bucket%s %s' % (self.name, _format_labels(self.labels, key, 'le="+Inf"'), series[-1]))
+                lines.append('%s_sum%s %s' % (self.name, _format_labels(self.labels, key), series[-2]))
+                lines.append('%s_count%s %s' % (self.name, _format_labels(self.labels, key), series[-1]))
+        return lines
+
+
+REQUEST_SECONDS = Histogram('django_http_request_seconds', 'Время обработки запросов', ('view', 'method'))
+REQUESTS = Counter('django_http_requests_total', 'Запросы по статусу ответа', ('view', 'method', 'status'))
+DB_QUERIES = Counter('django_db_queries_total', 'SQL-запросы, выполненные при обработке запросов', ('view',))
+DB_SECONDS = Histogram('django_db_query_seconds', 'Суммарное время SQL-запросов одного HTTP-запроса', ('view',))
+METRICS = [REQUEST_SECONDS, REQUESTS, DB_QUERIES, DB_SECONDS]
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,47 @@
+import time
+
+from django.db import connection
+
+from .metrics import DB_QUERIES, DB_SECONDS, REQUEST_SECONDS, REQUESTS
+
+
+class QueryTimer:
+    """execute_wrapper, считающий число и суммарное время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Метрики по каждому маршруту: время ответа, статусы, число и время SQL-запросов.
+    Подключается первым в MIDDLEWARE: 'users.middleware.MetricsMiddleware'.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        # Имя маршрута, а не путь: в пути есть telegram_id
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view, request.method)
+        REQUESTS.inc(view, request.method, response.status_code)
+        DB_QUERIES.inc(view, amount=queries.count)
+        DB_SECONDS.observe(queries.duration, view)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_alter_user_subscription_end'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_subscribed', True)), fields=['subscription_end'], name='user_active_sub_end_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_active_sub_end_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['date', 'user'], name='useractivity_date_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='useractivity',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='useractivity_user_date_uniq'),
+        ),
+    ]
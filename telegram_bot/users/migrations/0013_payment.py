@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_user_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_payment_charge_id', models.CharField(max_length=255, unique=True)),
+                ('provider_payment_charge_id', models.CharField(blank=True, default='', max_length=255)),
+                ('amount', models.PositiveIntegerField(default=0)),
+                ('currency', models.CharField(blank=True, default='', max_length=3)),
+                ('payload', models.CharField(blank=True, default='', max_length=128)),
+                ('days', models.PositiveIntegerField()),
+                ('subscription_end', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='users.user')),
+            ],
+        ),
+    ]
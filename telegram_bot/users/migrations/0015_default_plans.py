@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Переносим только прежний фиксированный тариф бота (290 ₽ за 30 дней);
+# остальные тарифы и цены задаются в админке
+DEFAULT_PLANS = [
+    {"code": "month", "title": "1 месяц", "price": 29000, "days": 30, "position": 1},
+]
+
+
+def create_plans(apps, schema_editor):
+    Plan = apps.get_model('users', 'Plan')
+    for plan in DEFAULT_PLANS:
+        Plan.objects.get_or_create(code=plan["code"], defaults=plan)
+
+
+def delete_plans(apps, schema_editor):
+    Plan = apps.get_model('users', 'Plan')
+    Plan.objects.filter(code__in=[plan["code"] for plan in DEFAULT_PLANS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_plan'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_plans, delete_plans),
+    ]
@@ -1,4 +1,59 @@
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
+
+# За сколько дней до окончания подписки напоминать пользователю
+SUBSCRIPTION_REMIND_DAYS = 2
+# На сколько дней продлевает подписку один платеж
+SUBSCRIPTION_DAYS = 30
+
+def daily_tasks_today(today=None):
+    """
+    Выражение для числа задач за сегодня: счетчик с датой не сегодня считается нулем,
+    поэтому ночной сброс всей таблицы не нужен.
+    """
+    return models.Case(
+        models.When(daily_tasks_date=today or timezone.localdate(), then=models.F('daily_tasks_completed')),
+        default=models.Value(0),
+        output_field=models.PositiveIntegerField(),
+    )
+
+def daily_tasks_increment(delta, today=None):
+    """Выражение для UPDATE: прибавляет delta к сегодняшнему счетчику или начинает его заново."""
+    return models.Case(
+        models.When(daily_tasks_date=today or timezone.localdate(), then=models.F('daily_tasks_completed') + delta),
+        default=delta,
+        output_field=models.PositiveIntegerField(),
+    )
+
+class UserQuerySet(models.QuerySet):
+    def with_daily_tasks(self, today=None):
+        """Добавляет к записям поле daily_tasks_today с учетом даты счетчика."""
+        return self.annotate(daily_tasks_today=daily_tasks_today(today))
+
+    def expire_subscriptions(self, now=None):
+        """
+        Снимает подписку у всех, у кого она закончилась, и возвращает их telegram_id.
+
+        Истекшие строки выбираются с блокировкой (SELECT ... FOR UPDATE), а UPDATE
+        затрагивает ровно их по id: подписка, продленная параллельно (extend_subscription
+        тоже блокирует строку), либо дождется конца транзакции и не попадет в выборку,
+        либо будет продлена уже после снятия. Список совпадает с обновленными строками.
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            expired = dict(
+                self.select_for_update()
+                .filter(is_subscribed=True, subscription_end__lt=now)
+                .values_list('id', 'telegram_id')
+            )
+            if expired:
+                self.filter(pk__in=expired).update(is_subscribed=False)
+        return list(expired.values())
+
+    def expiring_between(self, start, end):
+        """Активные подписки, заканчивающиеся в интервале [start, end)."""
+        return self.filter(is_subscribed=True, subscription_end__gte=start, subscription_end__lt=end)
 
 class User(models.Model):
     telegram_id = models.BigIntegerField(unique=True)
@@ -6,14 +61,144 @@ class User(models.Model):
     created_at = models.DateTimeField(auto_now_add=True) # Дата регистрации
     tasks_completed = models.IntegerField(default=0) # Общее число задач
     daily_tasks_completed = models.PositiveIntegerField(default=0)  # Число задач за сутки
+    daily_tasks_date = models.DateField(blank=True, null=True)  # За какой день посчитан daily_tasks_completed
     is_subscribed = models.BooleanField(default=False) # Оформлена ли подписка
     is_admin = models.BooleanField(default=False) # Является ли админом
     subscription_end = models.DateTimeField(blank=True, null=True)  # Дата окончания подписки
 
+    objects = UserQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Частичный индекс под поиск истекающих и истекших подписок
+            models.Index(
+                fields=['subscription_end'],
+                name='user_active_sub_end_idx',
+                condition=models.Q(is_subscribed=True),
+            ),
+            # Постраничный обход администраторов (is_admin=true, порядок по id)
+            models.Index(fields=['id'], name='user_admin_id_idx', condition=models.Q(is_admin=True)),
+            # Постраничный обход подписчиков (is_subscribed=true, порядок по id)
+            models.Index(fields=['id'], name='user_subscribed_id_idx', condition=models.Q(is_subscribed=True)),
+            # Активные за день и топ по дневным задачам
+            models.Index(fields=['daily_tasks_date', '-daily_tasks_completed'], name='user_daily_tasks_idx'),
+        ]
+
     def __str__(self):
         return self.username or f"User {self.telegram_id}"
 
+    def daily_tasks(self, today=None):
+        """Число задач за сегодня (устаревший счетчик читается как 0)."""
+        if self.daily_tasks_date != (today or timezone.localdate()):
+            return 0
+        return self.daily_tasks_completed
+
+def sweep_subscriptions(remind_days=SUBSCRIPTION_REMIND_DAYS):
+    """
+    Деактивирует истекшие подписки и находит тех, кому пора напомнить о продлении.
+    Стоимость пропорциональна числу затронутых пользователей, а не всех пользователей.
+    """
+    now = timezone.now()
+    expired = User.objects.expire_subscriptions(now)
+    start = now + timedelta(days=remind_days)
+    reminders = list(
+        User.objects.expiring_between(start, start + timedelta(days=1)).values_list('telegram_id', flat=True)
+    )
+    return {"expired": expired, "reminders": reminders}
+
+def extend_subscription(telegram_id, telegram_payment_charge_id, days=SUBSCRIPTION_DAYS, **payment):
+    """
+    Продлевает подписку на days дней от max(subscription_end, now) и записывает платеж.
+
+    Операция идемпотентна по telegram_payment_charge_id: повторная доставка того же
+    платежа ничего не меняет и возвращает уже созданную запись. Строка пользователя
+    блокируется на время транзакции, поэтому параллельные платежи не теряют дни.
+    Возвращает (payment, created); если пользователь не найден — User.DoesNotExist.
+    """
+    with transaction.atomic():
+        user = User.objects.select_for_update().only('id', 'subscription_end').get(telegram_id=telegram_id)
+        now = timezone.now()
+        subscription_end = max(user.subscription_end or now, now) + timedelta(days=days)
+        payment, created = Payment.objects.get_or_create(
+            telegram_payment_charge_id=telegram_payment_charge_id,
+            defaults={'user': user, 'days': days, 'subscription_end': subscription_end, **payment},
+        )
+        if created:
+            User.objects.filter(id=user.id).update(is_subscribed=True, subscription_end=subscription_end)
+    return payment, created
+
+class Payment(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
+    # Идентификатор платежа в Telegram: по нему повторные доставки не продлевают подписку второй раз
+    telegram_payment_charge_id = models.CharField(max_length=255, unique=True)
+    provider_payment_charge_id = models.CharField(max_length=255, blank=True, default='')
+    amount = models.PositiveIntegerField(default=0)  # В минимальных единицах валюты (копейках)
+    currency = models.CharField(max_length=3, blank=True, default='')
+    payload = models.CharField(max_length=128, blank=True, default='')  # invoice_payload
+    days = models.PositiveIntegerField()  # На сколько дней продлена подписка
+    subscription_end = models.DateTimeField()  # Окончание подписки после этого платежа
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.telegram_payment_charge_id} ({self.amount} {self.currency})"
+
+class Plan(models.Model):
+    """Тариф подписки. Бот загружает активные тарифы при старте и держит их в памяти."""
+    code = models.SlugField(max_length=32, unique=True)  # Попадает в payload счета
+    title = models.CharField(max_length=64)
+    price = models.PositiveIntegerField()  # В минимальных единицах валюты (копейках)
+    currency = models.CharField(max_length=3, default='RUB')
+    days = models.PositiveIntegerField()
+    is_active = models.BooleanField(default=True)
+    position = models.PositiveSmallIntegerField(default=0)  # Порядок кнопок в боте
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return f"{self.title} ({self.price} {self.currency}, {self.days} дн.)"
+
+class UserActivityQuerySet(models.QuerySet):
+    def record(self, counts, date=None):
+        """
+        Прибавляет действия за день: counts — {user_id: число действий}.
+        Сначала гарантирует наличие строк (INSERT с игнорированием конфликтов),
+        затем увеличивает счетчики одним UPDATE, поэтому параллельные вызовы не теряют значения.
+        """
+        counts = {user_id: count for user_id, count in counts.items() if count}
+        if not counts:
+            return
+        date = date or timezone.localdate()
+        # Без отдельной точки сохранения, если уже внутри транзакции вызывающего кода
+        with transaction.atomic(savepoint=False):
+            self.bulk_create(
+                [UserActivity(user_id=user_id, date=date, actions_count=0) for user_id in counts],
+                ignore_conflicts=True,
+            )
+            self.filter(date=date, user_id__in=counts).update(
+                actions_count=models.F('actions_count') + models.Case(
+                    *[models.When(user_id=user_id, then=models.Value(count)) for user_id, count in counts.items()],
+                    default=models.Value(0),
+                    output_field=models.IntegerField(),
+                )
+            )
+
+    def since(self, days):
+        """Записи за последние days дней, включая сегодняшний."""
+        return self.filter(date__gt=timezone.localdate() - timedelta(days=days))
+
 class UserActivity(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField()
-    actions_count = models.IntegerField(default=0)
\ No newline at end of file
+    actions_count = models.IntegerField(default=0)
+
+    objects = UserActivityQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='useractivity_user_date_uniq'),
+        ]
+        indexes = [
+            # Для выборок по всем пользователям за диапазон дат
+            models.Index(fields=['date', 'user'], name='useractivity_date_user_idx'),
+        ]
\ No newline at end of file
@@ -1,15 +1,49 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import User
 
 class UserSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        # Необязательный список полей: UserSerializer(users, many=True, fields=['telegram_id'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     class Meta:
         model = User
         fields = ['id', 'telegram_id', 'username', 'created_at', 'tasks_completed', 'is_admin', 'is_subscribed', 'daily_tasks_completed', 'subscription_end']
         extra_kwargs = {
+            # Уникальность проверяется в validate_telegram_id, без второго запроса от UniqueValidator
+            'telegram_id': {'validators': []},
             'is_subscribed': {'required': False},
             'subscription_end': {'required': False, 'format': '%Y-%m-%dT%H:%M:%S'},
         }
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Отдаем счетчик за сегодня, а не последнее сохраненное значение
+        if 'daily_tasks_completed' in data:
+            data['daily_tasks_completed'] = instance.daily_tasks()
+        return data
+
+    def validate(self, attrs):
+        # Счетчик, записанный напрямую, относится к сегодняшнему дню
+        if 'daily_tasks_completed' in attrs:
+            attrs['daily_tasks_date'] = timezone.localdate()
+        return attrs
+
+    def update(self, instance, validated_data):
+        # Обновляем только переданные поля, а не всю строку
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
     def validate_telegram_id(self, value):
+        # При обновлении неизменный telegram_id проверять не нужно
+        if self.instance is not None and self.instance.telegram_id == value:
+            return value
         if User.objects.filter(telegram_id=value).exists():
             raise serializers.ValidationError('This telegram_id is already registered.')
         return value
@@ -0,0 +1,182 @@
+"""
+Операции с пользователями, общие для API (views.py) и для бота, который
+работает с базой напрямую, без HTTP (data_access.ORMUserStore).
+
+Функции принимают и возвращают обычные словари в том же виде, что и JSON API,
+поэтому боту не важно, каким путем пришли данные.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from .models import Plan, User, UserActivity, daily_tasks_increment, extend_subscription
+from .serializers import UserSerializer
+
+STATS_TOP_SIZE = 10
+# Сколько секунд кешировать сводную статистику
+STATS_CACHE_TIMEOUT = 30
+# Поля, которые отдает UserDetailAPIView и пакетный запрос
+USER_DETAIL_FIELDS = ['telegram_id', 'username', 'tasks_completed', 'daily_tasks_completed', 'is_admin', 'is_subscribed']
+
+
+def user_detail(telegram_id):
+    """Данные пользователя или None, если он не зарегистрирован."""
+    user = User.objects.filter(telegram_id=telegram_id).only('id', 'daily_tasks_date', *USER_DETAIL_FIELDS).first()
+    if user is None:
+        return None
+    return UserSerializer(user, fields=USER_DETAIL_FIELDS).data
+
+
+def users_batch(telegram_ids):
+    """Данные нескольких пользователей одним запросом к БД."""
+    users = User.objects.filter(telegram_id__in=telegram_ids).only('id', 'daily_tasks_date', *USER_DETAIL_FIELDS)
+    return UserSerializer(users, many=True, fields=USER_DETAIL_FIELDS).data
+
+
+def users_page(after, limit, fields=None, **filters):
+    """
+    Страница списка пользователей по курсору (id): {"results": [...], "next": id или None}.
+    filters — условия для User.objects.filter.
+    """
+    users = User.objects.filter(id__gt=after, **filters).order_by('id')
+    if fields is not None:
+        # Сегодняшний счетчик задач вычисляется по дате, поэтому она нужна вместе с ним
+        users = users.only('id', 'daily_tasks_date', *fields)
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    page = list(users[:limit + 1])
+    has_next = len(page) > limit
+    page = page[:limit]
+    return {
+        "results": UserSerializer(page, many=True, fields=fields).data,
+        "next": page[-1].id if has_next else None,
+    }
+
+
+def add_tasks(telegram_id, tasks_completed, daily_tasks_completed):
+    """Прибавляет задачи пользователю; False, если пользователь не найден."""
+    user_id = User.objects.filter(telegram_id=telegram_id).values_list('id', flat=True).first()
+    if user_id is None:
+        return False
+
+    today = timezone.localdate()
+    with transaction.atomic():
+        # Атомарный инкремент одним UPDATE: параллельные запросы не теряют значения,
+        # а вчерашний дневной счетчик начинается заново
+        User.objects.filter(id=user_id).update(
+            tasks_completed=F('tasks_completed') + tasks_completed,
+            daily_tasks_completed=daily_tasks_increment(daily_tasks_completed, today),
+            daily_tasks_date=today,
+        )
+        UserActivity.objects.record({user_id: tasks_completed})
+    return True
+
+
+def add_tasks_bulk(totals):
+    """
+    Применяет накопленные инкременты одним UPDATE.
+    totals — {telegram_id: (tasks_completed, daily_tasks_completed)}; возвращает число обновленных строк.
+    """
+    if not totals:
+        return 0
+
+    def delta(index):
+        return Case(
+            *[When(telegram_id=telegram_id, then=Value(values[index])) for telegram_id, values in totals.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    user_ids = dict(User.objects.filter(telegram_id__in=totals).values_list('telegram_id', 'id'))
+    with transaction.atomic():
+        today = timezone.localdate()
+        updated = User.objects.filter(telegram_id__in=totals).update(
+            tasks_completed=F('tasks_completed') + delta(0),
+            daily_tasks_completed=daily_tasks_increment(delta(1), today),
+            daily_tasks_date=today,
+        )
+        UserActivity.objects.record({
+            user_id: totals[telegram_id][0] for telegram_id, user_id in user_ids.items()
+        })
+    return updated
+
+
+def build_statistics_summary(top):
+    """Сводная статистика, посчитанная агрегатами в БД, и топ пользователей за день."""
+    today = timezone.localdate()
+    active = Q(daily_tasks_date=today, daily_tasks_completed__gt=0)
+    summary = User.objects.aggregate(
+        total_users=Count('id'),
+        active_today=Count('id', filter=active),
+        subscribers=Count('id', filter=Q(is_subscribed=True)),
+        tasks_total=Coalesce(Sum('tasks_completed'), 0),
+        daily_tasks_total=Coalesce(Sum('daily_tasks_completed', filter=active), 0),
+    )
+    summary['top'] = list(
+        User.objects.filter(active)
+        .order_by('-daily_tasks_completed', 'id')
+        .values('telegram_id', 'username', 'daily_tasks_completed', 'tasks_completed')[:top]
+    )
+    return summary
+
+
+def statistics_summary(top=STATS_TOP_SIZE):
+    # Сводка одинакова для всех администраторов, поэтому кешируется ненадолго
+    return cache.get_or_set(f'users:daily_statistics:{top}', lambda: build_statistics_summary(top),
+                            STATS_CACHE_TIMEOUT)
+
+
+def statistics_users_page(page, page_size):
+    """
+    Страница статистики по пользователям (page с 1), отсортированная по задачам за сегодня.
+
+    Сначала идут активные сегодня (по индексу user_daily_tasks_idx), затем остальные по id,
+    поэтому страница читается по индексам без сортировки всей таблицы.
+    """
+    today = timezone.localdate()
+    active = Q(daily_tasks_date=today, daily_tasks_completed__gt=0)
+    counts = User.objects.aggregate(total=Count('id'), active=Count('id', filter=active))
+    fields = ('telegram_id', 'username', 'daily_tasks_completed', 'tasks_completed')
+    offset = (page - 1) * page_size
+    end = offset + page_size
+
+    results = []
+    if offset < counts['active']:
+        results += User.objects.filter(active).order_by('-daily_tasks_completed', 'id').values(*fields)[offset:end]
+    if end > counts['active']:
+        rest = User.objects.exclude(active).order_by('id').values(*fields)
+        rest = rest[max(0, offset - counts['active']):end - counts['active']]
+        for user in rest:
+            # Вчерашний счетчик сегодня читается как 0
+            user['daily_tasks_completed'] = 0
+            results.append(user)
+    return {
+        "results": results,
+        "page": page,
+        "pages": max(1, -(-counts['total'] // page_size)),
+        "total": counts['total'],
+    }
+
+
+def active_plans():
+    """Активные тарифы в порядке показа."""
+    return list(Plan.objects.filter(is_active=True).values('code', 'title', 'price', 'currency', 'days'))
+
+
+def subscription_payment(telegram_id, telegram_payment_charge_id, **payment):
+    """
+    Применяет успешный платеж (см. models.extend_subscription) и возвращает
+    {"created", "is_subscribed", "subscription_end"} или None, если пользователь не найден.
+    """
+    try:
+        payment, created = extend_subscription(telegram_id, telegram_payment_charge_id, **payment)
+    except User.DoesNotExist:
+        return None
+    return {
+        "created": created,
+        "is_subscribed": True,
+        # Тот же формат, что у subscription_end в UserSerializer
+        "subscription_end": DateTimeField(format='%Y-%m-%dT%H:%M:%S').to_representation(payment.subscription_end),
+    }
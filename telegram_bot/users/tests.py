@@ -1,3 +1,301 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .metrics import DB_QUERIES, REQUESTS
+from .models import Plan, User, UserActivity
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Фиксирует число SQL-запросов на каждый эндпоинт, чтобы регрессии
+    (N+1, лишние EXISTS, чтение перед записью) ловились тестами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.admin = User.objects.create(telegram_id=1, username="admin", is_admin=True)
+        for i in range(2, 12):
+            User.objects.create(
+                telegram_id=i,
+                username=f"user{i}",
+                is_subscribed=i % 2 == 0,
+                subscription_end=now + timedelta(days=i // 2 - 2, hours=12),
+                daily_tasks_completed=i,
+                daily_tasks_date=timezone.localdate(),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+
+class UserListQueriesTest(QueryCountTestCase):
+    def test_list_page(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/?limit=5")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_list_pages_cover_all_users(self):
+        telegram_ids = []
+        after = 0
+        while after is not None:
+            response = self.client.get(f"/api/users/?limit=4&after={after}&fields=telegram_id")
+            telegram_ids += [user["telegram_id"] for user in response.data["results"]]
+            after = response.data["next"]
+        self.assertEqual(telegram_ids, list(range(1, 12)))
+
+    def test_list_with_fields_and_filters(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/?is_subscribed=true&fields=telegram_id,daily_tasks_completed")
+        self.assertEqual({tuple(user) for user in response.data["results"]}, {("telegram_id", "daily_tasks_completed")})
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_create(self):
+        with self.assertNumQueries(2):
+            response = self.client.post("/api/users/", {"telegram_id": 100, "username": "new"}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_duplicate(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/users/", {"telegram_id": 2, "username": "dup"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class RegistrationQueriesTest(QueryCountTestCase):
+    def test_register(self):
+        with self.assertNumQueries(2):
+            response = self.client.post("/api/users/register/", {"telegram_id": 100, "username": "new"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.objects.filter(telegram_id=100).count(), 1)
+
+    def test_register_duplicate(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/users/register/", {"telegram_id": 2, "username": "dup"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_make_admin(self):
+        with self.assertNumQueries(2):
+            response = self.client.post("/api/users/2/make_admin/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(telegram_id=2).is_admin)
+
+    def test_make_admin_unknown_user(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/users/999/make_admin/")
+        self.assertEqual(response.status_code, 404)
+
+
+class UserDetailQueriesTest(QueryCountTestCase):
+    def test_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/2/")
+        self.assertEqual(response.data["daily_tasks_completed"], 2)
+
+    def test_patch_without_telegram_id_skips_uniqueness_check(self):
+        with self.assertNumQueries(2):
+            response = self.client.patch("/api/users/2/", {"is_admin": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(telegram_id=2).is_admin)
+
+    def test_patch_with_same_telegram_id_skips_uniqueness_check(self):
+        with self.assertNumQueries(2):
+            self.client.patch("/api/users/2/", {"telegram_id": 2, "username": "renamed"}, format="json")
+
+    def test_batch(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/users/batch/", {"telegram_ids": [2, 3, 999]}, format="json")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(response.data["missing"], [999])
+
+
+class TaskCounterQueriesTest(QueryCountTestCase):
+    def test_update_tasks(self):
+        # SELECT id, SAVEPOINT, UPDATE user, INSERT/UPDATE активности, RELEASE
+        with self.assertNumQueries(6):
+            response = self.client.patch("/api/users/2/update_tasks/", {"tasks_completed": 1, "daily_tasks_completed": 1},
+                                         format="json")
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(telegram_id=2)
+        self.assertEqual((user.tasks_completed, user.daily_tasks_completed), (1, 3))
+        self.assertEqual(UserActivity.objects.get(user=user).actions_count, 1)
+
+    def test_update_tasks_resets_stale_daily_counter(self):
+        User.objects.filter(telegram_id=2).update(daily_tasks_date=timezone.localdate() - timedelta(days=1))
+        self.client.patch("/api/users/2/update_tasks/", {"tasks_completed": 1, "daily_tasks_completed": 1}, format="json")
+        self.assertEqual(User.objects.get(telegram_id=2).daily_tasks(), 1)
+
+    def test_bulk_update_tasks_does_not_depend_on_user_count(self):
+        increments = [{"telegram_id": i, "tasks_completed": 1, "daily_tasks_completed": 1} for i in range(2, 12)]
+        with self.assertNumQueries(6):
+            response = self.client.post("/api/users/update_tasks/", {"increments": increments}, format="json")
+        self.assertEqual(response.data["updated"], 10)
+
+
+class StatisticsQueriesTest(QueryCountTestCase):
+    def test_summary_is_cached(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/users/1/daily_statistics/")
+        self.assertEqual(response.data["total_users"], 11)
+        self.assertEqual(response.data["top"][0]["telegram_id"], 11)
+        with self.assertNumQueries(1):
+            self.client.get("/api/users/1/daily_statistics/")
+
+    def test_users_page(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/users/1/daily_statistics/users/?page=2&page_size=5")
+        self.assertEqual(response.data["pages"], 3)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_users_pages_order(self):
+        User.objects.filter(telegram_id=5).update(daily_tasks_date=timezone.localdate() - timedelta(days=1))
+        telegram_ids = []
+        for page in (1, 2, 3):
+            # Страница на границе активных и остальных читает обе части
+            with self.assertNumQueries(4 if page == 2 else 3):
+                response = self.client.get(f"/api/users/1/daily_statistics/users/?page={page}&page_size=5")
+            telegram_ids += [user["telegram_id"] for user in response.data["results"]]
+        self.assertEqual(telegram_ids, [11, 10, 9, 8, 7, 6, 4, 3, 2, 1, 5])
+        self.assertEqual(response.data["results"][-1]["daily_tasks_completed"], 0)
+
+    def test_not_admin(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/2/daily_statistics/")
+        self.assertEqual(response.status_code, 403)
+
+
+class SubscriptionQueriesTest(QueryCountTestCase):
+    def test_expire_subscriptions(self):
+        # SAVEPOINT, SELECT истекших FOR UPDATE, UPDATE по id, RELEASE, SELECT для напоминаний
+        with self.assertNumQueries(5):
+            response = self.client.post("/api/users/subscriptions/expire/", {}, format="json")
+        self.assertEqual(response.data["expired"], [2])
+        self.assertEqual(response.data["reminders"], [8])
+        self.assertFalse(User.objects.get(telegram_id=2).is_subscribed)
+
+    def extend(self, telegram_id, charge_id):
+        return self.client.post(f"/api/users/{telegram_id}/subscription/extend/", {
+            "telegram_payment_charge_id": charge_id, "total_amount": 29000, "currency": "RUB",
+        }, format="json")
+
+    def test_extend_subscription_is_idempotent(self):
+        # SAVEPOINT, SELECT ... FOR UPDATE, SELECT платежа, SAVEPOINT, INSERT, RELEASE, UPDATE, RELEASE
+        with self.assertNumQueries(8):
+            response = self.extend(10, "charge-1")
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(telegram_id=10)
+        # Подписка еще действует, поэтому продлевается от ее окончания
+        self.assertGreater(user.subscription_end - timezone.now(), timedelta(days=33))
+        self.assertEqual(user.payments.get().amount, 29000)
+
+        response = self.extend(10, "charge-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["created"])
+        self.assertEqual(User.objects.get(telegram_id=10).subscription_end, user.subscription_end)
+
+    def test_extend_expired_subscription_starts_now(self):
+        response = self.extend(2, "charge-2")
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(telegram_id=2)
+        self.assertTrue(user.is_subscribed)
+        self.assertAlmostEqual(user.subscription_end - timezone.now(), timedelta(days=30), delta=timedelta(minutes=1))
+
+    def test_extend_unknown_user(self):
+        self.assertEqual(self.extend(999, "charge-3").status_code, 404)
+
+
+class ActivityQueriesTest(QueryCountTestCase):
+    def test_user_activity(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/users/2/activity/?days=7")
+        self.assertEqual(response.status_code, 200)
+
+    def test_global_activity(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/activity/?days=7")
+        self.assertEqual(response.status_code, 200)
+
+    def test_record_upserts(self):
+        user_ids = list(User.objects.filter(telegram_id__in=[2, 3]).values_list('id', flat=True))
+        for _ in range(2):
+            # INSERT ... ON CONFLICT DO NOTHING и один UPDATE на всех пользователей
+            with self.assertNumQueries(2):
+                UserActivity.objects.record({user_id: 2 for user_id in user_ids})
+        self.assertEqual(UserActivity.objects.count(), 2)
+        self.assertEqual(set(UserActivity.objects.values_list('actions_count', flat=True)), {4})
+
+
+class PlanListTest(QueryCountTestCase):
+    def test_default_plan(self):
+        # Миграция переносит только прежний месячный тариф
+        self.assertEqual(list(Plan.objects.values_list("code", "price", "days")), [("month", 29000, 30)])
+
+    def test_active_plans(self):
+        Plan.objects.create(code="year", title="1 год", price=290000, days=365, position=3, is_active=False)
+        Plan.objects.create(code="quarter", title="3 месяца", price=79000, days=90, position=2)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/users/plans/")
+        self.assertEqual([plan["code"] for plan in response.data["results"]], ["month", "quarter"])
+        self.assertEqual(response.data["results"][0]["price"], 29000)
+
+
+@override_settings(MIDDLEWARE=['users.middleware.MetricsMiddleware'])
+class MetricsMiddlewareTest(QueryCountTestCase):
+    def test_requests_and_queries_are_counted(self):
+        requests_before = REQUESTS.value('user-detail', 'GET', 200)
+        queries_before = DB_QUERIES.value('user-detail')
+        self.client.get("/api/users/2/")
+        self.assertEqual(REQUESTS.value('user-detail', 'GET', 200), requests_before + 1)
+        self.assertEqual(DB_QUERIES.value('user-detail'), queries_before + 1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/metrics/")
+        self.assertIn('django_http_requests_total{view="user-detail",method="GET",status="200"}',
+                      response.content.decode())
+
+
+class ActivityTest(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.localdate()
+        users = {user.telegram_id: user.id for user in User.objects.all()}
+        UserActivity.objects.record({users[2]: 3, users[3]: 1}, date=today)
+        UserActivity.objects.record({users[2]: 2}, date=today - timedelta(days=1))
+        UserActivity.objects.record({users[3]: 7}, date=today - timedelta(days=40))
+
+    def test_user_activity(self):
+        response = self.client.get("/api/users/2/activity/?days=7")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 5)
+        self.assertEqual([day["actions_count"] for day in response.data["activity"]], [2, 3])
+
+    def test_user_activity_default_range(self):
+        response = self.client.get("/api/users/3/activity/")
+        self.assertEqual(response.data["days"], 30)
+        self.assertEqual(response.data["total"], 1)
+        self.assertEqual(self.client.get("/api/users/3/activity/?days=41").data["total"], 8)
+
+    def test_user_activity_unknown_user(self):
+        self.assertEqual(self.client.get("/api/users/999/activity/").status_code, 404)
+
+    def test_days_bounds(self):
+        for days in ("0", "367", "-1", "abc"):
+            self.assertEqual(self.client.get(f"/api/users/2/activity/?days={days}").status_code, 400, days)
+            self.assertEqual(self.client.get(f"/api/users/activity/?days={days}").status_code, 400, days)
+        self.assertEqual(self.client.get("/api/users/activity/?days=366").status_code, 200)
+        self.assertEqual(self.client.get("/api/users/activity/?days=1").status_code, 200)
+
+    def test_global_activity_is_aggregated_per_day(self):
+        response = self.client.get("/api/users/activity/?days=7")
+        today = timezone.localdate()
+        self.assertEqual([dict(day) for day in response.data["activity"]], [
+            {"date": today - timedelta(days=1), "actions_count": 2, "active_users": 1},
+            {"date": today, "actions_count": 4, "active_users": 2},
+        ])
@@ -3,10 +3,19 @@ from .views import *
 
 urlpatterns = [
     path('', home, name='home'),  # Стартовая страница
+    path('metrics/', metrics, name='metrics'),
     path('api/users/', UserListCreateAPIView.as_view(), name='user-list-create'),
+    path('api/users/batch/', UserBatchAPIView.as_view(), name='user-batch'),
+    path('api/users/update_tasks/', BulkUpdateTasksView.as_view(), name='bulk_update_tasks'),
+    path('api/users/subscriptions/expire/', ExpireSubscriptionsAPIView.as_view(), name='expire_subscriptions'),
+    path('api/users/plans/', PlanListAPIView.as_view(), name='plans'),
+    path('api/users/activity/', GlobalActivityAPIView.as_view(), name='global_activity'),
     path('api/users/register/', UserRegistrationAPIView.as_view(), name='user-register'),
     path('api/users/<int:telegram_id>/', UserDetailAPIView.as_view(), name='user-detail'),
     path('api/users/<int:telegram_id>/update_tasks/', UpdateTasksView.as_view(), name='update_tasks'),  # С использованием PATCH
     path('api/users/<int:telegram_id>/daily_statistics/', DailyStatisticsAPIView.as_view(), name='daily_statistics'),
+    path('api/users/<int:telegram_id>/daily_statistics/users/', DailyStatisticsUsersAPIView.as_view(), name='daily_statistics_users'),
+    path('api/users/<int:telegram_id>/activity/', UserActivityAPIView.as_view(), name='user_activity'),
+    path('api/users/<int:telegram_id>/subscription/extend/', ExtendSubscriptionAPIView.as_view(), name='extend_subscription'),
     path('api/users/<int:telegram_id>/make_admin/', MakeAdminAPIView.as_view(), name='make_admin'),
 ]
\ No newline at end of file
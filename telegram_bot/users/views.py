@@ -1,15 +1,83 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import User
+from . import metrics as api_metrics
+from . import services
+from .models import SUBSCRIPTION_DAYS, SUBSCRIPTION_REMIND_DAYS, User, UserActivity, sweep_subscriptions
 from .serializers import UserSerializer
+from .services import STATS_TOP_SIZE
 from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+USERS_PAGE_SIZE = 500
+USERS_MAX_PAGE_SIZE = 5000
+USERS_BATCH_MAX_SIZE = 1000
+STATS_PAGE_SIZE = 15
+STATS_MAX_PAGE_SIZE = 100
+ACTIVITY_DEFAULT_DAYS = 30
+ACTIVITY_MAX_DAYS = 366
+SUBSCRIPTION_MAX_DAYS = 366
+
+
+def parse_query_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid datetime: {value}")
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_bool(value):
+    if value is None:
+        return None
+    value = value.lower()
+    if value in ('true', '1'):
+        return True
+    if value in ('false', '0'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value}")
+
 
 class UserListCreateAPIView(APIView):
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        """
+        Постраничный список пользователей с пагинацией по курсору (id).
+
+        Параметры: after — id последней записи предыдущей страницы, limit — размер
+        страницы, fields — поля через запятую, is_subscribed / is_admin — фильтры,
+        subscription_end_after / subscription_end_before — диапазон окончания подписки.
+        """
+        params = request.query_params
+        try:
+            after = int(params.get('after', 0))
+            limit = min(int(params.get('limit', USERS_PAGE_SIZE)), USERS_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            filters = {}
+            for name in ('is_subscribed', 'is_admin'):
+                value = parse_bool(params.get(name))
+                if value is not None:
+                    filters[name] = value
+            for name, lookup in (('subscription_end_after', 'subscription_end__gte'),
+                                 ('subscription_end_before', 'subscription_end__lt')):
+                if name in params:
+                    filters[lookup] = parse_query_datetime(params[name])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = None
+        if 'fields' in params:
+            fields = [name for name in params['fields'].split(',') if name]
+            unknown = set(fields) - set(UserSerializer.Meta.fields)
+            if unknown:
+                return Response({"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(services.users_page(after, limit, fields, **filters))
 
     def post(self, request):
         serializer = UserSerializer(data=request.data)
@@ -18,6 +86,26 @@ class UserListCreateAPIView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class UserBatchAPIView(APIView):
+    def post(self, request):
+        """
+        Возвращает записи сразу нескольких пользователей одним запросом к БД.
+        Тело: {"telegram_ids": [...]}.
+        """
+        telegram_ids = request.data.get("telegram_ids")
+        if not isinstance(telegram_ids, list) or not all(isinstance(i, int) for i in telegram_ids):
+            return Response({"error": "telegram_ids must be a list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(telegram_ids) > USERS_BATCH_MAX_SIZE:
+            return Response({"error": f"Too many telegram_ids, max {USERS_BATCH_MAX_SIZE}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = services.users_batch(telegram_ids)
+        found = {user['telegram_id'] for user in results}
+        return Response({
+            "results": results,
+            "missing": [telegram_id for telegram_id in telegram_ids if telegram_id not in found],
+        }, status=status.HTTP_200_OK)
+
 class UserRegistrationAPIView(APIView):
     def post(self, request, *args, **kwargs):
         telegram_id = request.data.get("telegram_id")
@@ -33,8 +121,6 @@ class UserRegistrationAPIView(APIView):
         # Сохранение нового пользователя
         user = User.objects.create(telegram_id=telegram_id, username=username)
 
-        User.objects.create(user=user)
-
         return Response(
             {"message": "User registered successfully", "user": {"id": user.id, "username": user.username}},
             status=status.HTTP_201_CREATED
@@ -42,17 +128,10 @@ class UserRegistrationAPIView(APIView):
 
 class UserDetailAPIView(APIView):
     def get(self, request, telegram_id):
-        try:
-            user = User.objects.get(telegram_id=telegram_id)
-            return Response({
-                "telegram_id": user.telegram_id,
-                "username": user.username,
-                "tasks_completed": user.tasks_completed,
-                "is_admin": user.is_admin,
-                "is_subscribed": user.is_subscribed,
-            }, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
+        user = services.user_detail(telegram_id)
+        if user is None:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(user, status=status.HTTP_200_OK)
 
     def patch(self, request, telegram_id):
         try:
@@ -76,7 +155,7 @@ class UpdateUserTasksAPIView(APIView):
         tasks_completed = request.data.get("tasks_completed")
         if tasks_completed is not None:
             user.tasks_completed = tasks_completed
-            user.save()
+            user.save(update_fields=['tasks_completed'])
             return Response({"message": "Tasks completed updated successfully"}, status=status.HTTP_200_OK)
         return Response({"error": "Invalid data"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -85,7 +164,7 @@ class MakeAdminAPIView(APIView):
         try:
             user = User.objects.get(telegram_id=telegram_id)
             user.is_admin = True
-            user.save()
+            user.save(update_fields=['is_admin'])
             return Response({"message": "User promoted to admin successfully"}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -95,7 +174,7 @@ class AdminManagementAPIView(APIView):
         try:
             user = User.objects.get(telegram_id=telegram_id)
             user.is_admin = True
-            user.save()
+            user.save(update_fields=['is_admin'])
             return Response({"message": "User promoted to admin successfully"}, status=status.HTTP_200_OK)
         except User.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -105,47 +184,186 @@ class AdminManagementAPIView(APIView):
         data = [{"telegram_id": admin.telegram_id, "username": admin.username} for admin in admins]
         return Response(data, status=status.HTTP_200_OK)
 
+def get_admin_or_error(telegram_id):
+    """Возвращает (user, None) для администратора или (None, Response) с ошибкой."""
+    user = User.objects.filter(telegram_id=telegram_id).only('id', 'is_admin').first()
+    if user is None:
+        return None, Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not user.is_admin:
+        return None, Response({"error": "You do not have permission to view this."}, status=status.HTTP_403_FORBIDDEN)
+    return user, None
+
 class DailyStatisticsAPIView(APIView):
     def get(self, request, telegram_id):
+        _, error = get_admin_or_error(telegram_id)
+        if error:
+            return error
+
         try:
-            # Получение пользователя по telegram_id
-            user = User.objects.get(telegram_id=telegram_id)
-        except User.DoesNotExist:
-            return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+            top = min(int(request.query_params.get('top', STATS_TOP_SIZE)), STATS_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({"error": "top must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(services.statistics_summary(top), status=status.HTTP_200_OK)
 
-        # Проверка, является ли пользователь администратором
-        if not user.is_admin:
-            return Response({"error": "You do not have permission to view this."}, status=status.HTTP_403_FORBIDDEN)
+class DailyStatisticsUsersAPIView(APIView):
+    def get(self, request, telegram_id):
+        """Постраничная статистика по пользователям: page (с 1) и page_size."""
+        _, error = get_admin_or_error(telegram_id)
+        if error:
+            return error
+
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = min(int(request.query_params.get('page_size', STATS_PAGE_SIZE)), STATS_MAX_PAGE_SIZE)
+            if page < 1 or page_size < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "page and page_size must be positive integers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(services.statistics_users_page(page, page_size), status=status.HTTP_200_OK)
 
-        users = User.objects.all()
-        stats = {}
+def parse_increment(value):
+    if value is None:
+        return 0
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError("Increments must be non-negative integers")
+    return value
 
-        for user in users:
-            stats[user.telegram_id] = {
-                'username': user.username,
-                'count_daily_tasks': user.daily_tasks_completed,
-                'count_tasks': user.tasks_completed,
-                }
-        # Возвращение статистики в ответе
-        return Response(stats, status=status.HTTP_200_OK)
 
 class UpdateTasksView(APIView):
     def patch(self, request, telegram_id):
-        user = User.objects.filter(telegram_id=telegram_id).first()
-        if not user:
+        try:
+            tasks_completed = parse_increment(request.data.get("tasks_completed"))
+            daily_tasks_completed = parse_increment(request.data.get("daily_tasks_completed"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not services.add_tasks(telegram_id, tasks_completed, daily_tasks_completed):
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Tasks updated successfully"}, status=status.HTTP_200_OK)
 
-        tasks_completed = request.data.get("tasks_completed")
-        daily_tasks_completed = request.data.get("daily_tasks_completed")
+class BulkUpdateTasksView(APIView):
+    def post(self, request):
+        """
+        Применяет накопленные ботом инкременты счетчиков одним UPDATE.
+        Тело: {"increments": [{"telegram_id": 1, "tasks_completed": 2, "daily_tasks_completed": 2}, ...]}.
+        """
+        increments = request.data.get("increments")
+        if not isinstance(increments, list) or len(increments) > USERS_BATCH_MAX_SIZE:
+            return Response({"error": f"increments must be a list of at most {USERS_BATCH_MAX_SIZE} items"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        if tasks_completed is not None:
-            user.tasks_completed += tasks_completed
+        totals = {}
+        try:
+            for item in increments:
+                telegram_id = item.get("telegram_id")
+                if not isinstance(telegram_id, int):
+                    raise ValueError("telegram_id must be an integer")
+                tasks, daily = totals.get(telegram_id, (0, 0))
+                totals[telegram_id] = (
+                    tasks + parse_increment(item.get("tasks_completed")),
+                    daily + parse_increment(item.get("daily_tasks_completed")),
+                )
+        except (AttributeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if daily_tasks_completed is not None:
-            user.daily_tasks_completed += daily_tasks_completed
+        updated = services.add_tasks_bulk(totals)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
 
-        user.save()
-        return Response({"message": "Tasks updated successfully"}, status=status.HTTP_200_OK)
+def parse_days(request):
+    days = int(request.query_params.get('days', ACTIVITY_DEFAULT_DAYS))
+    if not 1 <= days <= ACTIVITY_MAX_DAYS:
+        raise ValueError(f"days must be between 1 and {ACTIVITY_MAX_DAYS}")
+    return days
+
+class UserActivityAPIView(APIView):
+    def get(self, request, telegram_id):
+        """Активность пользователя по дням за последние days дней."""
+        try:
+            days = parse_days(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = User.objects.filter(telegram_id=telegram_id).values_list('id', flat=True).first()
+        if user_id is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        activity = list(
+            UserActivity.objects.since(days).filter(user_id=user_id).order_by('date').values('date', 'actions_count')
+        )
+        return Response({
+            "days": days,
+            "total": sum(day['actions_count'] for day in activity),
+            "activity": activity,
+        }, status=status.HTTP_200_OK)
+
+class GlobalActivityAPIView(APIView):
+    def get(self, request):
+        """Суммарная активность по дням за последние days дней: действия и число активных пользователей."""
+        try:
+            days = parse_days(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        activity = list(
+            UserActivity.objects.since(days)
+            .values('date')
+            .annotate(actions_count=Sum('actions_count'), active_users=Count('user'))
+            .order_by('date')
+        )
+        return Response({"days": days, "activity": activity}, status=status.HTTP_200_OK)
+
+class ExpireSubscriptionsAPIView(APIView):
+    def post(self, request):
+        try:
+            remind_days = int(request.data.get("remind_days", SUBSCRIPTION_REMIND_DAYS))
+        except (TypeError, ValueError):
+            return Response({"error": "remind_days must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sweep_subscriptions(remind_days), status=status.HTTP_200_OK)
+
+class PlanListAPIView(APIView):
+    def get(self, request):
+        """Активные тарифы подписки."""
+        return Response({"results": services.active_plans()}, status=status.HTTP_200_OK)
+
+class ExtendSubscriptionAPIView(APIView):
+    def post(self, request, telegram_id):
+        """
+        Продлевает подписку по успешному платежу одним запросом.
+        Тело: {"telegram_payment_charge_id", "provider_payment_charge_id", "total_amount",
+        "currency", "invoice_payload", "days"}. Повтор с тем же telegram_payment_charge_id
+        ничего не меняет и возвращает 200 вместо 201.
+        """
+        data = request.data
+        charge_id = data.get("telegram_payment_charge_id")
+        if not isinstance(charge_id, str) or not charge_id:
+            return Response({"error": "telegram_payment_charge_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        days = data.get("days", SUBSCRIPTION_DAYS)
+        amount = data.get("total_amount", 0)
+        if not isinstance(days, int) or not 1 <= days <= SUBSCRIPTION_MAX_DAYS:
+            return Response({"error": f"days must be between 1 and {SUBSCRIPTION_MAX_DAYS}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(amount, int) or amount < 0:
+            return Response({"error": "total_amount must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = services.subscription_payment(
+            telegram_id,
+            charge_id,
+            days=days,
+            amount=amount,
+            currency=str(data.get("currency", ""))[:3],
+            provider_payment_charge_id=str(data.get("provider_payment_charge_id", ""))[:255],
+            payload=str(data.get("invoice_payload", ""))[:128],
+        )
+        if result is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result, status=status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK)
 
 def home(request):
     return HttpResponse("Welcome to the homepage!")
+
+def metrics(request):
+    """Метрики в формате Prometheus (собирает users.middleware.MetricsMiddleware)."""
+    return HttpResponse(api_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,95 @@
+import asyncio
+import socket
+import time
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from api_client import DjangoAPIClient
+
+
+class DjangoAPIClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hits = {}
+        # Сколько первых ответов по пути будут 500
+        self.failures = {}
+        app = web.Application()
+        app.router.add_route("*", "/{name}/", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}/"
+        self.api = await self.client(self.base)
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def client(self, base_url, **kwargs):
+        api = DjangoAPIClient(base_url, **{"retries": 2, "backoff": 0.01, **kwargs})
+        await api.start()
+        self.addAsyncCleanup(api.close)
+        return api
+
+    async def handle(self, request):
+        name = request.match_info["name"]
+        self.hits[name] = self.hits.get(name, 0) + 1
+        if name == "slow":
+            await asyncio.sleep(1)
+        if self.hits[name] <= self.failures.get(name, 0):
+            return web.json_response({"error": "boom"}, status=500)
+        return web.json_response({"ok": True})
+
+    async def test_get_is_retried_on_5xx(self):
+        self.failures["users"] = 2
+        response = await self.api.get("users/")
+        self.assertEqual((response.status, response.data), (200, {"ok": True}))
+        self.assertEqual(self.hits["users"], 3)
+
+    async def test_last_5xx_is_returned(self):
+        self.failures["users"] = 10
+        response = await self.api.get("users/")
+        self.assertEqual(response.status, 500)
+        self.assertEqual(self.hits["users"], 3)
+
+    async def test_post_is_not_retried_on_5xx(self):
+        self.failures["update_tasks"] = 1
+        response = await self.api.post("update_tasks/", json={})
+        self.assertEqual(response.status, 500)
+        self.assertEqual(self.hits["update_tasks"], 1)
+
+    async def test_idempotent_post_is_retried_on_5xx(self):
+        self.failures["extend"] = 1
+        response = await self.api.post("extend/", idempotent=True, json={})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.hits["extend"], 2)
+
+    async def test_post_is_not_retried_on_timeout(self):
+        api = await self.client(self.base, timeout=0.2)
+        with self.assertRaises(asyncio.TimeoutError):
+            await api.post("slow/", json={})
+        self.assertEqual(self.hits["slow"], 1)
+
+    async def test_get_is_retried_on_timeout(self):
+        api = await self.client(self.base, timeout=0.2)
+        with self.assertRaises(asyncio.TimeoutError):
+            await api.get("slow/")
+        self.assertEqual(self.hits["slow"], 3)
+
+    async def test_post_is_retried_on_connect_error_with_backoff(self):
+        # Порт, на котором никто не слушает: соединение не устанавливается
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        api = await self.client(f"http://127.0.0.1:{port}/", retries=3, backoff=0.05)
+        started = time.perf_counter()
+        with self.assertRaises(aiohttp.ClientConnectorError):
+            await api.post("users/", json={})
+        elapsed = time.perf_counter() - started
+        # Задержки 0.05 + 0.1 + 0.2 между четырьмя попытками, после последней — без ожидания
+        self.assertGreaterEqual(elapsed, 0.35)
+        self.assertLess(elapsed, 0.75)
+
+
+if __name__ == "__main__":
+    unittest.main()
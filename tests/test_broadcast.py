@@ -0,0 +1,98 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from broadcast import BroadcastBusyError, Broadcaster, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.fail:
+            raise ValueError("bad kwargs")
+        self.sent.append(chat_id)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([bucket.delay() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.delay(), 0.1, delta=0.01)
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        bucket.delay()
+        self.assertFalse(bucket.idle())
+        time.sleep(0.02)
+        self.assertTrue(bucket.idle())
+        self.assertEqual(bucket.delay(), 0)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=100)
+        bucket.pause(5)
+        self.assertGreater(bucket.delay(), 4)
+        self.assertFalse(bucket.idle())
+
+
+class BroadcasterTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state_dir = directory.name
+
+    def broadcaster(self, bot):
+        return Broadcaster(bot, self.state_dir, concurrency=4, global_rate=10000, per_chat_rate=10000)
+
+    async def test_run(self):
+        bot = FakeBot()
+        stats = await self.broadcaster(bot).run("job", range(1, 11), "привет")
+        self.assertEqual(sorted(bot.sent), list(range(1, 11)))
+        self.assertEqual(stats["sent"], 10)
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    async def test_resume_skips_done_chats(self):
+        with open(os.path.join(self.state_dir, "job.json"), "w", encoding="utf-8") as f:
+            json.dump({"chat_ids": [1, 2, 3, 4, 5], "text": "привет", "kwargs": {}}, f)
+        with open(os.path.join(self.state_dir, "job.done"), "w", encoding="utf-8") as f:
+            f.write("1\n2\n")
+
+        bot = FakeBot()
+        results = await self.broadcaster(bot).resume()
+        self.assertEqual(sorted(bot.sent), [3, 4, 5])
+        self.assertEqual(results["job"]["sent"], 3)
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    async def test_resume_skips_running_job(self):
+        with open(os.path.join(self.state_dir, "job.json"), "w", encoding="utf-8") as f:
+            json.dump({"chat_ids": [1, 2], "text": "привет", "kwargs": {}}, f)
+        # Блокировку держит "другой процесс": тот, кто сейчас выполняет эту рассылку
+        with open(os.path.join(self.state_dir, "job.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            bot = FakeBot()
+            self.assertEqual(await self.broadcaster(bot).resume(), {})
+            with self.assertRaises(BroadcastBusyError):
+                await self.broadcaster(bot).run("job", [1, 2], "привет")
+            self.assertEqual(bot.sent, [])
+
+        results = await self.broadcaster(bot).resume()
+        self.assertEqual(sorted(bot.sent), [1, 2])
+        self.assertEqual(results["job"]["sent"], 2)
+        self.assertEqual(os.listdir(self.state_dir), [])
+
+    async def test_unexpected_error_does_not_stop_workers(self):
+        # Ошибок больше, чем воркеров: при гибели воркеров рассылка бы зависла
+        bot = FakeBot(fail=range(1, 9))
+        with self.assertLogs("broadcast", "ERROR"):
+            stats = await self.broadcaster(bot).run("job", range(1, 21), "привет")
+        self.assertEqual(sorted(bot.sent), list(range(9, 21)))
+        self.assertEqual((stats["sent"], stats["failed"]), (12, 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
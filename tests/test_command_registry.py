@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from aiogram.types import BotCommand
+
+from command_registry import CommandRegistry, commands_digest
+
+
+class CommandRegistryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "commands.json")
+
+    def test_marks_survive_reopen(self):
+        registry = CommandRegistry(self.path)
+        registry.mark("default", "a")
+        registry.mark(42, "b")
+
+        registry = CommandRegistry(self.path)
+        self.assertTrue(registry.is_current("default", "a"))
+        self.assertTrue(registry.is_current(42, "b"))
+        self.assertFalse(registry.is_current(42, "c"))
+        self.assertFalse(registry.is_current(7, "b"))
+
+    def test_chat_ids_and_forget(self):
+        registry = CommandRegistry(self.path)
+        registry.mark("default", "a")
+        registry.mark("legacy_chat_scopes", "cleared")
+        registry.mark(42, "b")
+        registry.mark(-100, "b")
+        self.assertEqual(sorted(registry.chat_ids()), [-100, 42])
+
+        registry.forget(42)
+        self.assertEqual(CommandRegistry(self.path).chat_ids(), [-100])
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{битый")
+        with self.assertLogs("command_registry", "WARNING"):
+            registry = CommandRegistry(self.path)
+        self.assertFalse(registry.is_current("default", "a"))
+        registry.mark("default", "a")
+        self.assertTrue(CommandRegistry(self.path).is_current("default", "a"))
+
+    def test_digest_tracks_commands(self):
+        commands = [BotCommand(command="start", description="Начать")]
+        self.assertEqual(commands_digest(commands), commands_digest(list(commands)))
+        changed = [BotCommand(command="start", description="Начать работу")]
+        self.assertNotEqual(commands_digest(commands), commands_digest(changed))
+
+
+if __name__ == "__main__":
+    unittest.main()
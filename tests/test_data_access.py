@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from api_client import DjangoAPIClient
+from data_access import ORMUserStore, RESTUserStore, UserStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from django_server import DjangoTestServer, configure_django, migrate, seed_users  # noqa: E402
+
+USERS = 30
+MISSING_ID = 10 ** 6
+
+_directory = None
+_server = None
+
+
+def setUpModule():
+    global _directory, _server
+    # Отдельная база в temp: рабочая база проекта не затрагивается
+    _directory = tempfile.TemporaryDirectory()
+    configure_django(os.path.join(_directory.name, "db.sqlite3"))
+    migrate()
+    seed_users(USERS)
+    _server = DjangoTestServer()
+    _server.start()
+
+
+def tearDownModule():
+    _server.stop()
+    _directory.cleanup()
+
+
+class UserStoreTest(unittest.TestCase):
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            UserStore()
+
+
+class StoreParityTest(unittest.IsolatedAsyncioTestCase):
+    """RESTUserStore и ORMUserStore на одной базе должны отвечать одинаково."""
+
+    async def asyncSetUp(self):
+        self.rest = RESTUserStore(DjangoAPIClient(_server.api_url, retries=0))
+        self.orm = ORMUserStore(threads=2)
+        for store in (self.rest, self.orm):
+            await store.start()
+            self.addAsyncCleanup(store.close)
+
+    async def both(self, method, *args, **kwargs):
+        rest = await getattr(self.rest, method)(*args, **kwargs)
+        orm = await getattr(self.orm, method)(*args, **kwargs)
+        self.assertEqual(rest, orm, method)
+        return rest
+
+    async def pages(self, store, *args, **kwargs):
+        return [page async for page in store.user_pages(*args, **kwargs)]
+
+    async def test_get_user(self):
+        user = await self.both("get_user", 1)
+        self.assertEqual(user["telegram_id"], 1)
+        self.assertIsNone(await self.both("get_user", MISSING_ID))
+
+    async def test_get_users(self):
+        users = await self.both("get_users", [3, 1, 2, MISSING_ID])
+        self.assertEqual(sorted(user["telegram_id"] for user in users), [1, 2, 3])
+
+    async def test_user_pages(self):
+        for kwargs in ({}, {"fields": ["telegram_id", "is_admin"]}, {"is_admin": True}, {"is_subscribed": False}):
+            rest = await self.pages(self.rest, 7, **kwargs)
+            self.assertEqual(rest, await self.pages(self.orm, 7, **kwargs), kwargs)
+            self.assertTrue(all(len(page) <= 7 for page in rest))
+        all_users = await self.pages(self.rest, 7, fields=["telegram_id"])
+        ids = [user["telegram_id"] for page in all_users for user in page]
+        self.assertEqual(ids[:USERS], list(range(1, USERS + 1)))
+
+    async def test_add_tasks(self):
+        # Один и тот же прирост через разные бэкенды разным пользователям
+        before = {telegram_id: await self.orm.get_user(telegram_id) for telegram_id in (10, 11)}
+        self.assertTrue(await self.rest.add_tasks(10, 3, 2))
+        self.assertTrue(await self.orm.add_tasks(11, 3, 2))
+        for telegram_id in (10, 11):
+            after = await self.both("get_user", telegram_id)
+            self.assertEqual(after["tasks_completed"], before[telegram_id]["tasks_completed"] + 3)
+
+    async def test_add_tasks_bulk(self):
+        before = {telegram_id: await self.orm.get_user(telegram_id) for telegram_id in (12, 13)}
+        increments = [{"telegram_id": 12, "tasks_completed": 1, "daily_tasks_completed": 1}] * 2
+        self.assertTrue(await self.rest.add_tasks_bulk(increments))
+        increments = [{"telegram_id": 13, "tasks_completed": 1, "daily_tasks_completed": 1}] * 2
+        self.assertTrue(await self.orm.add_tasks_bulk(increments))
+        for telegram_id in (12, 13):
+            after = await self.both("get_user", telegram_id)
+            self.assertEqual(after["tasks_completed"], before[telegram_id]["tasks_completed"] + 2)
+
+    async def test_create_and_update_user(self):
+        self.assertTrue(await self.rest.create_user(USERS + 1, "rest"))
+        self.assertTrue(await self.orm.create_user(USERS + 2, "orm"))
+        self.assertFalse(await self.both("create_user", USERS + 1, "again"))
+        self.assertTrue(await self.rest.update_user(USERS + 1, is_admin=True))
+        self.assertTrue(await self.orm.update_user(USERS + 2, is_admin=True))
+        self.assertFalse(await self.both("update_user", MISSING_ID, is_admin=True))
+        for telegram_id in (USERS + 1, USERS + 2):
+            self.assertTrue((await self.both("get_user", telegram_id))["is_admin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
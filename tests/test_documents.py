@@ -0,0 +1,127 @@
+import asyncio
+import io
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Document
+from aiohttp import web
+
+from documents import DocumentError, DocumentTooLargeError, DocumentWordCount, count_docx
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def make_docx(paragraphs) -> bytes:
+    body = "".join("<w:p>" + "".join(f"<w:r><w:t>{run}</w:t></w:r>" for run in runs) + "</w:p>" for runs in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("word/document.xml", f'<?xml version="1.0"?><w:document {W}><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+class DocumentWordCountTest(unittest.IsolatedAsyncioTestCase):
+    """Скачивание идет с локального сервера, который отвечает как Bot API."""
+
+    async def asyncSetUp(self):
+        self.files = {}
+        app = web.Application()
+        app.router.add_post("/bot{token}/getFile", self.get_file)
+        app.router.add_get("/file/bot{token}/{name}", self.download)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        self.bot = Bot("1:test", session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+
+    async def asyncTearDown(self):
+        await self.bot.session.close()
+        await self.runner.cleanup()
+
+    async def get_file(self, request):
+        file_id = (await request.post())["file_id"]
+        return web.json_response({"ok": True, "result": {
+            "file_id": file_id, "file_unique_id": file_id, "file_path": file_id, "file_size": len(self.files[file_id]),
+        }})
+
+    async def download(self, request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        body = self.files[request.match_info["name"]]
+        for start in range(0, len(body), 64 * 1024):
+            await response.write(body[start:start + 64 * 1024])
+        return response
+
+    async def count(self, name: str, content: bytes, limit: int = 10 * 1024 * 1024, declared_size: bool = True):
+        self.files[name] = content
+        document = Document(file_id=name, file_unique_id=name, file_name=name,
+                            file_size=len(content) if declared_size else None)
+        return await DocumentWordCount(self.bot, document, limit, casefold=True).run()
+
+    async def test_utf8_text(self):
+        counts = await self.count("a.txt", "﻿Привет мир, привет!\nмир".encode("utf-8"))
+        self.assertEqual(counts, {"привет": 2, "мир": 2})
+
+    async def test_cp1251_text(self):
+        counts = await self.count("a.md", "Привет мир привет".encode("cp1251"))
+        self.assertEqual(counts, {"привет": 2, "мир": 1})
+
+    async def test_docx(self):
+        counts = await self.count("a.docx", make_docx([["При", "вет мир"], ["мир", " да"]]))
+        self.assertEqual(counts, {"привет": 1, "мир": 2, "да": 1})
+
+    async def test_unsupported_extension(self):
+        with self.assertRaises(DocumentError):
+            await self.count("a.pdf", b"%PDF-1.4")
+
+    async def test_limit_is_checked_while_downloading(self):
+        with self.assertRaises(DocumentTooLargeError):
+            await self.count("a.csv", b"word " * 100_000, limit=100_000, declared_size=False)
+
+    async def test_counting_does_not_block_loop(self):
+        # Текст без пробелов — худший случай для подсчета кусками
+        gaps = []
+
+        async def heartbeat():
+            previous = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - previous)
+                previous = now
+
+        task = asyncio.create_task(heartbeat())
+        try:
+            counts = await self.count("big.txt", b"a" * (8 * 1024 * 1024))
+        finally:
+            task.cancel()
+        self.assertEqual(len(counts), 1)
+        self.assertLess(max(gaps), 0.2)
+
+
+class CountDocxTest(unittest.TestCase):
+    def write(self, content: bytes) -> str:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "document.docx")
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def test_broken_archive(self):
+        with self.assertRaises(DocumentError):
+            count_docx(self.write(b"not a zip"), limit=1024)
+
+    def test_expansion_limit(self):
+        path = self.write(make_docx([["слово " * 10_000]]))
+        with self.assertRaises(DocumentTooLargeError):
+            count_docx(path, limit=1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
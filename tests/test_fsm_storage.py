@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteStorage, TTLMemoryStorage
+
+
+def make_key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+class TTLMemoryStorageTest(unittest.IsolatedAsyncioTestCase):
+    async def test_state_and_data(self):
+        storage = TTLMemoryStorage(ttl=60)
+        await storage.set_state(make_key(1), "WordCountStates:waiting_for_text")
+        await storage.set_data(make_key(1), {"page": 2})
+        self.assertEqual(await storage.get_state(make_key(1)), "WordCountStates:waiting_for_text")
+        self.assertEqual(await storage.get_data(make_key(1)), {"page": 2})
+
+        # Пустое состояние без данных не занимает место
+        await storage.set_state(make_key(1), None)
+        await storage.set_data(make_key(1), {})
+        self.assertEqual(len(storage._records), 0)
+
+    async def test_expired_state_is_not_visible(self):
+        storage = TTLMemoryStorage(ttl=0)
+        await storage.set_state(make_key(1), "state")
+        self.assertIsNone(await storage.get_state(make_key(1)))
+        self.assertEqual(storage.expired, 1)
+
+    async def test_sweep_removes_expired(self):
+        storage = TTLMemoryStorage(ttl=0)
+        for user_id in range(3):
+            await storage.set_state(make_key(user_id), "state")
+        self.assertEqual(await storage.sweep(), 3)
+        self.assertEqual(len(storage._records), 0)
+
+    async def test_maxsize_evicts_oldest_write(self):
+        storage = TTLMemoryStorage(ttl=60, maxsize=2)
+        for user_id in (1, 2):
+            await storage.set_state(make_key(user_id), "state")
+        # Запись обновляет позицию: вытесняется 2, а не 1
+        await storage.set_data(make_key(1), {"x": 1})
+        await storage.set_state(make_key(3), "state")
+        self.assertIsNone(await storage.get_state(make_key(2)))
+        self.assertEqual(await storage.get_state(make_key(1)), "state")
+        self.assertEqual(storage.evicted, 1)
+
+
+class SQLiteStorageTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "fsm.sqlite3")
+
+    async def test_state_survives_reopen(self):
+        storage = SQLiteStorage(self.path, ttl=60)
+        await storage.set_state(make_key(1), "WordCountStates:waiting_for_text")
+        await storage.set_data(make_key(1), {"текст": "привет"})
+        await storage.close()
+
+        storage = SQLiteStorage(self.path, ttl=60)
+        self.addAsyncCleanup(storage.close)
+        self.assertEqual(await storage.get_state(make_key(1)), "WordCountStates:waiting_for_text")
+        self.assertEqual(await storage.get_data(make_key(1)), {"текст": "привет"})
+        self.assertIsNone(await storage.get_state(make_key(2)))
+
+    async def test_expired_state_is_swept(self):
+        storage = SQLiteStorage(self.path, ttl=0)
+        self.addAsyncCleanup(storage.close)
+        await storage.set_state(make_key(1), "state")
+        self.assertIsNone(await storage.get_state(make_key(1)))
+        self.assertEqual(await storage.sweep(), 1)
+        self.assertEqual(storage.expired, 1)
+
+    async def test_write_enforces_maxsize(self):
+        storage = SQLiteStorage(self.path, ttl=60, maxsize=2)
+        self.addAsyncCleanup(storage.close)
+        for user_id in (1, 2):
+            await storage.set_state(make_key(user_id), "state")
+        # Обновление существующей записи и пустое состояние лимит не занимают
+        await storage.set_data(make_key(1), {"x": 1})
+        await storage.set_state(make_key(4), None)
+        self.assertEqual(storage.evicted, 0)
+
+        await storage.set_state(make_key(3), "state")
+        self.assertEqual(storage.evicted, 1)
+        self.assertIsNone(await storage.get_state(make_key(2)))
+        self.assertEqual(await storage.get_state(make_key(1)), "state")
+        self.assertEqual(await storage.get_state(make_key(3)), "state")
+
+    async def test_maxsize_after_reopen(self):
+        storage = SQLiteStorage(self.path, ttl=60)
+        for user_id in (1, 2, 3):
+            await storage.set_state(make_key(user_id), "state")
+        await storage.close()
+
+        storage = SQLiteStorage(self.path, ttl=60, maxsize=2)
+        self.addAsyncCleanup(storage.close)
+        await storage.sweep()
+        self.assertEqual(storage.evicted, 1)
+        self.assertIsNone(await storage.get_state(make_key(1)))
+        self.assertEqual(await storage.get_state(make_key(3)), "state")
+
+
+if __name__ == "__main__":
+    unittest.main()
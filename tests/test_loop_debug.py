@@ -0,0 +1,69 @@
+import ast
+import asyncio
+import pathlib
+import unittest
+import urllib.request
+
+import aiohttp
+import requests
+from aiohttp import web
+
+from loop_debug import BlockingIOOnLoopError, install_blocking_io_guard, uninstall_blocking_io_guard
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+class BlockingIOGuardTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        app = web.Application()
+        app.router.add_get("/", lambda request: web.Response(text="ok"))
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}/"
+        install_blocking_io_guard(asyncio.get_running_loop())
+
+    async def asyncTearDown(self):
+        uninstall_blocking_io_guard()
+        await self.runner.cleanup()
+
+    async def test_urllib_on_loop_raises(self):
+        with self.assertRaises(BlockingIOOnLoopError):
+            urllib.request.urlopen(self.url, timeout=1)
+
+    async def test_requests_on_loop_raises(self):
+        # requests оборачивает ошибки сокета в свои исключения, поэтому ищем причину по цепочке
+        with self.assertRaises(Exception) as raised:
+            requests.get(self.url, timeout=1)
+        error = raised.exception
+        while error is not None and not isinstance(error, BlockingIOOnLoopError):
+            error = error.__context__
+        self.assertIsInstance(error, BlockingIOOnLoopError)
+
+    async def test_aiohttp_is_allowed(self):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.url) as response:
+                self.assertEqual(await response.text(), "ok")
+
+    async def test_blocking_call_in_thread_is_allowed(self):
+        body = await asyncio.to_thread(lambda: urllib.request.urlopen(self.url, timeout=1).read())
+        self.assertEqual(body, b"ok")
+
+
+class NoRequestsImportTest(unittest.TestCase):
+    def test_bot_modules_do_not_import_requests(self):
+        for path in ROOT.glob("*.py"):
+            for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+                if isinstance(node, ast.Import):
+                    names = [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom):
+                    names = [node.module or ""]
+                else:
+                    continue
+                for name in names:
+                    self.assertNotEqual(name.split(".")[0], "requests", path.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from plans import (
+    InvoicePayload, PayloadError, Plan, PlanCatalog, _b36, _signature, check_invoice, make_payload, parse_payload,
+    payload_secret,
+)
+
+SECRET = payload_secret("1:test")
+MONTH = Plan("month", "Месяц", 29000, "RUB", 30)
+NOW = 1_700_000_000
+
+
+class PayloadTest(unittest.TestCase):
+    def test_round_trip(self):
+        payload = make_payload(SECRET, MONTH, 123456789, now=NOW)
+        self.assertLessEqual(len(payload.encode()), 128)
+        self.assertEqual(parse_payload(SECRET, payload), InvoicePayload("month", 123456789, 29000, 30, NOW))
+
+    def test_legacy_payload_without_days(self):
+        body = ".".join(("s1", "month", _b36(42), _b36(29000), _b36(NOW)))
+        invoice = parse_payload(SECRET, f"{body}.{_signature(SECRET, body)}")
+        self.assertEqual(invoice, InvoicePayload("month", 42, 29000, None, NOW))
+
+    def test_changed_body(self):
+        parts = make_payload(SECRET, MONTH, 42, now=NOW).split(".")
+        for index, value in ((0, "s1"), (1, "year"), (2, "15"), (3, "1"), (4, "zz"), (5, "zz")):
+            forged = parts.copy()
+            forged[index] = value
+            with self.assertRaises(PayloadError, msg=value):
+                parse_payload(SECRET, ".".join(forged))
+
+    def test_changed_signature(self):
+        payload = make_payload(SECRET, MONTH, 42, now=NOW)
+        flipped = payload[:-1] + ("A" if payload[-1] != "A" else "B")
+        for forged in (flipped, payload.rsplit(".", 1)[0], payload + "x", ""):
+            with self.assertRaises(PayloadError, msg=forged):
+                parse_payload(SECRET, forged)
+
+    def test_other_secret(self):
+        payload = make_payload(payload_secret("2:other"), MONTH, 42, now=NOW)
+        with self.assertRaises(PayloadError):
+            parse_payload(SECRET, payload)
+
+    def test_non_ascii_signature(self):
+        body = make_payload(SECRET, MONTH, 42, now=NOW).rsplit(".", 1)[0]
+        with self.assertRaises(PayloadError):
+            parse_payload(SECRET, f"{body}.подпись")
+
+    def test_max_age(self):
+        payload = make_payload(SECRET, MONTH, 42, now=NOW)
+        self.assertEqual(parse_payload(SECRET, payload, max_age=60, now=NOW + 60).issued_at, NOW)
+        with self.assertRaises(PayloadError):
+            parse_payload(SECRET, payload, max_age=60, now=NOW + 61)
+
+
+class CheckInvoiceTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = PlanCatalog([MONTH])
+        self.payload = make_payload(SECRET, MONTH, 42, now=NOW)
+
+    def check(self, payload=None, telegram_id=42, total_amount=29000, currency="RUB"):
+        return check_invoice(SECRET, self.catalog, payload or self.payload, telegram_id, total_amount, currency,
+                             max_age=3600, now=NOW + 10)
+
+    def test_valid(self):
+        self.assertIsNone(self.check())
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.check(payload=self.payload[:-2] + "zz"), "invalid_payload")
+
+    def test_expired(self):
+        self.assertEqual(check_invoice(SECRET, self.catalog, self.payload, 42, 29000, "RUB",
+                                       max_age=3600, now=NOW + 3601), "invalid_payload")
+
+    def test_wrong_user(self):
+        self.assertEqual(self.check(telegram_id=43), "invalid_payload")
+
+    def test_price_mismatch(self):
+        self.assertEqual(self.check(total_amount=100), "price_mismatch")
+        self.assertEqual(self.check(currency="USD"), "price_mismatch")
+        # Тариф подорожал после выставления счета
+        self.catalog.replace([MONTH._replace(price=39000)])
+        self.assertEqual(self.check(), "price_mismatch")
+        self.assertEqual(self.check(total_amount=39000), "price_mismatch")
+
+    def test_unknown_plan(self):
+        self.catalog.replace([Plan("year", "Год", 290000, "RUB", 365)])
+        self.assertEqual(self.check(), "unknown_plan")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from sharding import ShardedWebhookServer, dump_update, shard_for, update_user_id
+
+USER = {"id": 4242, "is_bot": False, "first_name": "Test"}
+MESSAGE = {"message_id": 1, "date": 0, "chat": {"id": 4242, "type": "private"}, "from": USER, "text": "/start"}
+
+
+class UpdateUserIdTest(unittest.TestCase):
+    def route(self, raw: dict) -> int:
+        return update_user_id(dump_update(Update.model_validate(raw)))
+
+    def test_message(self):
+        self.assertEqual(self.route({"update_id": 7, "message": MESSAGE}), 4242)
+
+    def test_callback_query(self):
+        raw = {"update_id": 7, "callback_query": {
+            "id": "1", "from": USER, "chat_instance": "1", "data": "words:abc:2",
+            "message": {**MESSAGE, "chat": {"id": 100, "type": "group", "title": "g"}},
+        }}
+        self.assertEqual(self.route(raw), 4242)
+
+    def test_pre_checkout_query(self):
+        raw = {"update_id": 7, "pre_checkout_query": {
+            "id": "1", "from": USER, "currency": "RUB", "total_amount": 29000, "invoice_payload": "s1",
+        }}
+        self.assertEqual(self.route(raw), 4242)
+
+    def test_dumped_update_is_valid(self):
+        update = Update.model_validate({"update_id": 7, "message": MESSAGE})
+        self.assertEqual(Update.model_validate(dump_update(update)).message.from_user.id, 4242)
+
+    def test_update_without_user(self):
+        self.assertEqual(update_user_id({"update_id": 9}), 9)
+        self.assertEqual(shard_for(4242, 4), 2)
+
+
+
+class FakeSupervisor:
+    def __init__(self, full: int):
+        # Сколько первых попыток очередь воркера будет заполнена
+        self.full = full
+        self.attempts = 0
+
+    def submit(self, data: dict) -> bool:
+        self.attempts += 1
+        return self.attempts > self.full
+
+
+class ShardedWebhookServerTest(unittest.IsolatedAsyncioTestCase):
+    def server(self, supervisor, admission_timeout):
+        bot = Bot(token="123456:fake")
+        self.addAsyncCleanup(bot.session.close)
+        return ShardedWebhookServer(supervisor, bot, secret_token="s", admission_timeout=admission_timeout)
+
+    async def test_waits_for_free_queue(self):
+        supervisor = FakeSupervisor(full=3)
+        self.assertTrue(await self.server(supervisor, 1).admit({"update_id": 7, "message": MESSAGE}))
+        self.assertEqual(supervisor.attempts, 4)
+
+    async def test_rejects_after_timeout(self):
+        supervisor = FakeSupervisor(full=10 ** 6)
+        self.assertFalse(await self.server(supervisor, 0.05).admit({"update_id": 7, "message": MESSAGE}))
+
+    async def test_invalid_update(self):
+        with self.assertRaises(ValueError):
+            await self.server(FakeSupervisor(full=0), 1).admit({"message": MESSAGE})
+
+
+if __name__ == "__main__":
+    unittest.main()
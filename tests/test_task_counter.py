@@ -0,0 +1,57 @@
+import unittest
+
+from api_client import APIStatusError
+from task_counter import TaskCounterAggregator
+
+
+class TaskCounterAggregatorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_flush_sends_in_batches(self):
+        sent = []
+
+        async def send(increments):
+            sent.append(increments)
+            return True
+
+        aggregator = TaskCounterAggregator(send, batch_size=1000)
+        for telegram_id in range(2500):
+            aggregator.add(telegram_id, 1, 1)
+        await aggregator.flush()
+
+        self.assertEqual([len(batch) for batch in sent], [1000, 1000, 500])
+        self.assertEqual(aggregator.backlog(), 0)
+
+    async def test_rejected_batch_is_dropped(self):
+        async def send(increments):
+            raise APIStatusError(400, "update_tasks/")
+
+        aggregator = TaskCounterAggregator(send)
+        aggregator.add(1, 1, 1)
+        with self.assertLogs("task_counter", "ERROR"):
+            await aggregator.flush()
+        self.assertEqual(aggregator.backlog(), 0)
+
+    async def test_failed_batch_is_requeued(self):
+        results = [True, False, True, True]
+        sent = []
+
+        async def send(increments):
+            sent.append([item["telegram_id"] for item in increments])
+            return results.pop(0)
+
+        aggregator = TaskCounterAggregator(send, batch_size=2)
+        for telegram_id in range(5):
+            aggregator.add(telegram_id, 1, 1)
+        await aggregator.flush()
+
+        # Первый пакет принят, второй не прошел: дальше в этот раз не отправляем
+        self.assertEqual(sent, [[0, 1], [2, 3]])
+        self.assertEqual(aggregator.backlog(), 3)
+        self.assertEqual(aggregator.pending(2), (1, 1))
+        self.assertEqual(aggregator.pending(0), (0, 0))
+
+        await aggregator.flush()
+        self.assertEqual(aggregator.backlog(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
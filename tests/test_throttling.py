@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import Message, User
+
+from throttling import AdmissionMiddleware, ThrottlingMiddleware
+
+USER = User(id=42, is_bot=False, first_name="Test")
+
+
+def make_message(**fields) -> Message:
+    return Message.model_validate({
+        "message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"}, "from": USER.model_dump(), **fields,
+    })
+
+
+PAYMENT = {"successful_payment": {
+    "currency": "RUB", "total_amount": 29000, "invoice_payload": "s1",
+    "telegram_payment_charge_id": "t", "provider_payment_charge_id": "p",
+}}
+
+
+class ThrottlingMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.handled = []
+        self.reply = patch("throttling._reply", AsyncMock()).start()
+        self.addCleanup(patch.stopall)
+
+    async def handler(self, event, data):
+        self.handled.append(event)
+        return "ok"
+
+    async def feed(self, middleware, event):
+        return await middleware(self.handler, event, {"event_from_user": USER})
+
+    async def test_over_rate_messages_are_dropped(self):
+        middleware = ThrottlingMiddleware(rate=0.001, burst=3)
+        results = [await self.feed(middleware, make_message(text="привет")) for _ in range(5)]
+        self.assertEqual(results, ["ok"] * 3 + [None] * 2)
+        self.assertEqual(len(self.handled), 3)
+        # Предупреждение — одно на warn_interval, а не на каждое лишнее сообщение
+        self.reply.assert_awaited_once()
+
+    async def test_users_are_limited_separately(self):
+        middleware = ThrottlingMiddleware(rate=0.001, burst=1)
+        other = User(id=7, is_bot=False, first_name="Other")
+        await self.feed(middleware, make_message(text="a"))
+        self.assertEqual(await middleware(self.handler, make_message(text="b"), {"event_from_user": other}), "ok")
+        self.assertIsNone(await self.feed(middleware, make_message(text="c")))
+
+    async def test_successful_payment_is_exempt(self):
+        middleware = ThrottlingMiddleware(rate=0.001, burst=1)
+        await self.feed(middleware, make_message(text="привет"))
+        self.assertIsNone(await self.feed(middleware, make_message(text="привет")))
+        for _ in range(3):
+            self.assertEqual(await self.feed(middleware, make_message(**PAYMENT)), "ok")
+
+
+class AdmissionMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.reply = patch("throttling._reply", AsyncMock()).start()
+        self.addCleanup(patch.stopall)
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def heavy(self, event, data):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await self.release.wait()
+        self.running -= 1
+        return "ok"
+
+    def call(self, middleware, flags):
+        data = {"handler": HandlerObject(callback=self.heavy, flags=flags)}
+        return asyncio.create_task(middleware(self.heavy, make_message(text="/word_count"), data))
+
+    async def test_heavy_handlers_are_limited(self):
+        middleware = AdmissionMiddleware(concurrency=2, queue_limit=10)
+        tasks = [self.call(middleware, {"heavy": True}) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        self.assertEqual((middleware.active, middleware.queued), (2, 3))
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["ok"] * 5)
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual((middleware.active, middleware.queued), (0, 0))
+
+    async def test_light_handlers_are_not_limited(self):
+        middleware = AdmissionMiddleware(concurrency=1, queue_limit=0)
+        tasks = [self.call(middleware, {}) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.running, 3)
+        self.release.set()
+        await asyncio.gather(*tasks)
+
+    async def test_overflow_is_shed(self):
+        middleware = AdmissionMiddleware(concurrency=1, queue_limit=2)
+        tasks = [self.call(middleware, {"heavy": True}) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        # Один выполняется, двое ждут, остальным сразу отказ
+        self.assertEqual(self.reply.await_count, 2)
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["ok"] * 3 + [None] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
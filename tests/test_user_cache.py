@@ -0,0 +1,57 @@
+import unittest
+
+from user_cache import UserCache
+
+
+class UserCacheTest(unittest.TestCase):
+    def test_get_returns_copy(self):
+        cache = UserCache()
+        user = {"telegram_id": 1, "is_subscribed": False}
+        cache.set(1, user)
+        user["is_subscribed"] = True
+        cache.get(1)["is_subscribed"] = True
+        self.assertFalse(cache.get(1)["is_subscribed"])
+
+    def test_update_and_increment(self):
+        cache = UserCache()
+        cache.set(1, {"daily_tasks_completed": 1})
+        cache.update(1, is_subscribed=True)
+        cache.increment(1, "daily_tasks_completed")
+        cache.increment(2, "daily_tasks_completed")
+        self.assertEqual(cache.get(1), {"daily_tasks_completed": 2, "is_subscribed": True})
+        self.assertIsNone(cache.get(2))
+
+    def test_lru_eviction(self):
+        cache = UserCache(maxsize=2)
+        cache.set(1, {"id": 1})
+        cache.set(2, {"id": 2})
+        # Обращение делает запись 1 самой свежей, поэтому вытесняется 2
+        cache.get(1)
+        cache.set(3, {"id": 3})
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), {"id": 1})
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        cache = UserCache(ttl=-1)
+        cache.set(1, {"id": 1})
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+    def test_stats(self):
+        cache = UserCache()
+        cache.set(1, {"id": 1})
+        cache.get(1)
+        cache.get(1)
+        cache.get(2)
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "size": 1, "hit_rate": 2 / 3})
+
+    def test_non_dict_values_are_stored_as_is(self):
+        cache = UserCache()
+        report = object()
+        cache.set(1, report)
+        self.assertIs(cache.get(1), report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp import web
+
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "test-secret"
+MESSAGE = {"message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"},
+           "from": {"id": 42, "is_bot": False, "first_name": "Test"}, "text": "привет"}
+
+
+def make_update(update_id: int) -> dict:
+    return {"update_id": update_id, "message": MESSAGE}
+
+
+class WebhookServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = Bot(token="123456:fake")
+        self.handled = []
+        self.dp = Dispatcher()
+
+        @self.dp.message()
+        async def handle(message: Message):
+            self.handled.append(message.text)
+
+        self.session = aiohttp.ClientSession()
+        self.addAsyncCleanup(self.session.close)
+        self.addAsyncCleanup(self.bot.session.close)
+
+    async def start(self, **kwargs) -> WebhookServer:
+        server = WebhookServer(self.dp, self.bot, **{"secret_token": SECRET, **kwargs})
+        app = web.Application()
+        server.setup(app)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        self.addAsyncCleanup(runner.cleanup)
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        self.base = f"http://127.0.0.1:{runner.addresses[0][1]}{server.path}"
+        return server
+
+    async def post(self, data, secret=SECRET) -> int:
+        headers = {SECRET_HEADER: secret} if secret is not None else {}
+        async with self.session.post(self.base, json=data, headers=headers) as response:
+            return response.status
+
+    def test_secret_is_required(self):
+        for secret in (None, ""):
+            with self.assertRaises(ValueError):
+                WebhookServer(self.dp, self.bot, secret_token=secret)
+
+    async def test_wrong_secret_is_rejected(self):
+        server = await self.start(workers=0)
+        self.assertEqual(await self.post(make_update(1), secret=None), 401)
+        self.assertEqual(await self.post(make_update(1), secret="other"), 401)
+        self.assertEqual(await self.post(make_update(1), secret="секрет"), 401)
+        self.assertEqual(server.unauthorized, 3)
+        self.assertEqual(server.queue.qsize(), 0)
+
+    async def test_updates_are_processed(self):
+        server = await self.start(workers=2)
+        for update_id in range(3):
+            self.assertEqual(await self.post(make_update(update_id)), 200)
+        await server.queue.join()
+        self.assertEqual(self.handled, ["привет"] * 3)
+        self.assertEqual(server.processed, 3)
+
+    async def test_full_queue_returns_503(self):
+        # Без воркеров очередь только наполняется
+        server = await self.start(queue_size=2, workers=0)
+        statuses = [await self.post(make_update(update_id)) for update_id in range(4)]
+        self.assertEqual(statuses, [200, 200, 503, 503])
+        self.assertEqual((server.received, server.rejected), (2, 2))
+
+    async def test_invalid_body(self):
+        await self.start(workers=0)
+        headers = {SECRET_HEADER: SECRET}
+        async with self.session.post(self.base, data=b"not json", headers=headers) as response:
+            self.assertEqual(response.status, 400)
+
+    async def test_stats(self):
+        await self.start(queue_size=1, workers=0)
+        await self.post(make_update(1))
+        await self.post(make_update(2))
+        await self.post(make_update(3), secret="other")
+        async with self.session.get(f"{self.base}/stats") as response:
+            stats = await response.json()
+        self.assertEqual(stats["queue_depth"], 1)
+        self.assertEqual(stats["max_queue_depth"], 1)
+        self.assertEqual((stats["received"], stats["rejected"], stats["unauthorized"]), (1, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
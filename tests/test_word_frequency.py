@@ -0,0 +1,82 @@
+import time
+import unittest
+from collections import Counter
+
+from word_frequency import (
+    DEFAULT_CHUNK_SIZE, MAX_TOKEN_LENGTH, MAX_WORD_LENGTH, MESSAGE_LIMIT, REPORT_HEADER, WordCounter, WordReport,
+    count_chunks, count_text, iter_chunks, rank_words, render_word_line,
+)
+
+
+class WordCounterTest(unittest.TestCase):
+    def test_chunks_match_whole_text(self):
+        text = "Привет, мир! Ёжик и ежик.\nмир   привет " * 50
+        whole = count_text(text, casefold=True)
+        for size in (1, 3, 7, 64):
+            self.assertEqual(count_chunks(iter_chunks(text, size), casefold=True), whole)
+
+    def test_word_split_between_chunks(self):
+        counter = WordCounter()
+        for chunk in ("при", "вет м", "ир", " ", "мир"):
+            counter.feed(chunk)
+        self.assertEqual(counter.finish(), {"привет": 1, "мир": 2})
+
+    def test_long_token_is_truncated(self):
+        counter = WordCounter()
+        for _ in range(10):
+            counter.feed("x" * 1000)
+            self.assertLessEqual(len(counter._tail), MAX_TOKEN_LENGTH)
+        counter.feed(" y")
+        self.assertEqual(counter.finish(), {"x" * MAX_TOKEN_LENGTH: 1, "y": 1})
+
+    def test_text_without_spaces_is_linear(self):
+        counter = WordCounter()
+        started = time.perf_counter()
+        for _ in range(60):
+            counter.feed("a" * DEFAULT_CHUNK_SIZE)
+        counter.finish()
+        self.assertLess(time.perf_counter() - started, 1)
+
+
+class WordReportTest(unittest.TestCase):
+    def all_lines(self, report):
+        return [line for number in range(1, report.pages + 1) for line in report.page(number).split("\n")[2:]]
+
+    def test_pages_fit_message_limit(self):
+        # Длинные слова из символов, которые HTML-экранирование удлиняет в несколько раз
+        counts = Counter({"&<>" * 40 + str(i): i for i in range(300)})
+        report = WordReport(counts, page_lines=1000)
+        self.assertGreater(report.pages, 1)
+        for number in range(1, report.pages + 1):
+            self.assertLessEqual(len(report.page(number)), MESSAGE_LIMIT)
+        self.assertEqual(len(self.all_lines(report)), 300)
+
+    def test_page_lines(self):
+        report = WordReport(Counter({f"w{i}": 1 for i in range(25)}), page_lines=10)
+        self.assertEqual(report.pages, 3)
+        self.assertEqual(len(self.all_lines(report)), 25)
+
+    def test_html_is_escaped(self):
+        report = WordReport(Counter({"<b>x</b>&": 2}))
+        self.assertIn("<b>&lt;b&gt;x&lt;/b&gt;&amp;</b>: <i>2</i>", report.page(1))
+
+    def test_long_word_is_shortened(self):
+        line = render_word_line("я" * (MAX_WORD_LENGTH + 50), 1)
+        self.assertIn("я" * MAX_WORD_LENGTH + "…", line)
+        self.assertNotIn("я" * (MAX_WORD_LENGTH + 1), line)
+
+    def test_top_matches_full_ranking(self):
+        counts = Counter({f"w{i % 37}": i % 11 for i in range(37)})
+        counts.update({"b": 5, "a": 5})
+        for top in (1, 5, 20):
+            self.assertEqual(rank_words(counts, top), rank_words(counts)[:top])
+        self.assertEqual(WordReport(counts, top=3).unique_words, len(counts))
+
+    def test_empty_result(self):
+        report = WordReport(Counter())
+        self.assertEqual(report.pages, 1)
+        self.assertEqual(report.page(1), REPORT_HEADER + "Слов не найдено.")
+
+
+if __name__ == "__main__":
+    unittest.main()
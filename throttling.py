@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from broadcast import TokenBucket
+from metrics import REGISTRY
+
+THROTTLED = REGISTRY.counter("bot_throttled_total", "Обновления, отброшенные лимитом пользователя", ("event",))
+SHED = REGISTRY.counter("bot_admission_rejected_total", "Тяжелые запросы, отклоненные при перегрузке", ("handler",))
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+async def _reply(event: TelegramObject, text: str):
+    # У Message и CallbackQuery одинаковый answer(text): сообщение или всплывающее уведомление
+    if isinstance(event, (Message, CallbackQuery)):
+        await event.answer(text)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Outer-middleware: не больше rate обновлений в секунду от пользователя
+    (всплеск до burst). Лишние обновления отбрасываются до фильтров и
+    обращений к API; предупреждение отправляется не чаще раза в warn_interval.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: float = 5, warn_interval: float = 10.0,
+                 max_users: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.warn_interval = warn_interval
+        self.max_users = max_users
+        self._buckets = {}
+        self._warned_until = {}
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                # Забываем пользователей, чьи ведра уже полностью восстановились
+                self._buckets = {k: v for k, v in self._buckets.items() if not v.idle()}
+                now = time.monotonic()
+                self._warned_until = {k: v for k, v in self._warned_until.items() if v > now}
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, capacity=self.burst)
+        return bucket
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        # Платежи не ограничиваем никогда: потерянный successful_payment — потерянные деньги
+        if user is None or (isinstance(event, Message) and event.successful_payment):
+            return await handler(event, data)
+
+        if not self._bucket(user.id).delay():
+            return await handler(event, data)
+
+        THROTTLED.inc(type(event).__name__)
+        now = time.monotonic()
+        if self._warned_until.get(user.id, 0) <= now:
+            self._warned_until[user.id] = now + self.warn_interval
+            await _reply(event, "Слишком много запросов, подождите немного.")
+        elif isinstance(event, CallbackQuery):
+            # Кнопку все равно нужно "отпустить", иначе клиент покажет загрузку
+            await event.answer()
+        return None
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Inner-middleware для обработчиков с флагом heavy: одновременно выполняется
+    не больше concurrency таких обработчиков, остальные ждут в очереди. Если в
+    очереди уже queue_limit запросов, новый сразу получает короткий отказ.
+    """
+
+    def __init__(self, concurrency: int = 4, queue_limit: int = 50):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.queued = 0
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if not get_flag(data, "heavy"):
+            return await handler(event, data)
+
+        if self.queued >= self.queue_limit:
+            SHED.inc(data["handler"].callback.__name__)
+            await _reply(event, "Бот сейчас перегружен, попробуйте через минуту.")
+            return None
+
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def register_metrics(self):
+        REGISTRY.callback("bot_admission_queued", "Тяжелые запросы в очереди", lambda: self.queued)
+        REGISTRY.callback("bot_admission_active", "Тяжелые запросы в работе", lambda: self.active)
@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class UserCache:
+    """
+    Ограниченный LRU-кеш записей пользователей с TTL, ключ — telegram_id.
+
+    Записи старше ttl секунд считаются устаревшими, при переполнении
+    вытесняется запись, к которой дольше всего не обращались.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _lookup(self, telegram_id: int) -> Optional[dict]:
+        item = self._data.get(telegram_id)
+        if item is None:
+            return None
+        expires_at, user = item
+        if expires_at < time.monotonic():
+            del self._data[telegram_id]
+            return None
+        return user
+
+    def get(self, telegram_id: int) -> Optional[dict]:
+        user = self._lookup(telegram_id)
+        if user is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(telegram_id)
+        # Отдаем копию: изменения у вызывающего не должны портить кеш (для этого есть update)
+        return dict(user) if isinstance(user, dict) else user
+
+    def set(self, telegram_id: int, user: dict):
+        # Словари копируем, остальные объекты (например, отчеты) храним как есть
+        self._data[telegram_id] = (time.monotonic() + self.ttl, dict(user) if isinstance(user, dict) else user)
+        self._data.move_to_end(telegram_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def update(self, telegram_id: int, **fields):
+        """Обновляет поля закешированной записи (если она есть), не продлевая TTL."""
+        user = self._lookup(telegram_id)
+        if user is not None:
+            user.update(fields)
+
+    def increment(self, telegram_id: int, field: str, delta: int = 1):
+        user = self._lookup(telegram_id)
+        if user is not None:
+            user[field] = (user.get(field) or 0) + delta
+
+    def invalidate(self, telegram_id: int):
+        self._data.pop(telegram_id, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
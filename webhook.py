@@ -0,0 +1,160 @@
+import asyncio
+import hmac
+import logging
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Прием обновлений Telegram через webhook.
+
+    Обработчик HTTP только проверяет секрет и кладет обновление в ограниченную
+    очередь, а обрабатывают его workers воркеров. Если очередь заполнена,
+    Telegram получает 503 и повторит доставку позже — это и есть backpressure.
+    Без секрета сервер не создается: иначе любой, кто знает адрес, может
+    присылать боту поддельные обновления.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, path: str = "/webhook", secret_token: str = None,
+                 queue_size: int = 1000, workers: int = 16):
+        if not secret_token:
+            raise ValueError("Для режима webhook нужен секрет: задайте WEBHOOK_SECRET.")
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+        self.received = 0
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.unauthorized = 0
+        self.max_queue_depth = 0
+        self._processing_time = 0.0
+
+    def setup(self, app: web.Application):
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get(f"{self.path}/stats", self.handle_stats)
+        app.on_startup.append(self._start_workers)
+        app.on_shutdown.append(self._stop_workers)
+        REGISTRY.callback("bot_webhook_queue_depth", "Обновления в очереди webhook", self.queue.qsize)
+        REGISTRY.callback("bot_webhook_updates_total", "Обновления webhook по результату", lambda: {
+            "received": self.received, "rejected": self.rejected, "failed": self.failed,
+            "unauthorized": self.unauthorized,
+        }, labels=("result",), kind="counter")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, "").encode(), self.secret_token.encode()
+        ):
+            self.unauthorized += 1
+            return web.Response(status=401)
+
+        try:
+            accepted = await self.admit(await request.json())
+        except ValueError:
+            return web.Response(status=400)
+
+        if not accepted:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def admit(self, data: dict) -> bool:
+        """Принимает обновление из HTTP-запроса; False — ответить 503."""
+        return self.submit(data)
+
+    def submit(self, data: dict) -> bool:
+        """Ставит обновление в очередь; False, если очередь заполнена."""
+        update = Update.model_validate(data, context={"bot": self.bot})
+        try:
+            self.queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            return False
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "max_queue_depth": self.max_queue_depth,
+            "workers": self.workers,
+            "received": self.received,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "unauthorized": self.unauthorized,
+            "avg_latency": self._processing_time / self.processed if self.processed else 0.0,
+        }
+
+    async def _worker(self):
+        while True:
+            enqueued_at, update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+                self._processing_time += time.monotonic() - enqueued_at
+            except Exception:
+                self.failed += 1
+                logger.exception("Ошибка обработки обновления", extra={"update_id": update.update_id})
+            finally:
+                self.queue.task_done()
+
+    async def _start_workers(self, app: web.Application):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _stop_workers(self, app: web.Application):
+        # Дорабатываем уже принятые обновления и останавливаем воркеров
+        if self._tasks:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, **kwargs) -> tuple:
+    app = web.Application()
+    server = WebhookServer(dp, bot, **kwargs)
+    server.setup(app)
+    # Сигналы startup/shutdown диспетчера срабатывают вместе с приложением
+    setup_application(app, dp, bot=bot)
+    return app, server
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, base_url: str, host: str = "0.0.0.0", port: int = 8080, **kwargs):
+    """Запускает aiohttp-сервер и регистрирует webhook в Telegram."""
+    app, server = create_webhook_app(dp, bot, **kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    try:
+        await bot.set_webhook(
+            f"{base_url.rstrip('/')}{server.path}",
+            secret_token=server.secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        logger.info("Webhook запущен", extra={"host": host, "port": port, "path": server.path})
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,202 @@
+import asyncio
+import heapq
+import html
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+# Всё, что не буква/цифра/подчеркивание и не пробел, вырезается из слова
+# (так же, как раньше делал re.sub(r'[^\w\s]', '', text)), но без копии всего текста.
+_TOKEN_RE = re.compile(r'\S+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+# Последний пробельный символ в строке: дальше него только слово, которое может продолжиться
+_LAST_SPACE_RE = re.compile(r'\s\S*\Z')
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Стоп-слова для необязательной фильтрации (сравниваются после casefold)
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она',
+    'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее',
+    'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'ли', 'если', 'или',
+    'ни', 'до', 'вас', 'их', 'чем', 'для', 'мы', 'под', 'это', 'этот', 'при',
+    'a', 'an', 'the', 'and', 'or', 'but', 'if', 'of', 'at', 'by', 'for', 'with', 'to',
+    'from', 'in', 'on', 'is', 'are', 'was', 'were', 'be', 'it', 'this', 'that', 'as',
+})
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Слишком длинные "слова" обрезаются, чтобы одна строка всегда помещалась в сообщение
+MAX_WORD_LENGTH = 100
+# Длиннее этого токены обрезаются при подсчете: так хвост WordCounter не растет на тексте без пробелов
+MAX_TOKEN_LENGTH = 1024
+REPORT_HEADER = "<b>📊 Частота слов:</b>\n\n"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def tokenize(text: str, casefold: bool = False) -> Iterator[str]:
+    """
+    Лениво разбивает текст на слова с учетом Unicode.
+    """
+    for match in _TOKEN_RE.finditer(text):
+        word = _PUNCT_RE.sub('', match.group()[:MAX_TOKEN_LENGTH])
+        if not word:
+            continue
+        # Приводим составные символы (ё, й и т.п.) к одной форме
+        if not word.isascii():
+            word = unicodedata.normalize('NFC', word)
+        yield word.casefold() if casefold else word
+
+
+class WordCounter:
+    """
+    Однопроходный счетчик частоты слов.
+
+    Текст можно подавать кусками через feed(): слово, разрезанное
+    границей куска, склеивается со следующим куском.
+    """
+
+    def __init__(self, casefold: bool = False, stop_words: Optional[Iterable[str]] = None):
+        self.casefold = casefold
+        self.stop_words = frozenset(w.casefold() for w in stop_words) if stop_words else frozenset()
+        self.counts = Counter()
+        self._tail = ''
+
+    def _count(self, text: str):
+        words = tokenize(text, self.casefold)
+        if self.stop_words:
+            words = (w for w in words if w.casefold() not in self.stop_words)
+        self.counts.update(words)
+
+    def feed(self, chunk: str):
+        # Последнее слово может продолжиться в следующем куске. Пробел ищем только
+        # в новом куске, а хвост держим не длиннее MAX_TOKEN_LENGTH: подсчет линеен
+        # и на тексте без пробелов
+        match = _LAST_SPACE_RE.search(chunk)
+        if match is None:
+            if len(self._tail) < MAX_TOKEN_LENGTH:
+                self._tail += chunk[:MAX_TOKEN_LENGTH - len(self._tail)]
+            return
+        cut = match.start() + 1
+        self._count(self._tail + chunk[:cut])
+        self._tail = chunk[cut:cut + MAX_TOKEN_LENGTH]
+
+    def finish(self) -> Counter:
+        if self._tail:
+            self._count(self._tail)
+            self._tail = ''
+        return self.counts
+
+
+def iter_chunks(text: str, size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def count_chunks(chunks: Iterable[str], casefold: bool = False,
+                 stop_words: Optional[Iterable[str]] = None) -> Counter:
+    """
+    Считает частоту слов по генератору кусков текста.
+    """
+    counter = WordCounter(casefold=casefold, stop_words=stop_words)
+    for chunk in chunks:
+        counter.feed(chunk)
+    return counter.finish()
+
+
+def count_text(text: str, casefold: bool = False,
+               stop_words: Optional[Iterable[str]] = None) -> Counter:
+    if len(text) > DEFAULT_CHUNK_SIZE:
+        return count_chunks(iter_chunks(text), casefold, stop_words)
+    counter = WordCounter(casefold=casefold, stop_words=stop_words)
+    counter._count(text)
+    return counter.counts
+
+
+def _get_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers)
+    return _executor
+
+
+async def count_text_async(text: str, casefold: bool = False,
+                           stop_words: Optional[Iterable[str]] = None,
+                           offload_threshold: int = 20_000) -> Counter:
+    """
+    Считает слова, не блокируя event loop: короткие тексты считаются на месте,
+    длинные (больше offload_threshold символов) уходят в пул процессов.
+    """
+    if len(text) <= offload_threshold:
+        return count_text(text, casefold, stop_words)
+
+    loop = asyncio.get_running_loop()
+    stop_words = frozenset(stop_words) if stop_words else None
+    return await loop.run_in_executor(_get_executor(), count_text, text, casefold, stop_words)
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def rank_words(counts: Counter, top: Optional[int] = None) -> list:
+    """
+    Слова по убыванию частоты (при равенстве — по алфавиту).
+    С top берутся только top самых частых через кучу, без сортировки всего словаря.
+    """
+    key = lambda item: (-item[1], item[0])  # noqa: E731
+    if top and top < len(counts):
+        return heapq.nsmallest(top, counts.items(), key=key)
+    return sorted(counts.items(), key=key)
+
+
+def render_word_line(word: str, count: int) -> str:
+    if len(word) > MAX_WORD_LENGTH:
+        word = word[:MAX_WORD_LENGTH] + "…"
+    return f"<b>{html.escape(word)}</b>: <i>{count}</i> раз(а)"
+
+
+class WordReport:
+    """
+    Результат подсчета, разбитый на страницы: не больше page_lines строк
+    и не длиннее limit символов вместе с заголовком. Страницы режутся только
+    по границам строк, поэтому HTML-теги не разрываются.
+    """
+
+    def __init__(self, counts: Counter, top: Optional[int] = None, page_lines: int = 50,
+                 limit: int = MESSAGE_LIMIT, header: str = REPORT_HEADER):
+        self.header = header
+        self.ranked = rank_words(counts, top)
+        self.total_words = sum(counts.values())
+        self.unique_words = len(counts)
+        self._bounds = self._paginate(page_lines, limit - len(header))
+
+    def _paginate(self, page_lines: int, limit: int) -> list:
+        bounds = []
+        start = 0
+        length = 0
+        for index, (word, count) in enumerate(self.ranked):
+            line_length = len(render_word_line(word, count)) + 1
+            if index > start and (index - start >= page_lines or length + line_length > limit):
+                bounds.append((start, index))
+                start, length = index, 0
+            length += line_length
+        bounds.append((start, len(self.ranked)))
+        return bounds
+
+    @property
+    def pages(self) -> int:
+        return len(self._bounds)
+
+    def page(self, number: int) -> str:
+        """Текст страницы number (с 1)."""
+        start, end = self._bounds[number - 1]
+        if start == end:
+            return self.header + "Слов не найдено."
+        return self.header + "\n".join(render_word_line(word, count) for word, count in self.ranked[start:end])